@@ -5,7 +5,9 @@ from typing import Dict, Any, List
 from datetime import datetime, timedelta
 from agno.agent import Agent
 from agno.models.google import Gemini
+from memory import AnalysisMemo
 from tools import (
+    MemoizedTool,
     ConversationAnalyzer,
     DemandAggregator,
     LeadScorer,
@@ -44,15 +46,30 @@ Seja preciso, baseado em dados, e foque em insights acionáveis.
 Cada insight deve vir com um número ou percentual que o sustente.
 """
     
-    def __init__(self, memory_service):
+    def __init__(self, memory_service, memo=None):
         self.memory = memory_service
         
+        # Análises reaproveitadas entre jobs enquanto os dados não mudam
+        self.memo = memo or AnalysisMemo(memory_service)
+        
+        # Totais de leitura chegam pelos callbacks de entrega, sem mudar a
+        # versão dos dados: ficam fora da análise memorizada
+        analisador = ConversationAnalyzer(memory_service)
+        
         # Inicializa ferramentas
         self.tools = {
-            "conversation_analyzer": ConversationAnalyzer(memory_service),
-            "demand_aggregator": DemandAggregator(memory_service),
+            "conversation_analyzer": MemoizedTool(
+                analisador,
+                self.memo,
+                secoes_ao_vivo={"leitura_mensagens": analisador.resumo_leitura}
+            ),
+            "demand_aggregator": MemoizedTool(
+                DemandAggregator(memory_service), self.memo
+            ),
             "lead_scorer": LeadScorer(),
-            "performance_calculator": PerformanceCalculator(memory_service),
+            "performance_calculator": MemoizedTool(
+                PerformanceCalculator(memory_service), self.memo
+            ),
             "conversion_tracker": ConversionTracker(),
         }
         
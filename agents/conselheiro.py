@@ -1,17 +1,25 @@
 """
 Agente Conselheiro - Gera mensagens claras e acionáveis para o corretor
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+import asyncio
+import inspect
+from loguru import logger
 from agno.agent import Agent
 from agno.models.google import Gemini
 from models import Evento, Lead
+from memory import DelayedQueue, SuggestionCache, prioridade_de
+from memory.sugestoes import MARCADOR_NOME, fingerprint_sugestao
+from workers import GenerationBatcher, LatencyBudget
+from workers.latency import OrcamentoEsgotado, urgencia_maxima
 from tools import (
     WhatsAppSender,
     MessageComposer,
     TimingOptimizer,
     ContextLoader,
     MessageTemplates,
+    NotificationScheduler,
 )
 
 
@@ -59,20 +67,58 @@ TOM DE VOZ: Colega experiente, pragmático, zero enrolação.
 Você não é um assistente formal. Você é um parceiro de trabalho direto.
 """
     
+    # Rótulos usados nos digests de eventos agrupados
+    ROTULOS_AGRUPAMENTO = {
+        "novo_lead": "novos leads",
+        "lead_sem_resposta": "leads sem resposta",
+        "cliente_urgente": "clientes com urgência",
+        "visita_proxima": "visitas próximas",
+        "padrao_detectado": "padrões detectados",
+        "imovel_mudanca_preco": "mudanças de preço",
+        "follow_up_pendente": "follow-ups pendentes",
+    }
+    
     def __init__(
         self,
         memory_service,
-        twilio_client=None
+        twilio_client=None,
+        fila_atrasada=None,
+        modelo=None,
+        sugestoes=None,
+        janela_lote_ms: int = 50,
+        max_lote: int = 10,
+        orcamentos_ms: Optional[Dict[str, int]] = None,
+        fuso: str = "America/Sao_Paulo"
     ):
+        """
+        Args:
+            modelo: async (prompt) -> texto; padrão é o agente Gemini.
+                Nos testes, um modelo local falso.
+            sugestoes: cache de sugestões (memory.SuggestionCache)
+            janela_lote_ms, max_lote: micro-lotes de pedidos ao modelo
+            orcamentos_ms: prazo das chamadas ao modelo por urgência
+            fuso: fuso horário dos corretores (janelas de envio)
+        """
         self.memory = memory_service
+        self.fila_atrasada = fila_atrasada or DelayedQueue(
+            getattr(memory_service, "redis", None)
+        )
+        self.sugestoes = sugestoes or SuggestionCache(
+            redis_client=getattr(memory_service, "redis", None)
+        )
+        
+        # Templates compilados (compartilhados com o composer para que os
+        # contadores do teste A/B fiquem num lugar só)
+        templates = MessageTemplates(getattr(memory_service, "redis", None))
         
         # Inicializa ferramentas
         self.tools = {
             "whatsapp_sender": WhatsAppSender(twilio_client),
-            "message_composer": MessageComposer(MessageTemplates()),
-            "timing_optimizer": TimingOptimizer(memory_service),
+            "message_composer": MessageComposer(templates),
+            "timing_optimizer": TimingOptimizer(memory_service, fuso),
             "context_loader": ContextLoader(memory_service),
-            "templates": MessageTemplates(),
+            "templates": templates,
+            "notification_scheduler": NotificationScheduler(self.fila_atrasada),
         }
         
         # Cria agente Agno
@@ -83,15 +129,30 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
             tools=[],  # TODO: Converter tools
             markdown=True,
         )
+        # Prazo por urgência e latência de cada chamada ao modelo
+        self.latencia = LatencyBudget(orcamentos_ms)
+        
+        # Pedidos simultâneos ao modelo saem em um único prompt
+        self.gerador = GenerationBatcher(
+            self.latencia.medir(modelo or self._gerar_com_agente),
+            janela_ms=janela_lote_ms,
+            max_lote=max_lote
+        )
+        self.modelo = self.gerador.gerar
     
     async def comunicar_evento(
         self,
         corretor_id: str,
-        evento: Evento
+        evento: Evento,
+        ate: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Comunica um evento ao corretor
         
+        Args:
+            ate: prazo absoluto do ciclo para o modelo (LatencyBudget.prazo_final);
+                sem ele, vale o orçamento da urgência do evento
+        
         Returns:
             {
                 "enviado": True,
@@ -106,13 +167,20 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
             lead_id=evento.lead_id
         )
         
-        # Compõe mensagem baseada no tipo de evento
-        mensagem = await self._compor_mensagem_evento(evento, contexto)
+        # Compõe mensagem pelo template do tipo de evento
+        composicao = await self._compor_mensagem_evento(
+            corretor_id,
+            evento,
+            contexto,
+            ate
+        )
+        mensagem = composicao["mensagem"]
         
         # Verifica timing
+        urgencia = getattr(evento.urgencia, "value", evento.urgencia)
         timing = await self.tools["timing_optimizer"].execute(
             corretor_id,
-            urgencia=evento.urgencia.value
+            urgencia=urgencia
         )
         
         # Envia ou agenda
@@ -120,21 +188,40 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
             corretor = await self.memory.get_corretor(corretor_id)
             resultado = await self.tools["whatsapp_sender"].execute(
                 corretor.telefone,
-                mensagem
+                mensagem,
+                prioridade="alta" if urgencia == "alta" else "normal"
             )
+            if resultado["sucesso"]:
+                self.tools["templates"].registrar_envio(
+                    composicao["template_usado"],
+                    corretor_id
+                )
+                if composicao["fallback_modelo"] is not None:
+                    self.latencia.registrar_envio(composicao["fallback_modelo"])
             return {
-                "enviado": True,
+                "enviado": resultado["sucesso"],
                 "mensagem": mensagem,
+                "template_usado": composicao["template_usado"],
                 "horario": resultado["horario_envio"],
                 "agendado": False
             }
         else:
-            # Agenda para depois
+            # Agenda para depois (envio do template e fallback contam na entrega)
+            agendamento = await self._agendar_mensagem(
+                corretor_id,
+                mensagem,
+                timing["horario_recomendado"],
+                prioridade_de(evento.urgencia),
+                template_id=composicao["template_usado"],
+                fallback_modelo=composicao["fallback_modelo"]
+            )
             return {
                 "enviado": False,
                 "mensagem": mensagem,
+                "template_usado": composicao["template_usado"],
                 "horario": timing["horario_recomendado"],
                 "agendado": True,
+                "job_id": agendamento["job_id"],
                 "motivo": timing["motivo"]
             }
     
@@ -146,20 +233,10 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
         """
         Envia resumo diário ao corretor
         """
-        mensagem = self._formatar_resumo_diario(briefing)
-        
-        corretor = await self.memory.get_corretor(corretor_id)
-        resultado = await self.tools["whatsapp_sender"].execute(
-            corretor.telefone,
-            mensagem
+        resultados = await self.comunicar_resumos(
+            [(corretor_id, "resumo_diario", briefing)]
         )
-        
-        return {
-            "enviado": True,
-            "tipo": "resumo_diario",
-            "mensagem": mensagem,
-            "horario": resultado["horario_envio"]
-        }
+        return resultados[0]
     
     async def comunicar_resumo_semanal(
         self,
@@ -169,20 +246,49 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
         """
         Envia resumo semanal ao corretor
         """
-        mensagem = self._formatar_resumo_semanal(relatorio)
-        
-        corretor = await self.memory.get_corretor(corretor_id)
-        resultado = await self.tools["whatsapp_sender"].execute(
-            corretor.telefone,
-            mensagem
+        resultados = await self.comunicar_resumos(
+            [(corretor_id, "resumo_semanal", relatorio)]
         )
+        return resultados[0]
+    
+    async def comunicar_resumos(
+        self,
+        resumos: List[tuple]
+    ) -> List[Dict[str, Any]]:
+        """
+        Envia resumos de vários corretores em um único lote
         
-        return {
-            "enviado": True,
-            "tipo": "resumo_semanal",
-            "mensagem": mensagem,
-            "horario": resultado["horario_envio"]
+        Args:
+            resumos: [(corretor_id, "resumo_diario" | "resumo_semanal", dados)]
+        
+        Returns:
+            Um resultado por resumo, na mesma ordem
+        """
+        formatadores = {
+            "resumo_diario": self._formatar_resumo_diario,
+            "resumo_semanal": self._formatar_resumo_semanal,
         }
+        mensagens = [formatadores[tipo](dados) for _, tipo, dados in resumos]
+        
+        corretores = await asyncio.gather(*[
+            self.memory.get_corretor(corretor_id)
+            for corretor_id, _, _ in resumos
+        ])
+        
+        envios = await self.tools["whatsapp_sender"].send_many([
+            {"destinatario": corretor.telefone, "mensagem": mensagem}
+            for corretor, mensagem in zip(corretores, mensagens)
+        ])
+        
+        return [
+            {
+                "enviado": envio["sucesso"],
+                "tipo": tipo,
+                "mensagem": mensagem,
+                "horario": envio["horario_envio"]
+            }
+            for (_, tipo, _), mensagem, envio in zip(resumos, mensagens, envios)
+        ]
     
     async def comunicar_padrao_detectado(
         self,
@@ -192,7 +298,16 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
         """
         Comunica padrão emergente detectado
         """
-        mensagem = self._formatar_padrao(padrao)
+        composicao = await self.tools["message_composer"].execute(
+            "padrao_detectado",
+            {
+                "descricao_padrao": padrao["descricao"],
+                "oportunidade": "revisar carteira para atender essa demanda",
+                "sugestao_acao": f"Relevância: {padrao.get('relevancia', 'média')}",
+            },
+            corretor_id
+        )
+        mensagem = composicao["mensagem"]
         
         timing = await self.tools["timing_optimizer"].execute(
             corretor_id,
@@ -205,125 +320,301 @@ Você não é um assistente formal. Você é um parceiro de trabalho direto.
                 corretor.telefone,
                 mensagem
             )
+            if resultado["sucesso"]:
+                self.tools["templates"].registrar_envio(
+                    composicao["template_usado"],
+                    corretor_id
+                )
             return {
-                "enviado": True,
+                "enviado": resultado["sucesso"],
                 "mensagem": mensagem,
                 "horario": resultado["horario_envio"]
             }
         
+        agendamento = await self._agendar_mensagem(
+            corretor_id,
+            mensagem,
+            timing["horario_recomendado"],
+            prioridade_de("media"),
+            template_id=composicao["template_usado"]
+        )
         return {
             "enviado": False,
             "mensagem": mensagem,
             "agendado": True,
+            "job_id": agendamento["job_id"],
+            "horario": timing["horario_recomendado"]
+        }
+    
+    async def comunicar_digest(
+        self,
+        corretor_id: str,
+        eventos: List[Evento]
+    ) -> Dict[str, Any]:
+        """
+        Comunica vários eventos agrupados em uma única mensagem
+        """
+        mensagem = self._formatar_digest(eventos)
+        
+        timing = await self.tools["timing_optimizer"].execute(
+            corretor_id,
+            urgencia="media"
+        )
+        
+        if timing["enviar_agora"]:
+            corretor = await self.memory.get_corretor(corretor_id)
+            resultado = await self.tools["whatsapp_sender"].execute(
+                corretor.telefone,
+                mensagem
+            )
+            return {
+                "enviado": resultado["sucesso"],
+                "agendado": False,
+                "mensagem": mensagem,
+                "horario": resultado["horario_envio"]
+            }
+        
+        agendamento = await self._agendar_mensagem(
+            corretor_id,
+            mensagem,
+            timing["horario_recomendado"],
+            prioridade_de("media")
+        )
+        return {
+            "enviado": False,
+            "agendado": True,
+            "job_id": agendamento["job_id"],
+            "mensagem": mensagem,
             "horario": timing["horario_recomendado"]
         }
     
     async def sugerir_mensagem_para_lead(
         self,
         lead: Lead,
-        contexto: str
+        contexto: str,
+        urgencia: Optional[str] = None,
+        ate: Optional[float] = None
     ) -> str:
         """
         Gera sugestão de mensagem para o corretor enviar ao lead
+        
+        Situações equivalentes (mesmo fingerprint) reaproveitam a sugestão
+        do cache; só o primeiro nome do lead é trocado. Com `urgencia` (ou
+        o prazo absoluto `ate`), o modelo tem esse prazo: estourado, vale a
+        sugestão fixa e a geração termina em segundo plano (fica no cache).
+        """
+        texto, _ = await self._sugerir(lead, contexto, urgencia, ate)
+        return texto
+    
+    async def _sugerir(
+        self,
+        lead: Lead,
+        contexto: str,
+        urgencia: Optional[str] = None,
+        ate: Optional[float] = None
+    ) -> Tuple[str, bool]:
+        """Sugestão e se ela é a sugestão fixa (fallback do modelo)"""
+        geracao = self.sugestoes.obter_ou_gerar(
+            fingerprint_sugestao(lead, contexto),
+            lambda: self._gerar_sugestao(lead, contexto)
+        )
+        fallback = False
+        try:
+            if urgencia is None and ate is None:
+                texto = await geracao
+            else:
+                texto = await self.latencia.dentro_do_prazo(geracao, urgencia, ate)
+        except OrcamentoEsgotado as e:
+            logger.info(f"Sugestão para lead {lead.id} pelo template: {e}")
+            texto, fallback = self._sugestao_padrao(lead), True
+        except Exception as e:
+            logger.warning(f"Falha ao gerar sugestão para lead {lead.id}: {e}")
+            texto, fallback = self._sugestao_padrao(lead), True
+        
+        return texto.replace(MARCADOR_NOME, lead.nome.split()[0]), fallback
+    
+    async def preparar_sugestoes(
+        self,
+        eventos: List[Evento],
+        ate: Optional[float] = None
+    ):
         """
-        # TODO: Usar LLM para gerar mensagem contextual e personalizada
+        Gera juntas as sugestões dos LEAD_SEM_RESPOSTA do ciclo
         
-        # Por enquanto, template simples
+        Os pedidos chegam ao modelo na mesma janela (um lote só) e ficam no
+        cache; a composição de cada mensagem depois só lê o cache.
+        
+        Args:
+            ate: prazo absoluto do ciclo; sem ele, o orçamento do evento
+                mais urgente contado agora
+        """
+        alvos = [
+            e for e in eventos
+            if getattr(e.tipo, "value", e.tipo) == "lead_sem_resposta" and e.lead_id
+        ]
+        if len(alvos) < 2:
+            return
+        
+        leads = await asyncio.gather(*[self.memory.get_lead(e.lead_id) for e in alvos])
+        geracao = asyncio.gather(*[
+            self.sugerir_mensagem_para_lead(lead, contexto=evento.descricao)
+            for lead, evento in zip(leads, alvos)
+            if lead
+        ])
+        
+        # O ciclo espera no máximo o prazo do evento mais urgente. Esgotar
+        # aqui não é fallback: só conta a mensagem que sair sem o modelo.
+        try:
+            await self.latencia.dentro_do_prazo(geracao, urgencia_maxima(alvos), ate)
+        except OrcamentoEsgotado:
+            pass
+    
+    async def _gerar_sugestao(self, lead: Lead, contexto: str) -> str:
+        """Sugestão do modelo, com MARCADOR_NOME no lugar do nome do lead"""
+        texto = (await self.modelo(self._prompt_sugestao(lead, contexto))).strip()
+        if MARCADOR_NOME not in texto:
+            raise ValueError("Sugestão sem o marcador do nome do lead")
+        return texto
+    
+    def _prompt_sugestao(self, lead: Lead, contexto: str) -> str:
+        busca = lead.busca
+        return f"""Escreva uma mensagem curta de WhatsApp que o corretor vai enviar ao lead.
+
+Situação: {contexto}
+Busca do lead: {busca.tipo or 'imóvel'}, bairros: {', '.join(busca.bairros) or 'não informados'}, características: {', '.join(busca.caracteristicas) or 'nenhuma'}, financiamento: {'sim' if busca.financiamento else 'não'}
+
+Use exatamente {MARCADOR_NOME} no lugar do nome do lead.
+Termine com uma pergunta que leve ao próximo passo. Responda só com a mensagem."""
+    
+    async def _gerar_com_agente(self, prompt: str) -> str:
+        """Consome a resposta do agente em streaming"""
+        fluxo = self.agent.arun(prompt, stream=True)
+        if inspect.isawaitable(fluxo):
+            fluxo = await fluxo
+        
+        partes = []
+        async for parte in fluxo:
+            # O evento final repete o conteúdo completo
+            if str(getattr(parte, "event", "")).endswith("Completed"):
+                continue
+            conteudo = getattr(parte, "content", None)
+            if isinstance(conteudo, str):
+                partes.append(conteudo)
+        return "".join(partes)
+    
+    def _sugestao_padrao(self, lead: Lead) -> str:
+        """Sugestão fixa (sem modelo)"""
         if "financiamento" in lead.busca.caracteristicas:
-            return f"""Oi {lead.nome.split()[0]}! Vi que você perguntou sobre financiamento.
+            return f"""Oi {MARCADOR_NOME}! Vi que você perguntou sobre financiamento.
 
 Tenho boas notícias: esse imóvel aceita até 80% financiado.
 
 Quer que eu te mande uma simulação com as taxas atuais?"""
         
-        return f"""Oi {lead.nome.split()[0]}! Ainda interessado no imóvel?
+        return f"""Oi {MARCADOR_NOME}! Ainda interessado no imóvel?
 
 Tenho algumas opções que se encaixam no que você busca.
 
 Quando podemos conversar?"""
     
+    async def _agendar_mensagem(
+        self,
+        corretor_id: str,
+        mensagem: str,
+        horario: str,
+        prioridade: int,
+        template_id: Optional[str] = None,
+        fallback_modelo: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """Coloca a mensagem na fila persistente de envio futuro"""
+        corretor = await self.memory.get_corretor(corretor_id)
+        return await self.tools["notification_scheduler"].execute(
+            corretor.telefone,
+            mensagem,
+            datetime.fromisoformat(horario),
+            prioridade,
+            corretor_id=corretor_id,
+            template_id=template_id,
+            fallback_modelo=fallback_modelo
+        )
+    
     async def _compor_mensagem_evento(
         self,
+        corretor_id: str,
         evento: Evento,
-        contexto: Dict[str, Any]
-    ) -> str:
-        """Compõe mensagem baseada no tipo de evento"""
-        
-        if evento.tipo == "novo_lead":
-            return self._formatar_novo_lead(evento)
+        contexto: Dict[str, Any],
+        ate: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Compõe a mensagem do evento pelo MessageComposer (template e
+        variante A/B do corretor)
         
-        elif evento.tipo == "lead_sem_resposta":
-            return await self._formatar_lead_sem_resposta(evento)
+        Returns:
+            {"mensagem": "...", "template_usado": "novo_lead_v2", "tom": "direto",
+             "fallback_modelo": None}  # True/False se a mensagem usa o modelo
+        """
+        tipo = getattr(evento.tipo, "value", evento.tipo)
+        metadata = evento.metadata
+        fallback = None
+        
+        if tipo == "novo_lead":
+            nome = metadata.get("nome") or "Nome não informado"
+            variaveis = {
+                "nome": nome,
+                "origem": metadata.get("origem") or "N/A",
+                "descricao_busca": (
+                    metadata.get("imovel_interesse")
+                    or metadata.get("descricao_busca")
+                    or evento.descricao
+                ),
+                "sugestao_mensagem": self._sugestao_primeiro_contato(nome),
+            }
         
-        elif evento.tipo == "visita_proxima":
-            return self._formatar_visita_proxima(evento)
+        elif tipo == "lead_sem_resposta":
+            lead = await self.memory.get_lead(evento.lead_id)
+            sugestao, fallback = await self._sugerir(
+                lead,
+                contexto=evento.descricao,
+                urgencia=evento.urgencia,
+                ate=ate
+            )
+            variaveis = {
+                "nome": metadata["nome"],
+                "descricao_lead": f"score {metadata['score']}/10",
+                "horas": metadata["horas_sem_resposta"],
+                "contexto_lead": evento.descricao,
+                "sugestao_mensagem": sugestao,
+            }
         
-        elif evento.tipo == "cliente_urgente":
-            return self._formatar_cliente_urgente(evento)
+        elif tipo == "visita_proxima":
+            variaveis = {
+                "minutos_ate": metadata["minutos_ate"],
+                "lead_nome": metadata["lead_nome"],
+                "imovel": metadata["imovel"],
+            }
         
         else:
-            # Formato genérico
-            return f"""🔔 {evento.titulo}
-
-{evento.descricao}
-
-{evento.acao_recomendada or ''}"""
-    
-    def _formatar_novo_lead(self, evento: Evento) -> str:
-        """Formata mensagem de novo lead"""
-        metadata = evento.metadata
-        
-        return f"""🔔 Novo lead: {metadata.get('nome', 'Nome não informado')}
-
-Origem: {metadata.get('origem', 'N/A')}
-Interesse: {metadata.get('imovel_interesse', metadata.get('descricao_busca', 'Não especificado'))}
-
-💡 Responder em até 5min aumenta conversão em 9x
-
-{evento.acao_recomendada or 'Fazer primeiro contato'}"""
-    
-    async def _formatar_lead_sem_resposta(self, evento: Evento) -> str:
-        """Formata mensagem de lead sem resposta"""
-        metadata = evento.metadata
-        lead_id = evento.lead_id
-        
-        # Busca lead completo
-        lead = await self.memory.get_lead(lead_id)
+            # cliente_urgente e formato genérico dos demais tipos
+            tipo = "cliente_urgente" if tipo == "cliente_urgente" else "evento"
+            variaveis = {
+                "titulo": evento.titulo,
+                "descricao": evento.descricao,
+                "acao_recomendada": evento.acao_recomendada or "",
+            }
         
-        # Gera sugestão de mensagem
-        sugestao = await self.sugerir_mensagem_para_lead(
-            lead,
-            contexto=evento.descricao
+        composicao = await self.tools["message_composer"].execute(
+            tipo,
+            variaveis,
+            corretor_id
         )
-        
-        return f"""⏰ {metadata['nome']} não recebeu resposta há {metadata['horas_sem_resposta']}h
-
-Score: {metadata['score']}/10
-{evento.descricao}
-
-Sugestão de mensagem:
-"{sugestao}"
-
-Enviar?"""
+        return {**composicao, "fallback_modelo": fallback}
     
-    def _formatar_visita_proxima(self, evento: Evento) -> str:
-        """Formata lembrete de visita"""
-        metadata = evento.metadata
-        
-        return f"""⏰ Visita em {metadata['minutos_ate']} minutos
-
-Cliente: {metadata['lead_nome']}
-Local: {metadata['imovel']}
-
-Tudo pronto?"""
-    
-    def _formatar_cliente_urgente(self, evento: Evento) -> str:
-        """Formata alerta de cliente urgente"""
-        return f"""🔔 URGENTE: {evento.titulo}
-
-{evento.descricao}
-
-{evento.acao_recomendada}"""
+    def _sugestao_primeiro_contato(self, nome: str) -> str:
+        """Primeira resposta sugerida a um novo lead (sem modelo)"""
+        return (
+            f"Oi {nome.split()[0]}! Obrigado pelo contato. "
+            "Me conta o que você está buscando que eu te mando as melhores opções."
+        )
     
     def _formatar_resumo_diario(self, briefing: Dict[str, Any]) -> str:
         """Formata resumo do dia"""
@@ -346,8 +637,39 @@ Visitas: {metricas.get('visitas_agendadas', 0)}
             for insight in insights[:3]:  # Top 3
                 msg += f"• {insight}\n"
         
+        eventos_pendentes = briefing.get("eventos_pendentes", [])
+        if eventos_pendentes:
+            msg += "\n🔔 Pendentes:\n"
+            msg += self._formatar_eventos_agrupados(eventos_pendentes)
+        
         return msg.strip()
     
+    def _formatar_digest(self, eventos: List[Evento]) -> str:
+        """Formata vários eventos agrupados"""
+        return f"""🔔 {len(eventos)} alertas desde a última mensagem:
+
+{self._formatar_eventos_agrupados(eventos)}"""
+    
+    def _formatar_eventos_agrupados(self, eventos: List[Evento]) -> str:
+        """Uma linha por tipo de evento, com os principais nomes"""
+        por_tipo: Dict[str, List[Evento]] = {}
+        for evento in eventos:
+            por_tipo.setdefault(getattr(evento.tipo, "value", evento.tipo), []).append(evento)
+        
+        linhas = []
+        for tipo, grupo in por_tipo.items():
+            rotulo = self.ROTULOS_AGRUPAMENTO.get(tipo, tipo.replace("_", " "))
+            nomes = [
+                e.metadata.get("nome") or e.metadata.get("lead_nome") or e.titulo
+                for e in grupo
+            ]
+            detalhe = ", ".join(nomes[:3])
+            if len(nomes) > 3:
+                detalhe += f" +{len(nomes) - 3}"
+            linhas.append(f"• {len(grupo)} {rotulo}: {detalhe}")
+        
+        return "\n".join(linhas) + "\n"
+    
     def _formatar_resumo_semanal(self, relatorio: Dict[str, Any]) -> str:
         """Formata resumo semanal"""
         metricas = relatorio.get("metricas", {})
@@ -375,13 +697,3 @@ Visitas: {metricas.get('visitas_agendadas', 0)}
         msg += "Quer ver a análise completa?"
         
         return msg
-    
-    def _formatar_padrao(self, padrao: Dict[str, Any]) -> str:
-        """Formata padrão detectado"""
-        return f"""💡 Padrão detectado:
-
-{padrao['descricao']}
-
-Relevância: {padrao.get('relevancia', 'média')}
-
-Oportunidade: revisar carteira para atender essa demanda"""
@@ -2,16 +2,69 @@
 Orquestrador - Coordena os três agentes e gerencia prioridades
 """
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, time, timedelta
+import asyncio
 from agno.agent import Agent
 from agno.models.google import Gemini
 from agno.os import AgentOS
-from models import Evento, EventoUrgencia
+from loguru import logger
+from models import Compromisso, Evento, EventoUrgencia
+from memory import (
+    SuppressionStore,
+    DelayedQueue,
+    CoalescingBuffer,
+    QuotaStore,
+    ResumoCache,
+    ciclo_identidade,
+    prioridade_de,
+)
+from memory.janelas import epoch_utc, utc_naive
+from workers import OutboundScheduler
+from workers.latency import urgencia_maxima
 from .vigilante import AgenteVigilante
 from .analista import AgenteAnalista
 from .conselheiro import AgenteConselheiro
 
 
+# Pesos de priorização (pré-calculados; chaves pelo valor do enum,
+# já que Evento usa use_enum_values)
+PESO_URGENCIA = {
+    EventoUrgencia.ALTA.value: 3,
+    EventoUrgencia.MEDIA.value: 2,
+    EventoUrgencia.BAIXA.value: 1
+}
+
+PESO_TIPO = {
+    "novo_lead": 10,
+    "cliente_urgente": 9,
+    "lead_sem_resposta": 8,
+    "visita_proxima": 7,
+    "padrao_detectado": 5,
+    "imovel_mudanca_preco": 4,
+    "follow_up_pendente": 3
+}
+
+
+def chave_prioridade(evento: Evento) -> tuple:
+    """
+    Chave de prioridade de um evento, comparável entre corretores
+    
+    Critérios:
+    1. Urgência (alta > media > baixa)
+    2. Tipo (novo_lead > lead_sem_resposta > outros)
+    3. Score do lead (se aplicável)
+    """
+    return (
+        PESO_URGENCIA.get(getattr(evento.urgencia, "value", evento.urgencia), 0),
+        PESO_TIPO.get(getattr(evento.tipo, "value", evento.tipo), 0),
+        evento.metadata.get("score") or 0
+    )
+
+
+# Resumos cedem a vez a qualquer evento na fila de saída
+CHAVE_RESUMO = (PESO_URGENCIA[EventoUrgencia.BAIXA.value], 0, 0)
+
+
 class Orquestrador:
     """
     O Orquestrador coordena o Vigilante, o Analista e o Conselheiro 
@@ -64,14 +117,49 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
     def __init__(
         self,
         memory_service,
-        twilio_client=None
+        twilio_client=None,
+        calendar_index=None,
+        carteira_client=None,
+        caixa_entrada=None,
+        fila_atrasada=None,
+        agrupamento=None,
+        cota=None,
+        suavizar_cota: bool = False,
+        saida=None,
+        resumos=None,
+        sugestoes=None,
+        supressao=None,
+        janela_lote_ms: int = 50,
+        max_lote_modelo: int = 10,
+        orcamentos_modelo_ms=None,
+        fuso: str = "America/Sao_Paulo"
     ):
         self.memory = memory_service
         
+        # Fila persistente de entregas futuras (eventos e mensagens)
+        self.fila_atrasada = fila_atrasada or DelayedQueue(
+            getattr(memory_service, "redis", None)
+        )
+        
         # Inicializa os três agentes
-        self.vigilante = AgenteVigilante(memory_service, twilio_client)
+        self.vigilante = AgenteVigilante(
+            memory_service,
+            twilio_client,
+            calendar_index=calendar_index,
+            carteira_client=carteira_client,
+            caixa_entrada=caixa_entrada
+        )
         self.analista = AgenteAnalista(memory_service)
-        self.conselheiro = AgenteConselheiro(memory_service, twilio_client)
+        self.conselheiro = AgenteConselheiro(
+            memory_service,
+            twilio_client,
+            fila_atrasada=self.fila_atrasada,
+            sugestoes=sugestoes,
+            janela_lote_ms=janela_lote_ms,
+            max_lote=max_lote_modelo,
+            orcamentos_ms=orcamentos_modelo_ms,
+            fuso=fuso
+        )
         
         # Cria AgentOS com os três agentes
         self.agent_os = AgentOS(
@@ -82,8 +170,28 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
             ]
         )
         
-        # Controle de mensagens enviadas
-        self.mensagens_hoje = {}  # corretor_id -> count
+        # Controle de mensagens enviadas (cota diária compartilhada)
+        self.cota = cota or QuotaStore(getattr(memory_service, "redis", None))
+        self.suavizar_cota = suavizar_cota
+        
+        # Capacidade de envio compartilhada por todos os corretores,
+        # distribuída por prioridade
+        self.saida = saida or OutboundScheduler()
+        
+        # Briefings pré-calculados antes do horário dos resumos
+        self.resumos = resumos or ResumoCache(getattr(memory_service, "redis", None))
+        
+        # Situações já reportadas em ciclos anteriores
+        self.supressao = supressao or SuppressionStore(
+            getattr(memory_service, "redis", None)
+        )
+        
+        # Eventos não urgentes agrupados em um digest por corretor
+        self.agrupamento = agrupamento or CoalescingBuffer(
+            getattr(memory_service, "redis", None)
+        )
+        
+        self.stats = {"resumos_enviados": 0, "resumos_falhas": 0}
     
     async def processar_corretor(
         self, 
@@ -100,64 +208,199 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
         Returns:
             {
                 "eventos_detectados": 5,
+                "eventos_suprimidos": 2,
                 "eventos_processados": 3,
                 "mensagens_enviadas": 2,
                 "mensagens_agendadas": 1,
-                "insights_gerados": 1
+                "insights_gerados": 1,
+                "leituras_evitadas": 4
             }
+        
+        `leituras_evitadas` conta as buscas de corretor/lead servidas pelo
+        mapa de identidade do ciclo em vez do Redis/banco.
         """
+        with ciclo_identidade():
+            # 1. Vigilante detecta eventos
+            eventos = await self.vigilante.monitorar_corretor(corretor_id)
+            
+            return await self.processar_eventos(corretor_id, eventos)
+    
+    async def processar_mensagens_recebidas(
+        self,
+        corretor_id: str,
+        mensagens: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Processa mensagens recebidas pelo webhook (via fila de ingestão),
+        sem esperar o próximo ciclo do Vigilante
+        """
+        eventos = self.vigilante.eventos_de_mensagens(corretor_id, mensagens)
+        return await self.processar_eventos(corretor_id, eventos)
+    
+    async def processar_eventos(
+        self,
+        corretor_id: str,
+        eventos: List[Evento],
+        filtrar_repetidos: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Filtra, prioriza e comunica eventos de um corretor
+        
+        Eventos reagendados já passaram pela supressão e usam
+        `filtrar_repetidos=False`.
+        """
+        with ciclo_identidade() as mapa:
+            resultado = await self._processar_eventos(
+                corretor_id,
+                eventos,
+                filtrar_repetidos
+            )
+            resultado["leituras_evitadas"] = mapa.stats["evitadas"]
+        
+        return resultado
+    
+    async def _processar_eventos(
+        self,
+        corretor_id: str,
+        eventos: List[Evento],
+        filtrar_repetidos: bool
+    ) -> Dict[str, Any]:
         resultado = {
-            "eventos_detectados": 0,
+            "eventos_detectados": len(eventos),
+            "eventos_suprimidos": 0,
             "eventos_processados": 0,
             "mensagens_enviadas": 0,
             "mensagens_agendadas": 0,
             "insights_gerados": 0
         }
         
-        # 1. Vigilante detecta eventos
-        eventos = await self.vigilante.monitorar_corretor(corretor_id)
-        resultado["eventos_detectados"] = len(eventos)
+        # Situações já reportadas pulam priorização e composição
+        if filtrar_repetidos:
+            eventos = await self.supressao.filtrar_novos(eventos)
+        resultado["eventos_suprimidos"] = resultado["eventos_detectados"] - len(eventos)
         
         if not eventos:
             return resultado
         
+        # Só contam como reportados os eventos enviados, agendados ou
+        # agrupados; os demais podem voltar no próximo ciclo
+        reportados: List[Evento] = []
+        try:
+            await self._comunicar_eventos(corretor_id, eventos, resultado, reportados)
+        finally:
+            if filtrar_repetidos:
+                ids = {evento.id for evento in reportados}
+                await self.supressao.confirmar(reportados)
+                await self.supressao.liberar([e for e in eventos if e.id not in ids])
+        
+        return resultado
+    
+    async def _comunicar_eventos(
+        self,
+        corretor_id: str,
+        eventos: List[Evento],
+        resultado: Dict[str, Any],
+        reportados: List[Evento]
+    ):
+        # Alertas ativos e contadores do contexto do corretor
+        await self.memory.contexto.registrar_eventos(corretor_id, eventos)
+        
         # 2. Prioriza eventos
         eventos_priorizados = self._priorizar_eventos(eventos)
         
-        # 3. Verifica limite de mensagens do dia
+        # 3. Limite de mensagens do dia é verificado por envio
         corretor = await self.memory.get_corretor(corretor_id)
-        limite_diario = corretor.preferencias.max_mensagens_dia
-        mensagens_enviadas_hoje = self._contar_mensagens_hoje(corretor_id)
+        
+        # Não interrompe o corretor em visitas ou reuniões
+        compromisso = self.corretor_em_visita(corretor_id)
+        
+        # Sugestões dos eventos que saem agora são geradas em lote, todas
+        # dentro de um único prazo do ciclo (o do evento mais urgente).
+        # A geração ocupa uma vaga de saída na prioridade desse evento:
+        # o modelo também é capacidade compartilhada entre os corretores
+        prazo_ciclo = None
+        if not compromisso:
+            imediatos = [
+                e for e in eventos_priorizados if self._deve_enviar_imediato(e)
+            ]
+            prazo_ciclo = self.conselheiro.latencia.prazo_final(
+                urgencia_maxima(imediatos)
+            )
+            if imediatos:
+                async with self.saida.vaga(max(map(chave_prioridade, imediatos))):
+                    await self.conselheiro.preparar_sugestoes(imediatos, ate=prazo_ciclo)
         
         # 4. Processa eventos de acordo com prioridade
         for evento in eventos_priorizados:
-            if mensagens_enviadas_hoje >= limite_diario:
-                # Agenda para amanhã
-                await self._agendar_evento(corretor_id, evento)
+            if compromisso:
+                # Agenda para o fim do compromisso
+                await self._agendar_evento(corretor_id, evento, compromisso.fim)
+                reportados.append(evento)
                 resultado["mensagens_agendadas"] += 1
                 continue
             
             # Decide se envia ou agrupa
-            if self._deve_enviar_imediato(evento):
-                # Envia imediatamente
+            if not self._deve_enviar_imediato(evento):
+                # Agrupa para envio posterior
+                await self._adicionar_a_fila_agrupamento(corretor_id, evento)
+                reportados.append(evento)
+                continue
+            
+            # Verifica e consome a cota em um único round trip
+            cota = await self._consumir_cota(corretor)
+            if not cota["permitido"]:
+                # Agenda para depois (próximo token ou amanhã)
+                await self._agendar_evento(
+                    corretor_id,
+                    evento,
+                    self._horario_reagendamento(corretor, cota)
+                )
+                reportados.append(evento)
+                resultado["mensagens_agendadas"] += 1
+                continue
+            
+            # Envia imediatamente (na vez da sua prioridade global)
+            async with self.saida.vaga(chave_prioridade(evento)):
                 resultado_envio = await self.conselheiro.comunicar_evento(
                     corretor_id,
-                    evento
+                    evento,
+                    ate=prazo_ciclo
                 )
-                
-                if resultado_envio["enviado"]:
-                    resultado["mensagens_enviadas"] += 1
-                    mensagens_enviadas_hoje += 1
-                    self._registrar_mensagem_enviada(corretor_id)
-                elif resultado_envio["agendado"]:
-                    resultado["mensagens_agendadas"] += 1
-                
-                resultado["eventos_processados"] += 1
+            
+            if resultado_envio["enviado"] or resultado_envio["agendado"]:
+                reportados.append(evento)
+            
+            if resultado_envio["enviado"]:
+                resultado["mensagens_enviadas"] += 1
             else:
-                # Agrupa para envio posterior
-                await self._adicionar_a_fila_agrupamento(corretor_id, evento)
+                # Mensagem adiada pelo timing consome a cota na entrega
+                # (ver `entregar_mensagem_agendada`)
+                await self._devolver_cota(corretor)
+                if resultado_envio["agendado"]:
+                    resultado["mensagens_agendadas"] += 1
+            
+            resultado["eventos_processados"] += 1
+    
+    async def preparar_resumo_diario(
+        self,
+        corretor_id: str,
+        horario: str = "manha"
+    ) -> Dict[str, Any]:
+        """
+        Pré-calcula o briefing do resumo diário (etapa pesada)
         
-        return resultado
+        Roda antes do horário de envio; `gerar_resumo_diario` usa o
+        resultado do cache.
+        """
+        briefing = await self.analista.gerar_briefing_diario(corretor_id)
+        await self.resumos.salvar(f"diario_{horario}", corretor_id, briefing)
+        return briefing
+    
+    async def preparar_resumo_semanal(self, corretor_id: str) -> Dict[str, Any]:
+        """Pré-calcula o relatório do resumo semanal"""
+        relatorio = await self.analista.gerar_relatorio_semanal(corretor_id)
+        await self.resumos.salvar("semanal", corretor_id, relatorio)
+        return relatorio
     
     async def gerar_resumo_diario(
         self, 
@@ -167,23 +410,11 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
         """
         Gera e envia resumo diário
         """
-        # Solicita briefing ao Analista
-        briefing = await self.analista.gerar_briefing_diario(corretor_id)
-        
-        # Adiciona eventos pendentes da fila de agrupamento
-        eventos_pendentes = await self._obter_eventos_agrupados(corretor_id)
-        briefing["eventos_pendentes"] = eventos_pendentes
-        
-        # Conselheiro comunica
-        resultado = await self.conselheiro.comunicar_resumo_diario(
-            corretor_id,
-            briefing
+        resultados = await self.gerar_resumos_em_lote(
+            [corretor_id],
+            f"diario_{horario}"
         )
-        
-        # Limpa fila de agrupamento
-        await self._limpar_fila_agrupamento(corretor_id)
-        
-        return resultado
+        return resultados[corretor_id]
     
     async def gerar_resumo_semanal(
         self, 
@@ -192,16 +423,107 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
         """
         Gera e envia resumo semanal
         """
-        # Solicita relatório ao Analista
-        relatorio = await self.analista.gerar_relatorio_semanal(corretor_id)
+        resultados = await self.gerar_resumos_em_lote([corretor_id], "semanal")
+        return resultados[corretor_id]
+    
+    async def gerar_resumos_em_lote(
+        self,
+        corretor_ids: List[str],
+        tipo: str = "diario_manha"  # diario_manha, diario_noite ou semanal
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Gera e envia resumos de vários corretores
+        
+        Usa os briefings pré-calculados; sem eles, solicita ao Analista.
+        Cada corretor ocupa a sua própria vaga de saída: um lote grande de
+        resumos não segura uma vaga só enquanto envia tudo.
+        
+        Returns:
+            {corretor_id: resultado do envio}
+        """
+        # A falha de um corretor não derruba os demais: vira um resultado
+        # com "erro" e conta em `stats["resumos_falhas"]`
+        resultados: Dict[str, Dict[str, Any]] = {}
+        
+        dados = await asyncio.gather(
+            *[self._dados_resumo(corretor_id, tipo) for corretor_id in corretor_ids],
+            return_exceptions=True
+        )
+        
+        prontos = []
+        for corretor_id, dados_corretor in zip(corretor_ids, dados):
+            if isinstance(dados_corretor, Exception):
+                resultados[corretor_id] = self._falha_resumo(
+                    corretor_id, tipo, "gerar", dados_corretor
+                )
+                continue
+            prontos.append((corretor_id, dados_corretor))
         
         # Conselheiro comunica
-        resultado = await self.conselheiro.comunicar_resumo_semanal(
-            corretor_id,
-            relatorio
+        envios = await asyncio.gather(
+            *[
+                self._enviar_resumo(corretor_id, tipo, dados_corretor)
+                for corretor_id, dados_corretor in prontos
+            ],
+            return_exceptions=True
         )
         
-        return resultado
+        for (corretor_id, _), envio in zip(prontos, envios):
+            if isinstance(envio, Exception):
+                envio = self._falha_resumo(corretor_id, tipo, "enviar", envio)
+            elif envio["enviado"]:
+                self.stats["resumos_enviados"] += 1
+            resultados[corretor_id] = envio
+        
+        return {corretor_id: resultados[corretor_id] for corretor_id in corretor_ids}
+    
+    def _falha_resumo(
+        self,
+        corretor_id: str,
+        tipo: str,
+        etapa: str,
+        erro: Exception
+    ) -> Dict[str, Any]:
+        """Registra a falha do resumo de um corretor"""
+        logger.error(f"Erro ao {etapa} resumo {tipo} de {corretor_id}: {erro}")
+        self.stats["resumos_falhas"] += 1
+        return {"enviado": False, "erro": str(erro)}
+    
+    async def _enviar_resumo(
+        self,
+        corretor_id: str,
+        tipo: str,
+        dados: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Envia o resumo de um corretor na sua vaga de saída"""
+        tipo_resumo = "resumo_semanal" if tipo == "semanal" else "resumo_diario"
+        async with self.saida.vaga(CHAVE_RESUMO):
+            envio, = await self.conselheiro.comunicar_resumos(
+                [(corretor_id, tipo_resumo, dados)]
+            )
+        
+        if envio["enviado"]:
+            # Limpa fila de agrupamento (só o que entrou no resumo)
+            pendentes = dados.get("eventos_pendentes", [])
+            if pendentes:
+                await self._limpar_fila_agrupamento(corretor_id, len(pendentes))
+            await self.resumos.remover(tipo, corretor_id)
+        
+        return envio
+    
+    async def _dados_resumo(self, corretor_id: str, tipo: str) -> Dict[str, Any]:
+        """Briefing/relatório do resumo (do cache, se pré-calculado)"""
+        dados = await self.resumos.obter(tipo, corretor_id)
+        
+        if tipo == "semanal":
+            return dados or await self.analista.gerar_relatorio_semanal(corretor_id)
+        
+        if dados is None:
+            dados = await self.analista.gerar_briefing_diario(corretor_id)
+        
+        # Adiciona eventos pendentes da fila de agrupamento
+        dados["eventos_pendentes"] = await self._obter_eventos_agrupados(corretor_id)
+        return dados
     
     async def detectar_e_comunicar_padroes(
         self, 
@@ -226,92 +548,213 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
         
         return resultados
     
+    async def enviar_digest(self, corretor_id: str) -> Dict[str, Any]:
+        """
+        Descarrega a fila de agrupamento do corretor em uma única mensagem
+        
+        Chamado quando a janela de agrupamento expira ou a fila enche.
+        """
+        # Retirada atômica: outro processo descarregando o mesmo corretor
+        # não envia os mesmos eventos
+        eventos = await self.agrupamento.retirar(corretor_id)
+        if not eventos:
+            return {"enviado": False, "agendado": False, "eventos": 0}
+        
+        corretor = await self.memory.get_corretor(corretor_id)
+        cota = await self._consumir_cota(corretor)
+        if not cota["permitido"]:
+            # Devolve os eventos; entram no próximo resumo ou na próxima janela
+            await self.agrupamento.devolver(corretor_id, eventos)
+            await self.agrupamento.adiar(corretor_id, cota["retry_segundos"])
+            return {"enviado": False, "agendado": False, "eventos": 0}
+        
+        async with self.saida.vaga(max(map(chave_prioridade, eventos))):
+            resultado = await self.conselheiro.comunicar_digest(corretor_id, eventos)
+        if not resultado["enviado"]:
+            await self._devolver_cota(corretor)
+        if not resultado["enviado"] and not resultado["agendado"]:
+            # Falhou: os eventos voltam para o próximo digest
+            await self.agrupamento.devolver(corretor_id, eventos)
+        
+        resultado["eventos"] = len(eventos)
+        return resultado
+    
+    def corretor_em_visita(self, corretor_id: str) -> Optional[Compromisso]:
+        """Visita/reunião em andamento no índice local da agenda (None se livre)"""
+        return self.vigilante.tools["calendar_check"].em_compromisso(corretor_id)
+    
     def _priorizar_eventos(
         self, 
         eventos: List[Evento]
     ) -> List[Evento]:
         """
-        Ordena eventos por prioridade
-        
-        Critérios:
-        1. Urgência (alta > media > baixa)
-        2. Tipo (novo_lead > lead_sem_resposta > outros)
-        3. Score do lead (se aplicável)
+        Ordena eventos por prioridade (ver `chave_prioridade`)
         """
-        def chave_prioridade(evento: Evento) -> tuple:
-            # Peso da urgência
-            urgencia_peso = {
-                EventoUrgencia.ALTA: 3,
-                EventoUrgencia.MEDIA: 2,
-                EventoUrgencia.BAIXA: 1
-            }
-            
-            # Peso do tipo
-            tipo_peso = {
-                "novo_lead": 10,
-                "cliente_urgente": 9,
-                "lead_sem_resposta": 8,
-                "visita_proxima": 7,
-                "padrao_detectado": 5,
-                "imovel_mudanca_preco": 4,
-                "follow_up_pendente": 3
-            }
-            
-            # Score do lead (se existir no metadata)
-            score = evento.metadata.get("score", 0)
-            
-            return (
-                urgencia_peso.get(evento.urgencia, 0),
-                tipo_peso.get(evento.tipo.value, 0),
-                score
-            )
-        
         return sorted(eventos, key=chave_prioridade, reverse=True)
     
     def _deve_enviar_imediato(self, evento: Evento) -> bool:
         """Decide se evento merece envio imediato"""
+        tipo = getattr(evento.tipo, "value", evento.tipo)
+        
         # Urgência alta sempre envia
         if evento.urgencia == EventoUrgencia.ALTA:
             return True
         
         # Novos leads sempre enviam
-        if evento.tipo.value == "novo_lead":
+        if tipo == "novo_lead":
             return True
         
         # Cliente urgente sempre envia
-        if evento.tipo.value == "cliente_urgente":
+        if tipo == "cliente_urgente":
             return True
         
         # Visita em menos de 1h
-        if evento.tipo.value == "visita_proxima":
+        if tipo == "visita_proxima":
             minutos = evento.metadata.get("minutos_ate", 999)
             if minutos < 60:
                 return True
         
         # Lead quente sem resposta
-        if evento.tipo.value == "lead_sem_resposta":
+        if tipo == "lead_sem_resposta":
             score = evento.metadata.get("score", 0)
             if score >= 8:
                 return True
         
         return False
     
-    def _contar_mensagens_hoje(self, corretor_id: str) -> int:
-        """Conta quantas mensagens foram enviadas hoje"""
-        hoje = datetime.utcnow().date()
-        key = f"{corretor_id}_{hoje}"
-        return self.mensagens_hoje.get(key, 0)
+    async def processar_evento_agendado(
+        self,
+        corretor_id: str,
+        evento: Evento
+    ) -> Dict[str, Any]:
+        """Reprocessa um evento que estava na fila de entregas futuras"""
+        return await self.processar_eventos(
+            corretor_id,
+            [evento],
+            filtrar_repetidos=False
+        )
+    
+    async def entregar_mensagem_agendada(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Entrega uma mensagem adiada pelo timing (item "mensagem" da fila)
+        
+        Passa pelas mesmas checagens de um envio imediato: compromisso em
+        andamento e cota do dia, que só é consumida aqui, na entrega.
+        """
+        sender = self.conselheiro.tools["whatsapp_sender"]
+        templates = self.conselheiro.tools["templates"]
+        corretor_id = item.get("corretor_id")
+        
+        if corretor_id is None:
+            # Item sem corretor (agendado antes do corretor_id no payload)
+            envio = await sender.execute(item["destinatario"], item["mensagem"])
+            if envio["sucesso"] and item.get("template"):
+                templates.registrar_envio(item["template"])
+            return {"enviado": envio["sucesso"], "reagendado": False}
+        
+        compromisso = self.corretor_em_visita(corretor_id)
+        if compromisso:
+            await self._reagendar_mensagem(item, compromisso.fim)
+            return {"enviado": False, "reagendado": True}
+        
+        corretor = await self.memory.get_corretor(corretor_id)
+        cota = await self._consumir_cota(corretor)
+        if not cota["permitido"]:
+            await self._reagendar_mensagem(
+                item,
+                self._horario_reagendamento(corretor, cota)
+            )
+            return {"enviado": False, "reagendado": True}
+        
+        envio = await sender.execute(item["destinatario"], item["mensagem"])
+        if not envio["sucesso"]:
+            await self._devolver_cota(corretor)
+        else:
+            if item.get("template"):
+                templates.registrar_envio(item["template"], corretor_id)
+            if item.get("fallback_modelo") is not None:
+                self.conselheiro.latencia.registrar_envio(item["fallback_modelo"])
+        
+        return {"enviado": envio["sucesso"], "reagendado": False}
+    
+    async def _reagendar_mensagem(self, item: Dict[str, Any], horario: datetime):
+        """Devolve uma mensagem agendada à fila para um novo horário"""
+        payload = {
+            chave: valor for chave, valor in item.items()
+            if chave not in ("job_id", "tentativas")
+        }
+        await self.fila_atrasada.enqueue(
+            payload,
+            horario_envio=horario,
+            prioridade=item.get("prioridade", 5)
+        )
+    
+    def _horario_reagendamento(
+        self,
+        corretor,
+        cota: Dict[str, Any]
+    ) -> datetime:
+        """
+        Próximo token da cota ou, se a cota do dia acabou, início do
+        horário preferencial do dia seguinte (no fuso do corretor)
+        """
+        if not cota["esgotada"]:
+            return datetime.utcnow() + timedelta(seconds=cota["retry_segundos"])
+        
+        janelas = self.conselheiro.tools["timing_optimizer"].janelas
+        amanha = janelas.proxima_meia_noite(epoch_utc(datetime.utcnow()))
+        abertura = janelas.abertura_apos(corretor.id, amanha)
+        if abertura is None:
+            janelas.atualizar(corretor)
+            abertura = janelas.abertura_apos(corretor.id, amanha)
+        return utc_naive(abertura)
     
-    def _registrar_mensagem_enviada(self, corretor_id: str):
-        """Registra que uma mensagem foi enviada"""
-        hoje = datetime.utcnow().date()
-        key = f"{corretor_id}_{hoje}"
-        self.mensagens_hoje[key] = self.mensagens_hoje.get(key, 0) + 1
+    async def _consumir_cota(self, corretor) -> Dict[str, Any]:
+        """
+        Consome uma mensagem da cota diária do corretor
+        
+        Com suavização, os tokens são repostos ao longo da jornada do
+        corretor em vez de todos estarem disponíveis de manhã.
+        """
+        limite = corretor.preferencias.max_mensagens_dia
+        intervalo = None
+        
+        if self.suavizar_cota and limite > 0:
+            inicio = datetime.combine(
+                datetime.min, time.fromisoformat(corretor.preferencias.horario_inicio)
+            )
+            fim = datetime.combine(
+                datetime.min, time.fromisoformat(corretor.preferencias.horario_fim)
+            )
+            intervalo = (fim - inicio) / limite
+        
+        return await self.cota.consumir(
+            corretor.id,
+            limite,
+            intervalo,
+            fuso=corretor.preferencias.fuso
+        )
+    
+    async def _devolver_cota(self, corretor):
+        """Devolve a mensagem (e o token) de um envio que não aconteceu"""
+        await self.cota.devolver(corretor.id, fuso=corretor.preferencias.fuso)
     
-    async def _agendar_evento(self, corretor_id: str, evento: Evento):
+    async def _agendar_evento(
+        self,
+        corretor_id: str,
+        evento: Evento,
+        horario: datetime
+    ):
         """Agenda evento para processamento futuro"""
-        # TODO: Implementar com Redis/Celery
-        pass
+        await self.fila_atrasada.enqueue(
+            {
+                "tipo": "evento",
+                "corretor_id": corretor_id,
+                "evento": evento.json()
+            },
+            horario_envio=horario,
+            prioridade=prioridade_de(evento.urgencia)
+        )
     
     async def _adicionar_a_fila_agrupamento(
         self, 
@@ -319,18 +762,23 @@ Seja estratégico: melhor uma comunicação certeira do que muitas irrelevantes.
         evento: Evento
     ):
         """Adiciona evento à fila de agrupamento para envio posterior"""
-        # TODO: Implementar fila de agrupamento
-        pass
+        cheia = await self.agrupamento.adicionar(corretor_id, evento)
+        
+        # Fila cheia não espera a janela expirar
+        if cheia:
+            await self.enviar_digest(corretor_id)
     
     async def _obter_eventos_agrupados(
         self, 
         corretor_id: str
     ) -> List[Evento]:
         """Obtém eventos que foram agrupados"""
-        # TODO: Implementar
-        return []
+        return await self.agrupamento.obter(corretor_id)
     
-    async def _limpar_fila_agrupamento(self, corretor_id: str):
+    async def _limpar_fila_agrupamento(
+        self,
+        corretor_id: str,
+        quantidade: Optional[int] = None
+    ):
         """Limpa fila de eventos agrupados"""
-        # TODO: Implementar
-        pass
+        await self.agrupamento.limpar(corretor_id, quantidade)
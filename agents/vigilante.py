@@ -1,11 +1,12 @@
 """
 Agente Vigilante - Monitora continuamente fontes de dados e detecta eventos
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from agno.agent import Agent
 from agno.models.google import Gemini
 from models import Evento, EventoTipo, EventoUrgencia
+from memory import CalendarIndex, CarteiraDiffer, fingerprint_evento
 from tools import (
     WhatsAppMonitor,
     PortalMonitor,
@@ -50,17 +51,21 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
     def __init__(
         self,
         memory_service,
-        twilio_client=None
+        twilio_client=None,
+        calendar_index=None,
+        carteira_client=None,
+        caixa_entrada=None
     ):
         self.memory = memory_service
+        self.calendar_index = calendar_index or CalendarIndex()
         
         # Inicializa ferramentas
         self.tools = {
-            "whatsapp_monitor": WhatsAppMonitor(twilio_client),
+            "whatsapp_monitor": WhatsAppMonitor(twilio_client, caixa_entrada),
             "portal_monitor": PortalMonitor(),
-            "calendar_check": CalendarCheck(),
+            "calendar_check": CalendarCheck(self.calendar_index),
             "lead_status_check": LeadStatusCheck(memory_service),
-            "imovel_monitor": ImovelMonitor(),
+            "imovel_monitor": ImovelMonitor(CarteiraDiffer(carteira_client)),
         }
         
         # Cria agente Agno
@@ -122,6 +127,38 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
         
         return eventos
     
+    def eventos_de_mensagens(
+        self,
+        corretor_id: str,
+        mensagens: List[Dict[str, Any]]
+    ) -> List[Evento]:
+        """Gera eventos de mensagens recebidas fora do ciclo (ex.: urgentes)"""
+        return self._processar_novas_mensagens(
+            corretor_id,
+            {"novas_mensagens": mensagens}
+        )
+    
+    def _id_evento(
+        self,
+        tipo: EventoTipo,
+        corretor_id: str,
+        sujeito: str,
+        ancora: Optional[datetime] = None
+    ) -> str:
+        """
+        ID determinístico do evento
+        
+        A mesma situação detectada em ciclos seguintes gera o mesmo ID,
+        o que permite suprimir reenvios (ver memory.suppression).
+        """
+        fingerprint = fingerprint_evento(
+            tipo.value,
+            corretor_id,
+            str(sujeito),
+            ancora=ancora
+        )
+        return f"evt_{fingerprint}"
+    
     def _processar_novas_mensagens(
         self, 
         corretor_id: str, 
@@ -137,7 +174,11 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
             if not lead_id:
                 # Novo lead detectado
                 evento = Evento(
-                    id=f"evt_{datetime.utcnow().timestamp()}",
+                    id=self._id_evento(
+                        EventoTipo.NOVO_LEAD,
+                        corretor_id,
+                        msg.get("remetente", msg["nome"])
+                    ),
                     tipo=EventoTipo.NOVO_LEAD,
                     urgencia=EventoUrgencia.ALTA,
                     corretor_id=corretor_id,
@@ -147,6 +188,25 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
                     metadata=msg
                 )
                 eventos.append(evento)
+            
+            elif msg.get("urgente"):
+                # Lead existente mencionou urgência ou prazo
+                evento = Evento(
+                    id=self._id_evento(
+                        EventoTipo.CLIENTE_URGENTE,
+                        corretor_id,
+                        lead_id
+                    ),
+                    tipo=EventoTipo.CLIENTE_URGENTE,
+                    urgencia=EventoUrgencia.ALTA,
+                    corretor_id=corretor_id,
+                    lead_id=lead_id,
+                    titulo=f"{msg['nome']} mencionou urgência",
+                    descricao=f"Mensagem: {msg['conteudo'][:100]}",
+                    acao_recomendada="Responder imediatamente",
+                    metadata=msg
+                )
+                eventos.append(evento)
         
         return eventos
     
@@ -160,7 +220,11 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
         
         for lead in resultado.get("novos_leads", []):
             evento = Evento(
-                id=f"evt_{datetime.utcnow().timestamp()}",
+                id=self._id_evento(
+                    EventoTipo.NOVO_LEAD,
+                    corretor_id,
+                    lead.get("telefone", lead["nome"])
+                ),
                 tipo=EventoTipo.NOVO_LEAD,
                 urgencia=EventoUrgencia.ALTA,
                 corretor_id=corretor_id,
@@ -190,8 +254,17 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
             else:
                 urgencia = EventoUrgencia.BAIXA
             
+            ultima_interacao = lead.get("ultima_interacao")
             evento = Evento(
-                id=f"evt_{datetime.utcnow().timestamp()}",
+                id=self._id_evento(
+                    EventoTipo.LEAD_SEM_RESPOSTA,
+                    corretor_id,
+                    lead["lead_id"],
+                    ancora=(
+                        datetime.fromisoformat(ultima_interacao)
+                        if ultima_interacao else None
+                    )
+                ),
                 tipo=EventoTipo.LEAD_SEM_RESPOSTA,
                 urgencia=urgencia,
                 corretor_id=corretor_id,
@@ -224,7 +297,11 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
                 urgencia = EventoUrgencia.BAIXA
             
             evento = Evento(
-                id=f"evt_{datetime.utcnow().timestamp()}",
+                id=self._id_evento(
+                    EventoTipo.VISITA_PROXIMA,
+                    corretor_id,
+                    compromisso.get("compromisso_id") or compromisso["horario"]
+                ),
                 tipo=EventoTipo.VISITA_PROXIMA,
                 urgencia=urgencia,
                 corretor_id=corretor_id,
@@ -247,7 +324,11 @@ Seja objetivo e preciso. Sua função é detectar, não decidir.
         
         for mudanca in resultado.get("mudancas", []):
             evento = Evento(
-                id=f"evt_{datetime.utcnow().timestamp()}",
+                id=self._id_evento(
+                    EventoTipo.IMOVEL_MUDANCA_PRECO,
+                    corretor_id,
+                    f"{mudanca['imovel_id']}:{mudanca['valor_novo']}"
+                ),
                 tipo=EventoTipo.IMOVEL_MUDANCA_PRECO,
                 urgencia=EventoUrgencia.MEDIA,
                 corretor_id=corretor_id,
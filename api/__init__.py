@@ -0,0 +1,23 @@
+"""
+API de entrada (webhooks) e cliente de envio do WhatsApp
+"""
+from .inbound import InboundBuffer, mensagem_urgente, urgencia_mensagem
+from .webhooks import criar_app, criar_router_status, criar_router_whatsapp
+from .outbound import SendQueue, WhatsAppClient
+from .calendario import CalendarClient, criar_calendar_client
+from .carteira import CarteiraClient, criar_carteira_client
+
+__all__ = [
+    "InboundBuffer",
+    "mensagem_urgente",
+    "urgencia_mensagem",
+    "criar_app",
+    "criar_router_whatsapp",
+    "criar_router_status",
+    "WhatsAppClient",
+    "SendQueue",
+    "CalendarClient",
+    "criar_calendar_client",
+    "CarteiraClient",
+    "criar_carteira_client",
+]
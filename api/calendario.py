@@ -0,0 +1,64 @@
+"""
+Cliente HTTP do provedor de agenda dos corretores
+
+Implementa o contrato esperado por memory.CalendarIndex:
+`listar_alteracoes(corretor_id, sync_token)` devolve
+{"compromissos": [...], "removidos": [...], "proximo_sync_token": "..."}.
+
+O provedor responde em `GET /agendas/{corretor_id}/alteracoes`, com o
+sync_token da última chamada como parâmetro (sem ele, a agenda completa).
+HTTP 410 indica token invalidado pelo provedor (mesma semântica do sync
+incremental do Google Calendar).
+"""
+from typing import Any, Dict, Optional
+import httpx
+from memory import SyncTokenExpirado
+
+
+class CalendarClient:
+    """Consulta alterações da agenda com sync token"""
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        timeout_segundos: float = 10.0,
+        max_conexoes: int = 10
+    ):
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {token}"} if token else None,
+            timeout=timeout_segundos,
+            limits=httpx.Limits(
+                max_connections=max_conexoes,
+                max_keepalive_connections=max_conexoes
+            )
+        )
+
+    async def listar_alteracoes(
+        self,
+        corretor_id: str,
+        sync_token: Optional[str] = None
+    ) -> Dict[str, Any]:
+        params = {"sync_token": sync_token} if sync_token else None
+        resposta = await self.http.get(
+            f"/agendas/{corretor_id}/alteracoes",
+            params=params
+        )
+        if resposta.status_code == 410:
+            raise SyncTokenExpirado(corretor_id)
+        resposta.raise_for_status()
+        return resposta.json()
+
+    async def fechar(self):
+        await self.http.aclose()
+
+
+def criar_calendar_client(
+    base_url: Optional[str],
+    token: Optional[str] = None
+) -> Optional[CalendarClient]:
+    """Cliente do provedor configurado (None = agenda desativada)"""
+    if not base_url:
+        return None
+    return CalendarClient(base_url, token)
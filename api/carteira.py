@@ -0,0 +1,85 @@
+"""
+Cliente HTTP do provedor da carteira de imóveis
+
+Implementa o contrato esperado por memory.CarteiraDiffer:
+
+- `GET  /carteiras/{corretor_id}/raiz?fanout=` -> {"raiz": "..."}
+- `POST /carteiras/{corretor_id}/nos` {"nivel", "indices", "fanout"}
+  -> {"filhos": {"<indice>": ["hash", ...]}}
+- `GET  /carteiras/{corretor_id}/buckets/{bucket}?fanout=` -> {"imoveis": [...]}
+"""
+from typing import Any, Dict, List, Optional
+import httpx
+
+
+class CarteiraClient:
+    """Consulta a árvore de hashes e os buckets da carteira"""
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        timeout_segundos: float = 10.0,
+        max_conexoes: int = 10
+    ):
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {token}"} if token else None,
+            timeout=timeout_segundos,
+            limits=httpx.Limits(
+                max_connections=max_conexoes,
+                max_keepalive_connections=max_conexoes
+            )
+        )
+
+    async def raiz_carteira(self, corretor_id: str, fanout: int) -> str:
+        resposta = await self.http.get(
+            f"/carteiras/{corretor_id}/raiz",
+            params={"fanout": fanout}
+        )
+        resposta.raise_for_status()
+        return resposta.json()["raiz"]
+
+    async def hashes_filhos(
+        self,
+        corretor_id: str,
+        nivel: int,
+        indices: List[int],
+        fanout: int
+    ) -> Dict[int, List[str]]:
+        resposta = await self.http.post(
+            f"/carteiras/{corretor_id}/nos",
+            json={"nivel": nivel, "indices": indices, "fanout": fanout}
+        )
+        resposta.raise_for_status()
+        # Chaves JSON chegam como texto
+        return {
+            int(indice): hashes
+            for indice, hashes in resposta.json()["filhos"].items()
+        }
+
+    async def listar_bucket(
+        self,
+        corretor_id: str,
+        bucket: int,
+        fanout: int
+    ) -> List[Dict[str, Any]]:
+        resposta = await self.http.get(
+            f"/carteiras/{corretor_id}/buckets/{bucket}",
+            params={"fanout": fanout}
+        )
+        resposta.raise_for_status()
+        return resposta.json()["imoveis"]
+
+    async def fechar(self):
+        await self.http.aclose()
+
+
+def criar_carteira_client(
+    base_url: Optional[str],
+    token: Optional[str] = None
+) -> Optional[CarteiraClient]:
+    """Cliente do provedor configurado (None = monitor de imóveis desativado)"""
+    if not base_url:
+        return None
+    return CarteiraClient(base_url, token)
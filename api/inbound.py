@@ -0,0 +1,272 @@
+"""
+Buffer de mensagens recebidas pelo WhatsApp
+
+As mensagens chegam pelo webhook, ficam no buffer por uma janela curta e
+são gravadas em lote no histórico dos leads. Depois da gravação, as
+mensagens de cada corretor seguem para a fila de ingestão na faixa da sua
+urgência (urgentes e novos leads na ALTA). Mensagens urgentes antecipam
+o flush para alguns milissegundos, sem gravar dentro da requisição do
+webhook.
+
+Se a gravação falhar, o lote volta para o buffer até `max_pendentes`
+mensagens; acima disso as mais antigas são descartadas (com log).
+
+Mensagens enviadas pelo próprio corretor (conversa com o Lastro) não vão
+para o histórico: seguem para `on_corretor`.
+"""
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from datetime import datetime
+import asyncio
+import re
+from loguru import logger
+from models import Interacao, InteracaoTipo
+
+
+# Só expressões de prazo explícito: palavras soltas como "hoje" ou "agora"
+# aparecem em quase toda conversa ("posso ver hoje?")
+PALAVRAS_URGENCIA = (
+    "urgente",
+    "urgência",
+    "urgencia",
+    "o quanto antes",
+    "o mais rápido possível",
+    "ainda hoje",
+    "hoje mesmo",
+    "preciso fechar",
+    "outra proposta",
+)
+
+_PADRAO_URGENCIA = re.compile(
+    "|".join(rf"\b{re.escape(p)}\b" for p in PALAVRAS_URGENCIA),
+    re.IGNORECASE
+)
+
+
+def mensagem_urgente(conteudo: str) -> bool:
+    """Detecta menção explícita de urgência ou prazo"""
+    return bool(_PADRAO_URGENCIA.search(conteudo or ""))
+
+
+def urgencia_mensagem(mensagem: Dict[str, Any]) -> str:
+    """
+    Faixa da fila de ingestão para uma mensagem já resolvida
+
+    Remetente desconhecido (possível novo lead) e menção de urgência geram
+    eventos ALTA; respostas comuns de leads conhecidos vão para a BAIXA.
+    """
+    if mensagem.get("urgente") or not mensagem.get("lead_id"):
+        return "alta"
+    return "baixa"
+
+
+def normalizar_telefone(numero: str) -> str:
+    """Remove o prefixo `whatsapp:` usado pelo Twilio"""
+    return (numero or "").replace("whatsapp:", "").strip()
+
+
+class InboundBuffer:
+    """
+    Buffer de mensagens recebidas com gravação em lote
+
+    Cada flush resolve todos os remetentes e grava todas as interações com
+    um número fixo de round trips, independente do tamanho do lote.
+
+    Cada grupo corretor/urgência é entregue a `on_mensagens` (fila de
+    ingestão) logo após a gravação. O estado fica só no histórico dos
+    leads e na fila: nada é guardado por processo para o Vigilante.
+
+    Mensagens cujo remetente é um corretor vão para `on_corretor`.
+    """
+
+    def __init__(
+        self,
+        memory_service,
+        on_mensagens: Optional[
+            Callable[[str, List[Dict[str, Any]], str], Awaitable[Any]]
+        ] = None,
+        on_corretor: Optional[Callable[[str, str], Awaitable[Any]]] = None,
+        janela_segundos: float = 0.5,
+        max_lote: int = 500,
+        atraso_urgente_segundos: float = 0.05,
+        max_pendentes: int = 5000
+    ):
+        self.memory = memory_service
+        self.on_mensagens = on_mensagens
+        self.on_corretor = on_corretor
+        self.janela_segundos = janela_segundos
+        self.max_lote = max_lote
+        self.atraso_urgente_segundos = atraso_urgente_segundos
+        self.max_pendentes = max_pendentes
+
+        self._pendentes: List[Dict[str, Any]] = []
+        self._flush_agendado: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            "recebidas": 0,
+            "flushes": 0,
+            "urgentes": 0,
+            "de_corretores": 0,
+            "descartadas": 0,
+        }
+
+    async def receber(self, mensagem: Dict[str, Any]) -> None:
+        """
+        Enfileira uma mensagem recebida
+
+        Args:
+            mensagem: {"remetente", "destinatario", "conteudo", "nome",
+                       "message_sid"}
+        """
+        mensagem = {
+            **mensagem,
+            "remetente": normalizar_telefone(mensagem.get("remetente")),
+            "destinatario": normalizar_telefone(mensagem.get("destinatario")),
+            "horario": mensagem.get("horario") or datetime.utcnow().isoformat(),
+            "urgente": mensagem_urgente(mensagem.get("conteudo", "")),
+        }
+        self._pendentes.append(mensagem)
+        self.stats["recebidas"] += 1
+
+        if len(self._pendentes) >= self.max_lote:
+            # Lote cheio: grava já (segura o webhook enquanto o banco não drena)
+            await self.flush()
+        elif mensagem["urgente"]:
+            # Urgência: flush quase imediato, fora da requisição
+            self._agendar_flush(self.atraso_urgente_segundos)
+        elif self._flush_agendado is None:
+            self._agendar_flush()
+
+    def _agendar_flush(self, atraso: Optional[float] = None):
+        """Agenda o flush; um flush já agendado para mais cedo é mantido"""
+        loop = asyncio.get_running_loop()
+        atraso = self.janela_segundos if atraso is None else atraso
+
+        if self._flush_agendado is not None:
+            if self._flush_agendado.when() <= loop.time() + atraso:
+                return
+            self._flush_agendado.cancel()
+
+        self._flush_agendado = loop.call_later(
+            atraso,
+            lambda: asyncio.ensure_future(self.flush())
+        )
+
+    async def flush(self) -> int:
+        """Grava as mensagens pendentes em lote. Retorna quantas foram gravadas."""
+        if self._flush_agendado is not None:
+            self._flush_agendado.cancel()
+            self._flush_agendado = None
+
+        async with self._lock:
+            lote, self._pendentes = self._pendentes, []
+            if not lote:
+                return 0
+
+            try:
+                await self._gravar_lote(lote)
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote de mensagens recebidas: {e}")
+                # Devolve o lote e agenda a próxima tentativa
+                self._devolver(lote)
+                self._agendar_flush()
+                return 0
+
+            self.stats["flushes"] += 1
+            return len(lote)
+
+    def _devolver(self, lote: List[Dict[str, Any]]):
+        """Recoloca um lote que falhou na frente, limitado a `max_pendentes`"""
+        pendentes = lote + self._pendentes
+        excesso = len(pendentes) - self.max_pendentes
+
+        if excesso > 0:
+            logger.warning(
+                f"Buffer de mensagens recebidas cheio: descartando as "
+                f"{excesso} mais antigas"
+            )
+            self.stats["descartadas"] += excesso
+            pendentes = pendentes[excesso:]
+
+        self._pendentes = pendentes
+
+    async def _gravar_lote(self, lote: List[Dict[str, Any]]):
+        leads = await self.memory.resolver_remetentes(
+            [m["remetente"] for m in lote]
+        )
+        # Remetente sem lead pode ser o próprio corretor; destinatário
+        # identifica o corretor de um possível novo lead (mesmo round trip)
+        sem_lead = [m for m in lote if m["remetente"] not in leads]
+        corretores = await self.memory.resolver_corretores_por_telefone(
+            [m["remetente"] for m in sem_lead]
+            + [m["destinatario"] for m in sem_lead]
+        )
+
+        interacoes: Dict[str, List[Interacao]] = {}
+        grupos: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        dos_corretores: List[Tuple[str, str]] = []
+
+        for mensagem in lote:
+            lead = leads.get(mensagem["remetente"])
+
+            if lead is None and mensagem["remetente"] in corretores:
+                dos_corretores.append(
+                    (corretores[mensagem["remetente"]], mensagem.get("conteudo", ""))
+                )
+                continue
+
+            if lead:
+                mensagem["lead_id"] = lead.id
+                mensagem["nome"] = lead.nome
+                corretor_id = lead.corretor_id
+                interacoes.setdefault(lead.id, []).append(
+                    Interacao(
+                        data=datetime.fromisoformat(mensagem["horario"]),
+                        tipo=InteracaoTipo.MENSAGEM_RECEBIDA,
+                        conteudo=mensagem.get("conteudo", ""),
+                        metadata={"message_sid": mensagem.get("message_sid")}
+                    )
+                )
+            else:
+                # Remetente desconhecido: possível novo lead
+                mensagem["lead_id"] = None
+                mensagem.setdefault("nome", mensagem["remetente"])
+                corretor_id = corretores.get(mensagem["destinatario"])
+
+            if corretor_id is None:
+                logger.warning(
+                    f"Mensagem de {mensagem['remetente']} sem corretor associado"
+                )
+                continue
+
+            grupos.setdefault(
+                (corretor_id, urgencia_mensagem(mensagem)), []
+            ).append(mensagem)
+
+        # Se a gravação falhar, o lote inteiro volta para `_pendentes`:
+        # nada pode ter sido entregue adiante ainda
+        await self.memory.adicionar_interacoes_em_lote(interacoes)
+
+        for (corretor_id, urgencia), mensagens in grupos.items():
+            self.stats["urgentes"] += sum(1 for m in mensagens if m["urgente"])
+
+            if self.on_mensagens is None:
+                continue
+
+            try:
+                await self.on_mensagens(corretor_id, mensagens, urgencia)
+            except Exception as e:
+                logger.error(
+                    f"Erro ao encaminhar mensagens ({urgencia}) de {corretor_id}: {e}"
+                )
+
+        for corretor_id, conteudo in dos_corretores:
+            self.stats["de_corretores"] += 1
+
+            if self.on_corretor is None:
+                continue
+
+            try:
+                await self.on_corretor(corretor_id, conteudo)
+            except Exception as e:
+                logger.error(f"Erro ao processar mensagem do corretor {corretor_id}: {e}")
@@ -0,0 +1,458 @@
+"""
+Envio de mensagens do WhatsApp (API REST da Twilio)
+
+WhatsAppClient:
+- Um único httpx.AsyncClient com pool de conexões keep-alive
+- Concorrência limitada por semáforo
+- Retentativas com backoff exponencial e jitter em 5xx e em falhas de
+  conexão, respeitando Retry-After. Erros de rede depois que a requisição
+  saiu (ex.: timeout de leitura) não são repetidos: a Twilio pode ter
+  aceitado a mensagem e repetir duplicaria o envio
+- base_url configurável (permite apontar para um servidor local nos testes)
+
+SendQueue (na frente do cliente):
+- Token bucket por número de origem (limite de mensagens/s da Twilio)
+- Faixas de prioridade: alertas ALTA saem antes dos resumos
+- Mensagens recusadas por limite de taxa (429 e códigos de limite da
+  Twilio) voltam para a fila em vez de serem descartadas. É a única
+  camada que trata limite; 5xx e rede ficam só com o cliente
+- `fechar` espera os envios em andamento e falha os que ainda aguardam
+- `ao_enviar` recebe cada mensagem aceita (registro de envios usado na
+  reconciliação dos status de entrega)
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import heapq
+import itertools
+import random
+import time
+import httpx
+from loguru import logger
+
+
+# Falhas em que a requisição certamente não chegou à Twilio
+ERROS_ANTES_DO_ENVIO = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class WhatsAppClient:
+    """Envia mensagens pela API de Messages da Twilio"""
+
+    # 429 não é repetido aqui: a SendQueue reenfileira respeitando o
+    # token bucket do número de origem
+    STATUS_RETENTAVEIS = {500, 502, 503, 504}
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        numero_origem: str,
+        base_url: str = "https://api.twilio.com",
+        max_concorrencia: int = 20,
+        max_tentativas: int = 4,
+        backoff_base_segundos: float = 0.5,
+        timeout_segundos: float = 10.0,
+        status_callback_url: Optional[str] = None
+    ):
+        self.account_sid = account_sid
+        self.numero_origem = numero_origem
+        self.status_callback_url = status_callback_url
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base_segundos
+        self._semaforo = asyncio.Semaphore(max_concorrencia)
+
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(account_sid, auth_token),
+            timeout=timeout_segundos,
+            limits=httpx.Limits(
+                max_connections=max_concorrencia,
+                max_keepalive_connections=max_concorrencia
+            )
+        )
+
+        self.stats = {"enviadas": 0, "falhas": 0, "retentativas": 0}
+
+    async def enviar(
+        self,
+        destinatario: str,
+        mensagem: str,
+        midia_url: Optional[str] = None,
+        numero_origem: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Envia uma mensagem
+
+        Returns:
+            {
+                "sucesso": True,
+                "message_sid": "SM...",
+                "horario_envio": "2026-01-11T10:30:00",
+                "status": "queued"
+            }
+        """
+        dados = {
+            "From": self._whatsapp(numero_origem or self.numero_origem),
+            "To": self._whatsapp(destinatario),
+            "Body": mensagem,
+        }
+        if midia_url:
+            dados["MediaUrl"] = midia_url
+        if self.status_callback_url:
+            dados["StatusCallback"] = self.status_callback_url
+
+        async with self._semaforo:
+            resposta, erro = await self._post_com_retentativas(dados)
+
+        if resposta is not None and resposta.status_code < 400:
+            corpo = resposta.json()
+            self.stats["enviadas"] += 1
+            return {
+                "sucesso": True,
+                "message_sid": corpo.get("sid"),
+                "horario_envio": datetime.utcnow().isoformat(),
+                "status": corpo.get("status", "queued")
+            }
+
+        self.stats["falhas"] += 1
+        retry_after = None
+        if resposta is not None:
+            corpo = self._json(resposta)
+            erro = corpo.get("message") or f"HTTP {resposta.status_code}"
+            codigo = corpo.get("code", resposta.status_code)
+            retry_after = self._retry_after(resposta)
+        else:
+            codigo = None
+
+        logger.warning(f"Falha ao enviar WhatsApp para {destinatario}: {erro}")
+        return {
+            "sucesso": False,
+            "message_sid": None,
+            "horario_envio": None,
+            "status": "falhou",
+            "erro": erro,
+            "codigo_erro": codigo,
+            "retry_after": retry_after
+        }
+
+    async def enviar_muitas(
+        self,
+        mensagens: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Envia várias mensagens em paralelo (limitado pela concorrência)
+
+        Args:
+            mensagens: [{"destinatario": ..., "mensagem": ..., "midia_url": ...}]
+
+        Returns:
+            Resultados na mesma ordem das mensagens
+        """
+        return await asyncio.gather(*[
+            self.enviar(
+                m["destinatario"],
+                m["mensagem"],
+                m.get("midia_url")
+            )
+            for m in mensagens
+        ])
+
+    async def fechar(self):
+        await self.http.aclose()
+
+    async def _post_com_retentativas(self, dados: Dict[str, str]):
+        """Retorna (resposta, erro de rede); resposta None se só houve erros"""
+        caminho = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        resposta, erro = None, None
+
+        for tentativa in range(self.max_tentativas):
+            if tentativa:
+                self.stats["retentativas"] += 1
+                await asyncio.sleep(self._espera(tentativa, resposta))
+
+            try:
+                resposta = await self.http.post(caminho, data=dados)
+                erro = None
+            except ERROS_ANTES_DO_ENVIO as e:
+                resposta, erro = None, str(e) or e.__class__.__name__
+                continue
+            except httpx.TransportError as e:
+                # Resultado incerto: não repete para não duplicar o envio
+                return None, str(e) or e.__class__.__name__
+
+            if resposta.status_code not in self.STATUS_RETENTAVEIS:
+                break
+
+        return resposta, erro
+
+    def _espera(self, tentativa: int, resposta: Optional[httpx.Response]) -> float:
+        """Backoff exponencial com jitter total; Retry-After tem precedência"""
+        retry_after = self._retry_after(resposta) if resposta is not None else None
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, self.backoff_base * 2 ** tentativa)
+
+    def _retry_after(self, resposta: httpx.Response) -> Optional[float]:
+        retry_after = resposta.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return None
+
+    def _whatsapp(self, numero: str) -> str:
+        return numero if numero.startswith("whatsapp:") else f"whatsapp:{numero}"
+
+    def _json(self, resposta: httpx.Response) -> Dict[str, Any]:
+        try:
+            return resposta.json()
+        except ValueError:
+            return {}
+
+
+# Faixas da fila de envio, em ordem de prioridade
+FAIXAS_ENVIO = {"alta": 0, "normal": 1, "resumo": 2}
+
+# Recusas por limite de taxa: a mensagem volta para a fila (HTTP 429 e
+# códigos de limite da Twilio). 5xx e erros de rede já foram repetidos
+# pelo cliente e são falhas definitivas aqui
+CODIGOS_REENFILEIRAR = {429, 20429, 63018}
+
+
+class _TokenBucket:
+    """Token bucket de um número de origem"""
+
+    def __init__(self, taxa_por_segundo: float, rajada: int):
+        self.taxa = taxa_por_segundo
+        self.rajada = rajada
+        self.tokens = float(rajada)
+        self.ts = time.monotonic()
+
+    def espera(self) -> float:
+        """Consome um token; se não houver, retorna quanto esperar"""
+        agora = time.monotonic()
+        self.tokens = min(self.rajada, self.tokens + (agora - self.ts) * self.taxa)
+        self.ts = agora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.taxa
+
+
+class SendQueue:
+    """
+    Fila de envio com limite de taxa por número de origem
+
+    Mesma interface de envio do WhatsAppClient, com `prioridade`
+    ("alta", "normal" ou "resumo"). O despachante é iniciado no primeiro
+    envio.
+
+    `ao_enviar(message_sid, destinatario, mensagem, prioridade, reentregas)`
+    é chamado para cada mensagem aceita pelo provedor.
+    """
+
+    def __init__(
+        self,
+        cliente: WhatsAppClient,
+        mensagens_por_segundo: float = 10,
+        rajada: int = 10,
+        max_reenvios: int = 5,
+        espera_reenvio_segundos: float = 2.0,
+        ao_enviar: Optional[Callable[..., Any]] = None
+    ):
+        self.cliente = cliente
+        self.ao_enviar = ao_enviar
+        self.taxa = mensagens_por_segundo
+        self.rajada = rajada
+        self.max_reenvios = max_reenvios
+        self.espera_reenvio = espera_reenvio_segundos
+
+        self._fila: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._novo_item = asyncio.Event()
+        self._despachante: Optional[asyncio.Task] = None
+        self._envios: set = set()
+        self._reenvios: Dict[int, Tuple[asyncio.TimerHandle, Dict[str, Any]]] = {}
+        self._fechada = False
+
+        self.stats = {"enfileiradas": 0, "reenfileiradas": 0, "falhas_definitivas": 0}
+
+    async def enviar(
+        self,
+        destinatario: str,
+        mensagem: str,
+        midia_url: Optional[str] = None,
+        numero_origem: Optional[str] = None,
+        prioridade: str = "normal",
+        reentregas: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Enfileira uma mensagem e aguarda o resultado do envio
+
+        `reentregas` conta reenvios de mensagens que falharam na entrega
+        (vai para o registro de envios, limita novos reenvios).
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        self.stats["enfileiradas"] += 1
+        self._enfileirar(
+            {
+                "destinatario": destinatario,
+                "mensagem": mensagem,
+                "midia_url": midia_url,
+                "numero_origem": numero_origem or self.cliente.numero_origem,
+                "prioridade": prioridade,
+                "tentativas": 0,
+                "reentregas": reentregas,
+                "futuro": futuro,
+            }
+        )
+        return await futuro
+
+    async def enviar_muitas(
+        self,
+        mensagens: List[Dict[str, Any]],
+        prioridade: str = "resumo"
+    ) -> List[Dict[str, Any]]:
+        """Enfileira várias mensagens; resultados na mesma ordem"""
+        return await asyncio.gather(*[
+            self.enviar(
+                m["destinatario"],
+                m["mensagem"],
+                m.get("midia_url"),
+                m.get("numero_origem"),
+                prioridade=m.get("prioridade", prioridade)
+            )
+            for m in mensagens
+        ])
+
+    def profundidade(self) -> int:
+        return len(self._fila)
+
+    async def fechar(self):
+        """
+        Encerra a fila: os envios em andamento terminam; as mensagens que
+        ainda aguardavam a vez (ou um reenvio) recebem falha
+        """
+        self._fechada = True
+        if self._despachante:
+            self._despachante.cancel()
+        if self._envios:
+            await asyncio.gather(*self._envios, return_exceptions=True)
+
+        pendentes = [item for _, _, item in self._fila]
+        for handle, item in self._reenvios.values():
+            handle.cancel()
+            pendentes.append(item)
+        self._fila.clear()
+        self._reenvios.clear()
+
+        for item in pendentes:
+            self._resolver(item, self._falha_encerrada())
+
+        await self.cliente.fechar()
+
+    def _falha_encerrada(self) -> Dict[str, Any]:
+        return {
+            "sucesso": False,
+            "message_sid": None,
+            "horario_envio": None,
+            "status": "falhou",
+            "erro": "Fila de envio encerrada",
+            "codigo_erro": None
+        }
+
+    def _reenfileirar(self, item: Dict[str, Any]):
+        self._reenvios.pop(id(item), None)
+        self._enfileirar(item)
+
+    def _enfileirar(self, item: Dict[str, Any]):
+        if self._fechada:
+            self._resolver(item, self._falha_encerrada())
+            return
+
+        faixa = FAIXAS_ENVIO.get(item["prioridade"], FAIXAS_ENVIO["normal"])
+        heapq.heappush(self._fila, (faixa, next(self._seq), item))
+        self._novo_item.set()
+
+        if self._despachante is None or self._despachante.done():
+            self._despachante = asyncio.create_task(self._despachar())
+
+    async def _despachar(self):
+        while True:
+            if not self._fila:
+                self._novo_item.clear()
+                await self._novo_item.wait()
+                continue
+
+            # Aguarda o token do número de origem do item mais prioritário
+            _, _, item = self._fila[0]
+            bucket = self._buckets.setdefault(
+                item["numero_origem"],
+                _TokenBucket(self.taxa, self.rajada)
+            )
+            espera = bucket.espera()
+            if espera:
+                await asyncio.sleep(espera)
+                continue
+
+            heapq.heappop(self._fila)
+            envio = asyncio.create_task(self._enviar(item))
+            self._envios.add(envio)
+            envio.add_done_callback(self._envios.discard)
+
+    async def _enviar(self, item: Dict[str, Any]):
+        try:
+            resultado = await self.cliente.enviar(
+                item["destinatario"],
+                item["mensagem"],
+                item["midia_url"],
+                item["numero_origem"]
+            )
+        except Exception as e:
+            resultado = {"sucesso": False, "erro": str(e), "codigo_erro": None}
+
+        if resultado["sucesso"] or item["futuro"].done():
+            if resultado["sucesso"]:
+                self._registrar_envio(item, resultado)
+            self._resolver(item, resultado)
+            return
+
+        # Limite de taxa: volta para a fila após uma espera
+        if (
+            resultado.get("codigo_erro") in CODIGOS_REENFILEIRAR
+            and item["tentativas"] < self.max_reenvios
+            and not self._fechada
+        ):
+            item["tentativas"] += 1
+            self.stats["reenfileiradas"] += 1
+            espera = max(
+                self.espera_reenvio * 2 ** (item["tentativas"] - 1),
+                resultado.get("retry_after") or 0
+            )
+            handle = asyncio.get_running_loop().call_later(
+                espera,
+                self._reenfileirar,
+                item
+            )
+            self._reenvios[id(item)] = (handle, item)
+            return
+
+        self.stats["falhas_definitivas"] += 1
+        self._resolver(item, resultado)
+
+    def _registrar_envio(self, item: Dict[str, Any], resultado: Dict[str, Any]):
+        if self.ao_enviar is None or not resultado.get("message_sid"):
+            return
+        try:
+            self.ao_enviar(
+                resultado["message_sid"],
+                item["destinatario"],
+                item["mensagem"],
+                item["prioridade"],
+                item["reentregas"]
+            )
+        except Exception as e:
+            logger.error(f"Erro ao registrar envio {resultado['message_sid']}: {e}")
+
+    def _resolver(self, item: Dict[str, Any], resultado: Dict[str, Any]):
+        if not item["futuro"].done():
+            item["futuro"].set_result(resultado)
@@ -0,0 +1,122 @@
+"""
+Webhooks de entrada (FastAPI)
+"""
+from typing import Optional, Dict, Callable, Any
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
+from loguru import logger
+from .inbound import InboundBuffer
+
+TWIML_VAZIO = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+
+def _criar_validador(auth_token: Optional[str]):
+    if not auth_token:
+        return None
+    from twilio.request_validator import RequestValidator
+    return RequestValidator(auth_token)
+
+
+def _validar_assinatura(validator, request: Request, form: Dict[str, Any]):
+    if validator is None:
+        return
+    assinatura = request.headers.get("X-Twilio-Signature", "")
+    if not validator.validate(str(request.url), form, assinatura):
+        logger.warning(f"Webhook {request.url.path} com assinatura inválida")
+        raise HTTPException(status_code=403, detail="Assinatura inválida")
+
+
+def criar_router_whatsapp(
+    buffer: InboundBuffer,
+    auth_token: Optional[str] = None
+) -> APIRouter:
+    """
+    Cria o router do webhook de mensagens recebidas (formato Twilio)
+
+    Args:
+        buffer: Buffer que recebe as mensagens
+        auth_token: Token do Twilio para validar X-Twilio-Signature
+                    (None desativa a validação, ex.: testes locais)
+    """
+    router = APIRouter()
+
+    validator = _criar_validador(auth_token)
+
+    @router.post("/webhooks/whatsapp")
+    async def whatsapp_inbound(request: Request) -> Response:
+        form = dict(await request.form())
+        _validar_assinatura(validator, request, form)
+
+        await buffer.receber({
+            "remetente": form.get("From", ""),
+            "destinatario": form.get("To", ""),
+            "conteudo": form.get("Body", ""),
+            "nome": form.get("ProfileName"),
+            "message_sid": form.get("MessageSid"),
+        })
+
+        # Resposta vazia: o corretor responde pelo próprio WhatsApp
+        return Response(content=TWIML_VAZIO, media_type="application/xml")
+
+    return router
+
+
+def criar_router_status(
+    store,
+    auth_token: Optional[str] = None
+) -> APIRouter:
+    """
+    Cria o router dos callbacks de status de entrega (formato Twilio)
+
+    Args:
+        store: DeliveryStatusStore que recebe as atualizações
+        auth_token: Token do Twilio para validar X-Twilio-Signature
+    """
+    router = APIRouter()
+    validator = _criar_validador(auth_token)
+
+    @router.post("/webhooks/whatsapp/status")
+    async def whatsapp_status(request: Request) -> Response:
+        form = dict(await request.form())
+        _validar_assinatura(validator, request, form)
+
+        await store.receber({
+            "message_sid": form.get("MessageSid"),
+            "status": form.get("MessageStatus"),
+            "codigo_erro": form.get("ErrorCode"),
+        })
+        return Response(status_code=204)
+
+    return router
+
+
+def criar_router_metricas(
+    metricas: Dict[str, Callable[[], Dict[str, Any]]]
+) -> APIRouter:
+    """
+    Cria o router de métricas operacionais
+
+    Args:
+        metricas: nome -> função que retorna o snapshot atual da métrica
+    """
+    router = APIRouter()
+
+    @router.get("/metrics")
+    async def metricas_operacionais() -> Dict[str, Any]:
+        return {nome: coletar() for nome, coletar in metricas.items()}
+
+    return router
+
+
+def criar_app(
+    buffer: InboundBuffer,
+    auth_token: Optional[str] = None,
+    metricas: Optional[Dict[str, Callable[[], Dict[str, Any]]]] = None,
+    status_store=None
+) -> FastAPI:
+    """Aplicação FastAPI com os webhooks do Lastro.AI"""
+    app = FastAPI(title="Lastro.AI Webhooks")
+    app.include_router(criar_router_whatsapp(buffer, auth_token))
+    if status_store is not None:
+        app.include_router(criar_router_status(status_store, auth_token))
+    app.include_router(criar_router_metricas(metricas or {}))
+    return app
@@ -0,0 +1,60 @@
+"""
+Benchmark de renderização de templates do Lastro.AI
+
+Compara o template compilado (MessageTemplates) com str.format sobre o
+texto cru. Não depende de Redis nem de APIs externas.
+
+Uso:
+    python benchmark_templates.py [--iteracoes 200000]
+"""
+import argparse
+import time
+
+from tools.communication import MessageTemplates
+
+
+VARIAVEIS = {
+    "novo_lead": {
+        "nome": "Maria Silva",
+        "descricao_busca": "3q Pinheiros, 800k-1M",
+        "sugestao_mensagem": "Oi Maria! Vi que você procura um 3 quartos em Pinheiros...",
+    },
+    "lead_sem_resposta": {
+        "nome": "João",
+        "descricao_lead": "2q Vila Mariana",
+        "horas": 26,
+        "contexto_lead": "Perguntou sobre financiamento",
+        "sugestao_mensagem": "Oi João, consegui as condições de financiamento...",
+    },
+}
+
+
+def medir(nome: str, funcao, iteracoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        funcao()
+    decorrido = time.perf_counter() - inicio
+    print(f"  {nome:<12} {iteracoes / decorrido:>12,.0f} renders/s")
+    return decorrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iteracoes", type=int, default=200000)
+    args = parser.parse_args()
+    
+    templates = MessageTemplates()
+    
+    for nome, variaveis in VARIAVEIS.items():
+        texto = MessageTemplates.TEMPLATES[nome]
+        compilado = templates.selecionar(nome)
+        assert compilado.render(variaveis) == texto.format(**variaveis)
+        
+        print(f"{nome}:")
+        cru = medir("str.format", lambda: texto.format(**variaveis), args.iteracoes)
+        pronto = medir("compilado", lambda: compilado.render(variaveis), args.iteracoes)
+        print(f"  razão        {cru / pronto:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,11 +13,25 @@ class Settings(BaseSettings):
     
     # APIs de IA
     google_api_key: str  # Google Gemini API Key
+    suggestion_cache_ttl_hours: int = 24
+    suggestion_cache_max_items: int = 5000
+    llm_batch_window_ms: int = 50
+    llm_batch_max_size: int = 10
+    llm_budget_high_ms: int = 1500
+    llm_budget_medium_ms: int = 5000
+    llm_budget_low_ms: int = 15000
     
     # WhatsApp (Twilio)
     twilio_account_sid: str
     twilio_auth_token: str
     twilio_whatsapp_number: str
+    twilio_api_base_url: str = "https://api.twilio.com"
+    whatsapp_max_concurrency: int = 20
+    whatsapp_max_retries: int = 4
+    whatsapp_messages_per_second: float = 10
+    whatsapp_burst: int = 10
+    whatsapp_max_requeues: int = 5
+    twilio_status_callback_url: Optional[str] = None  # ex.: https://host/webhooks/whatsapp/status
     
     # Redis (opcional)
     redis_host: Optional[str] = None
@@ -29,6 +43,47 @@ class Settings(BaseSettings):
     database_url: str
     
     # Webhooks
+    api_host: str = "0.0.0.0"
+    api_port: int = 8000
+    inbound_buffer_window_ms: int = 500
+    inbound_buffer_max_batch: int = 500
+    inbound_buffer_urgent_delay_ms: int = 50
+    inbound_buffer_max_pending: int = 5000
+    inbound_mailbox_max_per_corretor: int = 200
+    inbound_mailbox_poll_seconds: float = 1.0
+    
+    # Status de entrega (callbacks da Twilio + reconciliação com os envios)
+    delivery_status_window_ms: int = 1000
+    delivery_status_max_batch: int = 500
+    delivery_status_ttl_hours: int = 72
+    delivery_reconcile_interval_seconds: int = 5
+    delivery_max_resends: int = 1
+    
+    # Sharding entre workers
+    sharding_enabled: bool = False
+    worker_id: Optional[str] = None  # default: hostname-pid
+    shard_count: int = 64
+    shard_lease_seconds: int = 15
+    leader_lease_seconds: int = 10
+    task_workers: int = 4
+    task_visibility_seconds: int = 600
+    
+    # Fila de ingestão
+    ingestion_spill_dir: str = "data/spill"
+    ingestion_max_memory_per_lane: int = 1000
+    ingestion_max_spill_mb: int = 256
+    ingestion_workers: int = 4
+    
+    # Fila de entregas futuras (Redis ou SQLite local)
+    delayed_queue_sqlite_path: str = "data/fila_atrasada.db"
+    delayed_queue_visibility_seconds: int = 300
+    delayed_queue_max_attempts: int = 5
+    
+    # Agrupamento de eventos não urgentes (digest)
+    coalescing_window_minutes: int = 60
+    coalescing_max_events: int = 10
+    
+    # Webhooks de portais
     zap_webhook_secret: Optional[str] = None
     vivareal_webhook_secret: Optional[str] = None
     olx_webhook_secret: Optional[str] = None
@@ -36,10 +91,28 @@ class Settings(BaseSettings):
     # Google Calendar
     google_calendar_credentials_path: str = "./config/google_calendar_credentials.json"
     
+    # Provedor de agenda (sync incremental); vazio desativa a agenda
+    calendar_api_url: Optional[str] = None
+    calendar_api_token: Optional[str] = None
+    
+    # Provedor da carteira de imóveis (diff por hashes); vazio desativa
+    carteira_api_url: Optional[str] = None
+    carteira_api_token: Optional[str] = None
+    
     # Configurações do sistema
     max_messages_per_day: int = 5
+    quota_smoothing_enabled: bool = False
+    quota_burst: int = 2
+    outbound_max_concurrency: int = 10
+    resumo_precompute_lead_minutes: int = 45
+    resumo_send_batch_size: int = 100
     lead_response_threshold_hours: int = 24
     vigilante_check_interval_minutes: int = 5
+    vigilante_max_concurrency: int = 20
+    vigilante_corretor_timeout_seconds: int = 60
+    vigilante_cycle_warn_ratio: float = 0.8
+    vigilante_scheduler_mode: str = "cron"  # cron ou spread
+    calendar_sync_interval_minutes: int = 15
     
     # Sentry
     sentry_dsn: Optional[str] = None
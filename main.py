@@ -3,15 +3,50 @@ Lastro.AI - Sistema de assistência inteligente para corretores de imóveis
 
 Ponto de entrada principal do sistema
 """
+import argparse
 import asyncio
-from datetime import datetime, time
+import time
+from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from loguru import logger
 import redis
+import uvicorn
 from config.settings import settings
-from memory import MemoryService
+from memory import (
+    MemoryService,
+    CalendarIndex,
+    IngestionQueue,
+    DelayedQueue,
+    DelayedDispatcher,
+    CoalescingBuffer,
+    QuotaStore,
+    ResumoCache,
+    SuggestionCache,
+    SuppressionStore,
+    DeliveryStatusStore,
+    DeliveryReconciler,
+    InboundMailbox,
+)
+from memory.identity import ESTATISTICAS as ESTATISTICAS_IDENTIDADE
+from models import Evento
 from agents import Orquestrador
+from api import (
+    InboundBuffer,
+    SendQueue,
+    WhatsAppClient,
+    criar_app,
+    criar_calendar_client,
+    criar_carteira_client,
+    urgencia_mensagem,
+)
+from workers import (
+    SpreadScheduler,
+    ShardCoordinator,
+    LeaderElection,
+    TaskQueue,
+    OutboundScheduler,
+)
 
 
 class LastroAI:
@@ -21,9 +56,12 @@ class LastroAI:
     Gerencia o ciclo de vida dos agentes e agendamento de tarefas
     """
     
-    def __init__(self):
+    def __init__(self, modo_worker: bool = False):
         logger.info("Inicializando Lastro.AI...")
         
+        # Worker: só processa os corretores dos seus shards, sem webhooks
+        self.modo_worker = modo_worker
+        
         # Configurar logging
         self._setup_logging()
         
@@ -46,20 +84,239 @@ class LastroAI:
             logger.info("Redis não configurado, usando cache em memória")
         
         # Inicializar serviço de memória
-        self.memory = MemoryService(self.redis_client)
+        self.memory = MemoryService(self.redis_client, fuso=settings.timezone)
         logger.info("Memory service inicializado")
         
-        # Inicializar Twilio (WhatsApp)
-        # TODO: Implementar client Twilio real
-        self.twilio_client = None
+        # Registro de envios e status de entrega (callbacks da Twilio)
+        self.entregas = DeliveryStatusStore(
+            self.redis_client,
+            janela_segundos=settings.delivery_status_window_ms / 1000,
+            max_lote=settings.delivery_status_max_batch,
+            ttl_segundos=settings.delivery_status_ttl_hours * 3600
+        )
+        
+        # Envio do WhatsApp: fila com limite por número de origem na
+        # frente do cliente HTTP (pool keep-alive)
+        self.twilio_client = SendQueue(
+            WhatsAppClient(
+                settings.twilio_account_sid,
+                settings.twilio_auth_token,
+                settings.twilio_whatsapp_number,
+                base_url=settings.twilio_api_base_url,
+                max_concorrencia=settings.whatsapp_max_concurrency,
+                max_tentativas=settings.whatsapp_max_retries,
+                status_callback_url=settings.twilio_status_callback_url
+            ),
+            mensagens_por_segundo=settings.whatsapp_messages_per_second,
+            rajada=settings.whatsapp_burst,
+            max_reenvios=settings.whatsapp_max_requeues,
+            ao_enviar=self.entregas.registrar_envio
+        )
+        
+        # Índice local da agenda (sincronização incremental com o provedor
+        # configurado em CALENDAR_API_URL)
+        self.calendar_index = CalendarIndex(
+            calendar_client=criar_calendar_client(
+                settings.calendar_api_url,
+                settings.calendar_api_token
+            )
+        )
+        if not self.calendar_index.habilitado:
+            logger.warning(
+                "Agenda desativada (CALENDAR_API_URL vazio): "
+                "envios não são adiados por visitas"
+            )
+        
+        # Provedor da carteira de imóveis (diff por hashes no ImovelMonitor),
+        # configurado em CARTEIRA_API_URL
+        self.carteira_client = criar_carteira_client(
+            settings.carteira_api_url,
+            settings.carteira_api_token
+        )
+        
+        # Buffer de mensagens recebidas pelo webhook do WhatsApp
+        self.inbound_buffer = InboundBuffer(
+            self.memory,
+            janela_segundos=settings.inbound_buffer_window_ms / 1000,
+            max_lote=settings.inbound_buffer_max_batch,
+            atraso_urgente_segundos=settings.inbound_buffer_urgent_delay_ms / 1000,
+            max_pendentes=settings.inbound_buffer_max_pending
+        )
+        
+        # Mensagens de corretores de outros shards, à espera do worker dono
+        self.caixa_entrada = InboundMailbox(
+            self.redis_client,
+            max_por_corretor=settings.inbound_mailbox_max_per_corretor
+        )
+        
+        # Fila persistente de entregas futuras (mensagens e eventos adiados)
+        self.fila_atrasada = DelayedQueue(
+            self.redis_client,
+            caminho_sqlite=settings.delayed_queue_sqlite_path,
+            visibilidade_segundos=settings.delayed_queue_visibility_seconds
+        )
+        
+        # Agrupamento de eventos não urgentes por corretor
+        self.agrupamento = CoalescingBuffer(
+            self.redis_client,
+            janela_segundos=settings.coalescing_window_minutes * 60,
+            max_eventos=settings.coalescing_max_events
+        )
         
         # Inicializar Orquestrador
         self.orquestrador = Orquestrador(
             memory_service=self.memory,
-            twilio_client=self.twilio_client
+            twilio_client=self.twilio_client,
+            calendar_index=self.calendar_index,
+            carteira_client=self.carteira_client,
+            caixa_entrada=self.caixa_entrada,
+            fila_atrasada=self.fila_atrasada,
+            agrupamento=self.agrupamento,
+            resumos=ResumoCache(self.redis_client),
+            supressao=SuppressionStore(self.redis_client),
+            cota=QuotaStore(
+                self.redis_client,
+                fuso=settings.timezone,
+                rajada=settings.quota_burst
+            ),
+            suavizar_cota=settings.quota_smoothing_enabled,
+            saida=OutboundScheduler(settings.outbound_max_concurrency),
+            sugestoes=SuggestionCache(
+                redis_client=self.redis_client,
+                ttl_segundos=settings.suggestion_cache_ttl_hours * 3600,
+                max_itens=settings.suggestion_cache_max_items
+            ),
+            janela_lote_ms=settings.llm_batch_window_ms,
+            max_lote_modelo=settings.llm_batch_max_size,
+            orcamentos_modelo_ms={
+                "alta": settings.llm_budget_high_ms,
+                "media": settings.llm_budget_medium_ms,
+                "baixa": settings.llm_budget_low_ms,
+            },
+            fuso=settings.timezone
         )
         logger.info("Orquestrador inicializado")
         
+        if not self.orquestrador.vigilante.tools["imovel_monitor"].differ.habilitado:
+            logger.warning(
+                "Monitor de imóveis desativado (CARTEIRA_API_URL vazio): "
+                "mudanças de preço não são detectadas"
+            )
+        
+        # Cruza status de entrega com os envios: latências de entrega e
+        # leitura alimentam o timing e a análise; falhas temporárias são
+        # reenviadas (todos os workers; SPOP atômico)
+        self.reconciliador = DeliveryReconciler(
+            self.entregas,
+            self.memory,
+            consumidores=[
+                self.orquestrador.conselheiro.tools["timing_optimizer"],
+                self.orquestrador.analista.tools["conversation_analyzer"].ferramenta,
+            ],
+            reenviar=self.twilio_client.enviar,
+            intervalo_segundos=settings.delivery_reconcile_interval_seconds,
+            max_reenvios=settings.delivery_max_resends
+        )
+        
+        # Entrega os itens vencidos da fila (todos os workers; claim atômico)
+        self.despachante = DelayedDispatcher(
+            self.fila_atrasada,
+            self._entregar_agendado,
+            max_tentativas=settings.delayed_queue_max_attempts
+        )
+        
+        # Shards de corretores deste processo (todos, sem sharding)
+        if settings.sharding_enabled and not self.redis_client:
+            logger.warning("Sharding requer Redis; processando todos os corretores")
+        self.shards = ShardCoordinator(
+            self.redis_client if settings.sharding_enabled else None,
+            worker_id=settings.worker_id,
+            total_shards=settings.shard_count,
+            lease_segundos=settings.shard_lease_seconds
+        )
+        
+        # Fila de ingestão limitada entre os webhooks e o pipeline de envio
+        self.fila_ingestao = IngestionQueue(
+            diretorio_spill=settings.ingestion_spill_dir,
+            worker_id=self.shards.worker_id,
+            max_memoria_por_faixa=settings.ingestion_max_memory_per_lane,
+            max_spill_bytes=settings.ingestion_max_spill_mb * 1024 * 1024
+        )
+        
+        # Mensagens recebidas seguem para a fila na faixa da sua urgência
+        # (urgentes e novos leads disparam eventos sem esperar o ciclo);
+        # mensagens do próprio corretor contam como resposta ao último template
+        self.inbound_buffer.on_mensagens = self._enfileirar_mensagens
+        self.inbound_buffer.on_corretor = self.processar_mensagem_corretor
+        
+        # Eleição de líder para os jobs singleton e fila de tarefas
+        # compartilhada para distribuir o trabalho por corretor
+        self.lider = LeaderElection(
+            self.redis_client,
+            worker_id=self.shards.worker_id,
+            lease_segundos=settings.leader_lease_seconds
+        )
+        self.tarefas = TaskQueue(
+            self.redis_client,
+            visibilidade_segundos=settings.task_visibility_seconds
+        )
+        
+        # Concorrência do Vigilante e métricas do último ciclo
+        self.semaforo_vigilante = asyncio.Semaphore(
+            settings.vigilante_max_concurrency
+        )
+        self.metricas_ciclo = {}
+        
+        # Modo "spread": cada corretor no seu deslocamento do intervalo
+        self.spread_scheduler = None
+        if settings.vigilante_scheduler_mode == "spread":
+            self.spread_scheduler = SpreadScheduler(
+                listar=self._listar_corretores_locais,
+                processar=lambda corretor: self._processar_corretor_limitado(
+                    corretor,
+                    self.semaforo_vigilante
+                ),
+                intervalo_segundos=settings.vigilante_check_interval_minutes * 60
+            )
+        
+        # Servidor de webhooks
+        self.api = criar_app(
+            self.inbound_buffer,
+            auth_token=settings.twilio_auth_token,
+            status_store=self.entregas,
+            metricas={
+                "fila_ingestao": self.fila_ingestao.get_metrics,
+                "shards": self.shards.get_metrics,
+                "lider": self.lider.get_metrics,
+                "tarefas": self.tarefas.get_metrics,
+                "inbound": lambda: dict(self.inbound_buffer.stats),
+                "caixa_entrada": self.caixa_entrada.get_metrics,
+                "saida": self.orquestrador.saida.get_metrics,
+                "supressao": self.orquestrador.supressao.get_stats,
+                "resumos": lambda: dict(self.orquestrador.stats),
+                "whatsapp": lambda: {
+                    **self.twilio_client.cliente.stats,
+                    **self.twilio_client.stats,
+                    "profundidade_fila": self.twilio_client.profundidade(),
+                },
+                "entregas": self.reconciliador.get_metrics,
+                "memo_analises": lambda: dict(self.orquestrador.analista.memo.stats),
+                "templates": self.orquestrador.conselheiro.tools["templates"].get_metrics,
+                "sugestoes": self.orquestrador.conselheiro.sugestoes.get_metrics,
+                "lotes_modelo": self.orquestrador.conselheiro.gerador.get_metrics,
+                "latencia_modelo": self.orquestrador.conselheiro.latencia.get_metrics,
+                "mapa_identidade": lambda: dict(ESTATISTICAS_IDENTIDADE),
+                "fila_atrasada": lambda: {
+                    **self.fila_atrasada.tamanho(),
+                    **self.despachante.stats,
+                },
+                "ciclo_vigilante": lambda: (
+                    self.spread_scheduler.get_metrics()
+                    if self.spread_scheduler else dict(self.metricas_ciclo)
+                ),
+            }
+        )
+        
         # Scheduler para tarefas periódicas
         self.scheduler = AsyncIOScheduler()
         self._setup_scheduled_tasks()
@@ -77,11 +334,58 @@ class LastroAI:
         """Configura tarefas agendadas"""
         
         # Vigilante: Monitoramento a cada 5 minutos
+        # (no modo "spread" o SpreadScheduler faz o ciclo contínuo)
+        if settings.vigilante_scheduler_mode == "cron":
+            self.scheduler.add_job(
+                self._executar_vigilante,
+                CronTrigger(minute=f"*/{settings.vigilante_check_interval_minutes}"),
+                id="vigilante_monitor",
+                name="Monitoramento do Vigilante",
+                coalesce=True,
+                max_instances=1
+            )
+        
+        # Agenda: sincronização incremental do índice local
+        if self.calendar_index.habilitado:
+            self.scheduler.add_job(
+                self._sincronizar_calendarios,
+                CronTrigger(minute=f"*/{settings.calendar_sync_interval_minutes}"),
+                id="calendar_sync",
+                name="Sincronização de agendas"
+            )
+        
+        # Digests de eventos agrupados com janela expirada
         self.scheduler.add_job(
-            self._executar_vigilante,
-            CronTrigger(minute=f"*/{settings.vigilante_check_interval_minutes}"),
-            id="vigilante_monitor",
-            name="Monitoramento do Vigilante"
+            self._descarregar_agrupamentos,
+            CronTrigger(minute="*"),
+            id="agrupamento_digest",
+            name="Digest de eventos agrupados",
+            coalesce=True,
+            max_instances=1
+        )
+        
+        # Resumos: o briefing é pré-calculado antes do horário de envio
+        # (ex.: 6h15 para o resumo das 7h) e o envio só dispara as mensagens
+        hora_manha, minuto_manha = self._horario_preparo(7, 0)
+        hora_noite, minuto_noite = self._horario_preparo(20, 0)
+        
+        self.scheduler.add_job(
+            self._preparar_resumos_manha,
+            CronTrigger(hour=hora_manha, minute=minuto_manha),
+            id="preparar_resumo_manha",
+            name="Preparo do resumo da manhã"
+        )
+        self.scheduler.add_job(
+            self._preparar_resumos_noite,
+            CronTrigger(hour=hora_noite, minute=minuto_noite),
+            id="preparar_resumo_noite",
+            name="Preparo do resumo da noite"
+        )
+        self.scheduler.add_job(
+            self._preparar_resumos_semanais,
+            CronTrigger(day_of_week="mon", hour=hora_manha, minute=minuto_manha),
+            id="preparar_resumo_semanal",
+            name="Preparo do resumo semanal"
         )
         
         # Resumo da manhã: 7h
@@ -118,153 +422,444 @@ class LastroAI:
         
         logger.info("Tarefas agendadas configuradas")
     
+    def _horario_preparo(self, hora: int, minuto: int) -> tuple:
+        """Horário (hora, minuto) do preparo de um resumo enviado às hora:minuto"""
+        inicio = hora * 60 + minuto - settings.resumo_precompute_lead_minutes
+        return divmod(inicio % (24 * 60), 60)
+    
     async def _executar_vigilante(self):
-        """Executa ciclo de monitoramento do Vigilante"""
+        """
+        Executa ciclo de monitoramento do Vigilante
+        
+        Os corretores são processados em paralelo, limitados por um
+        semáforo, com prazo individual e isolamento de erros.
+        """
         logger.info("Iniciando ciclo do Vigilante")
+        inicio = time.monotonic()
         
         try:
-            # Busca todos os corretores ativos
-            corretores = await self.memory.list_corretores_ativos()
+            # Busca os corretores ativos dos shards deste worker
+            corretores = await self._listar_corretores_locais()
             
-            for corretor in corretores:
-                try:
-                    resultado = await self.orquestrador.processar_corretor(
-                        corretor.id
-                    )
-                    
-                    logger.info(
-                        f"Corretor {corretor.nome}: "
-                        f"{resultado['eventos_detectados']} eventos, "
-                        f"{resultado['mensagens_enviadas']} mensagens enviadas"
-                    )
-                    
-                except Exception as e:
-                    logger.error(
-                        f"Erro ao processar corretor {corretor.id}: {e}"
-                    )
+            resultados = await asyncio.gather(*[
+                self._processar_corretor_limitado(
+                    corretor,
+                    self.semaforo_vigilante
+                )
+                for corretor in corretores
+            ])
+            
+            self._registrar_duracao_ciclo(
+                time.monotonic() - inicio,
+                total=len(corretores),
+                falhas=resultados.count(False)
+            )
         
         except Exception as e:
             logger.error(f"Erro no ciclo do Vigilante: {e}")
     
-    async def _enviar_resumos_manha(self):
-        """Envia resumos matinais"""
-        logger.info("Enviando resumos da manhã")
+    async def _listar_corretores_locais(self) -> list:
+        """Corretores ativos cujos shards pertencem a este worker"""
+        corretores = await self.memory.list_corretores_ativos()
+        return self.shards.filtrar(corretores)
+    
+    async def _processar_corretor_limitado(
+        self,
+        corretor,
+        semaforo: asyncio.Semaphore
+    ) -> bool:
+        """Processa um corretor respeitando o semáforo e o prazo individual"""
+        async with semaforo:
+            try:
+                resultado = await asyncio.wait_for(
+                    self.orquestrador.processar_corretor(corretor.id),
+                    timeout=settings.vigilante_corretor_timeout_seconds
+                )
+                
+                logger.info(
+                    f"Corretor {corretor.nome}: "
+                    f"{resultado['eventos_detectados']} eventos "
+                    f"({resultado['eventos_suprimidos']} suprimidos), "
+                    f"{resultado['mensagens_enviadas']} mensagens enviadas, "
+                    f"{resultado['leituras_evitadas']} leituras evitadas"
+                )
+                return True
+            
+            except asyncio.TimeoutError:
+                logger.error(
+                    f"Corretor {corretor.id} excedeu o prazo de "
+                    f"{settings.vigilante_corretor_timeout_seconds}s"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Erro ao processar corretor {corretor.id}: {e}"
+                )
+            return False
+    
+    def _registrar_duracao_ciclo(self, duracao: float, total: int, falhas: int):
+        """Registra a duração do ciclo e alerta quando se aproxima do intervalo"""
+        intervalo = settings.vigilante_check_interval_minutes * 60
         
-        try:
-            corretores = await self.memory.list_corretores_ativos()
+        self.metricas_ciclo = {
+            "duracao_segundos": round(duracao, 3),
+            "intervalo_segundos": intervalo,
+            "uso_intervalo": round(duracao / intervalo, 3),
+            "corretores": total,
+            "falhas": falhas,
+            "fim": datetime.utcnow().isoformat(),
+        }
+        
+        if duracao >= intervalo * settings.vigilante_cycle_warn_ratio:
+            logger.warning(
+                f"Ciclo do Vigilante levou {duracao:.1f}s "
+                f"({self.metricas_ciclo['uso_intervalo']:.0%} do intervalo de "
+                f"{intervalo}s) para {total} corretores"
+            )
+        else:
+            logger.info(
+                f"Ciclo do Vigilante concluído em {duracao:.1f}s "
+                f"({total} corretores, {falhas} falhas)"
+            )
+    
+    async def _enfileirar_mensagens(
+        self,
+        corretor_id: str,
+        mensagens: list,
+        urgencia: str
+    ):
+        """Enfileira mensagens recebidas na faixa da sua urgência"""
+        await self.fila_ingestao.put(
+            {"corretor_id": corretor_id, "mensagens": mensagens},
+            urgencia=urgencia
+        )
+    
+    async def _consumir_fila_ingestao(self):
+        """
+        Worker que processa itens da fila de ingestão
+        
+        Só processa os corretores dos shards deste processo; os demais vão
+        para a caixa de entrada do corretor, retirada pelo worker dono.
+        """
+        while True:
+            faixa, item, recibo = await self.fila_ingestao.get()
             
-            for corretor in corretores:
-                if not corretor.preferencias.resumo_diario:
-                    continue
-                
-                try:
-                    await self.orquestrador.gerar_resumo_diario(
-                        corretor.id,
-                        horario="manha"
+            try:
+                if self.shards.possui(item["corretor_id"]):
+                    await self.orquestrador.processar_mensagens_recebidas(
+                        item["corretor_id"],
+                        item["mensagens"]
                     )
-                    logger.info(f"Resumo enviado para {corretor.nome}")
-                    
-                except Exception as e:
-                    logger.error(
-                        f"Erro ao enviar resumo para {corretor.id}: {e}"
+                else:
+                    await self.caixa_entrada.depositar(
+                        item["corretor_id"],
+                        item["mensagens"],
+                        urgencia=faixa
                     )
+            except Exception as e:
+                logger.error(
+                    f"Erro ao processar item da fila ({faixa}) "
+                    f"do corretor {item.get('corretor_id')}: {e}"
+                )
+                await self.fila_ingestao.devolver(recibo)
+            else:
+                await self.fila_ingestao.confirmar(recibo)
+    
+    async def _drenar_caixa_entrada(self):
+        """
+        Traz para a fila de ingestão as mensagens urgentes deixadas por
+        outros processos para os corretores dos shards deste worker
         
-        except Exception as e:
-            logger.error(f"Erro ao enviar resumos da manhã: {e}")
+        As não urgentes ficam para o ciclo do Vigilante (WhatsAppMonitor).
+        """
+        while True:
+            try:
+                for corretor_id in await self.caixa_entrada.corretores_urgentes():
+                    if not self.shards.possui(corretor_id):
+                        continue
+                    
+                    faixas = {}
+                    for mensagem in await self.caixa_entrada.retirar(corretor_id):
+                        faixas.setdefault(urgencia_mensagem(mensagem), []).append(mensagem)
+                    for urgencia, mensagens in faixas.items():
+                        await self._enfileirar_mensagens(corretor_id, mensagens, urgencia)
+            except Exception as e:
+                logger.error(f"Erro ao drenar a caixa de entrada: {e}")
+            
+            await asyncio.sleep(settings.inbound_mailbox_poll_seconds)
     
-    async def _enviar_resumos_noite(self):
-        """Envia resumos noturnos"""
-        logger.info("Enviando resumos da noite")
+    async def _entregar_agendado(self, item: dict):
+        """Entrega um item vencido da fila de entregas futuras"""
+        if item["tipo"] == "mensagem":
+            await self.orquestrador.entregar_mensagem_agendada(item)
+        
+        elif item["tipo"] == "evento":
+            await self.orquestrador.processar_evento_agendado(
+                item["corretor_id"],
+                Evento.parse_raw(item["evento"])
+            )
         
+        else:
+            logger.warning(f"Item agendado desconhecido: {item['tipo']}")
+    
+    async def _descarregar_agrupamentos(self):
+        """Envia o digest dos corretores cuja janela de agrupamento expirou"""
         try:
-            corretores = await self.memory.list_corretores_ativos()
+            vencidos = await self.agrupamento.vencidos()
             
-            for corretor in corretores:
-                if not corretor.preferencias.resumo_diario:
+            for corretor_id in vencidos:
+                if not self.shards.possui(corretor_id):
                     continue
-                
                 try:
-                    await self.orquestrador.gerar_resumo_diario(
-                        corretor.id,
-                        horario="noite"
-                    )
-                    logger.info(f"Resumo enviado para {corretor.nome}")
-                    
+                    resultado = await self.orquestrador.enviar_digest(corretor_id)
+                    if resultado["eventos"]:
+                        logger.info(
+                            f"Digest de {resultado['eventos']} eventos "
+                            f"para {corretor_id}"
+                        )
                 except Exception as e:
-                    logger.error(
-                        f"Erro ao enviar resumo para {corretor.id}: {e}"
-                    )
+                    logger.error(f"Erro ao enviar digest de {corretor_id}: {e}")
         
         except Exception as e:
-            logger.error(f"Erro ao enviar resumos da noite: {e}")
+            logger.error(f"Erro ao descarregar agrupamentos: {e}")
     
-    async def _enviar_resumos_semanais(self):
-        """Envia resumos semanais"""
-        logger.info("Enviando resumos semanais")
-        
+    async def _sincronizar_calendarios(self):
+        """Sincroniza incrementalmente a agenda de cada corretor"""
         try:
-            corretores = await self.memory.list_corretores_ativos()
+            # O índice é local: cada worker mantém a agenda dos seus shards
+            corretores = await self._listar_corretores_locais()
             
             for corretor in corretores:
-                if not corretor.preferencias.resumo_semanal:
-                    continue
-                
                 try:
-                    await self.orquestrador.gerar_resumo_semanal(
-                        corretor.id
-                    )
-                    logger.info(f"Resumo semanal enviado para {corretor.nome}")
-                    
+                    await self.calendar_index.sincronizar(corretor.id)
                 except Exception as e:
                     logger.error(
-                        f"Erro ao enviar resumo semanal para {corretor.id}: {e}"
+                        f"Erro ao sincronizar agenda de {corretor.id}: {e}"
                     )
         
         except Exception as e:
-            logger.error(f"Erro ao enviar resumos semanais: {e}")
+            logger.error(f"Erro na sincronização de agendas: {e}")
+    
+    async def _preparar_resumos_manha(self):
+        """Pré-calcula os briefings do resumo da manhã"""
+        logger.info("Preparando resumos da manhã")
+        await self._disparar_job_singleton(
+            "preparar_resumo_manha",
+            lambda corretor: corretor.preferencias.resumo_diario
+        )
+    
+    async def _preparar_resumos_noite(self):
+        """Pré-calcula os briefings do resumo da noite"""
+        logger.info("Preparando resumos da noite")
+        await self._disparar_job_singleton(
+            "preparar_resumo_noite",
+            lambda corretor: corretor.preferencias.resumo_diario
+        )
+    
+    async def _preparar_resumos_semanais(self):
+        """Pré-calcula os relatórios do resumo semanal"""
+        logger.info("Preparando resumos semanais")
+        await self._disparar_job_singleton(
+            "preparar_resumo_semanal",
+            lambda corretor: corretor.preferencias.resumo_semanal
+        )
+    
+    async def _enviar_resumos_manha(self):
+        """Envia resumos matinais"""
+        logger.info("Enviando resumos da manhã")
+        await self._disparar_job_singleton(
+            "resumo_manha",
+            lambda corretor: corretor.preferencias.resumo_diario,
+            lote=settings.resumo_send_batch_size
+        )
+    
+    async def _enviar_resumos_noite(self):
+        """Envia resumos noturnos"""
+        logger.info("Enviando resumos da noite")
+        await self._disparar_job_singleton(
+            "resumo_noite",
+            lambda corretor: corretor.preferencias.resumo_diario,
+            lote=settings.resumo_send_batch_size
+        )
+    
+    async def _enviar_resumos_semanais(self):
+        """Envia resumos semanais"""
+        logger.info("Enviando resumos semanais")
+        await self._disparar_job_singleton(
+            "resumo_semanal",
+            lambda corretor: corretor.preferencias.resumo_semanal,
+            lote=settings.resumo_send_batch_size
+        )
     
     async def _detectar_padroes(self):
         """Detecta e comunica padrões emergentes"""
         logger.info("Detectando padrões de demanda")
+        await self._disparar_job_singleton("detectar_padroes")
+    
+    async def _disparar_job_singleton(self, job: str, filtro=None, lote: int = 1):
+        """
+        Dispara um job singleton
+        
+        Só o líder dispara: ele enfileira uma tarefa por corretor (ou por
+        lote de corretores) e todos os workers consomem a fila, dividindo
+        o trabalho pesado.
+        """
+        if not self.lider.lider:
+            return
         
         try:
-            corretores = await self.memory.list_corretores_ativos()
+            execucao = f"{job}:{datetime.utcnow():%Y-%m-%dT%H}"
+            if not self.lider.reivindicar_execucao(execucao):
+                logger.info(f"Job {job} já disparado nesta janela")
+                return
             
-            for corretor in corretores:
-                try:
-                    padroes = await self.orquestrador.detectar_e_comunicar_padroes(
-                        corretor.id
-                    )
-                    
-                    if padroes:
-                        logger.info(
-                            f"Corretor {corretor.nome}: "
-                            f"{len(padroes)} padrões comunicados"
-                        )
-                
-                except Exception as e:
-                    logger.error(
-                        f"Erro ao detectar padrões para {corretor.id}: {e}"
-                    )
+            corretores = [
+                corretor for corretor in await self.memory.list_corretores_ativos()
+                if filtro is None or filtro(corretor)
+            ]
+            
+            if lote > 1:
+                tarefas = [
+                    {
+                        "job": job,
+                        "corretor_ids": [c.id for c in corretores[i:i + lote]]
+                    }
+                    for i in range(0, len(corretores), lote)
+                ]
+            else:
+                tarefas = [
+                    {"job": job, "corretor_id": corretor.id, "nome": corretor.nome}
+                    for corretor in corretores
+                ]
+            
+            await self.tarefas.enviar(tarefas)
+            logger.info(f"Job {job}: {len(tarefas)} tarefas distribuídas")
         
         except Exception as e:
-            logger.error(f"Erro na detecção de padrões: {e}")
+            logger.error(f"Erro ao disparar job {job}: {e}")
+    
+    async def _executar_tarefa(self, tarefa: dict):
+        """Executa a parte de um job singleton referente a um corretor (ou lote)"""
+        job = tarefa["job"]
+        corretor_id = tarefa.get("corretor_id")
+        corretor_ids = tarefa.get("corretor_ids") or [corretor_id]
+        nome = tarefa.get("nome", corretor_id)
+        
+        tipos_resumo = {
+            "resumo_manha": "diario_manha",
+            "resumo_noite": "diario_noite",
+            "resumo_semanal": "semanal",
+        }
+        
+        if job == "preparar_resumo_manha":
+            await self.orquestrador.preparar_resumo_diario(corretor_id, horario="manha")
+        
+        elif job == "preparar_resumo_noite":
+            await self.orquestrador.preparar_resumo_diario(corretor_id, horario="noite")
+        
+        elif job == "preparar_resumo_semanal":
+            await self.orquestrador.preparar_resumo_semanal(corretor_id)
+        
+        elif job in tipos_resumo:
+            resultados = await self.orquestrador.gerar_resumos_em_lote(
+                corretor_ids,
+                tipos_resumo[job]
+            )
+            enviados = sum(1 for r in resultados.values() if r["enviado"])
+            logger.info(f"Job {job}: {enviados}/{len(corretor_ids)} resumos enviados")
+        
+        elif job == "detectar_padroes":
+            padroes = await self.orquestrador.detectar_e_comunicar_padroes(
+                corretor_id
+            )
+            if padroes:
+                logger.info(f"Corretor {nome}: {len(padroes)} padrões comunicados")
+        
+        else:
+            logger.warning(f"Tarefa desconhecida: {job}")
+    
+    async def _consumir_tarefas(self):
+        """Worker que consome a fila de tarefas dos jobs singleton"""
+        while True:
+            tarefa = await self.tarefas.receber()
+            
+            try:
+                await self._executar_tarefa(tarefa)
+            except Exception as e:
+                logger.error(
+                    f"Erro na tarefa {tarefa.get('job')} do corretor "
+                    f"{tarefa.get('corretor_id') or tarefa.get('corretor_ids')}: {e}"
+                )
+            finally:
+                # Só uma queda do worker devolve a tarefa à fila
+                await self.tarefas.confirmar(tarefa)
     
     async def run(self):
         """Inicia o sistema"""
         logger.info("🚀 Lastro.AI iniciado!")
         
+        # Assume os shards e disputa a liderança antes do primeiro ciclo
+        await self.shards.sincronizar()
+        await self.lider.sincronizar()
+        
         # Inicia o scheduler
         self.scheduler.start()
         logger.info("Scheduler iniciado")
         
-        # Mantém o processo rodando
+        tarefas = [
+            asyncio.create_task(self.shards.run()),
+            asyncio.create_task(self.lider.run()),
+            asyncio.create_task(self.despachante.run()),
+            asyncio.create_task(self.reconciliador.run()),
+        ]
+        tarefas.extend(
+            asyncio.create_task(self._consumir_tarefas())
+            for _ in range(settings.task_workers)
+        )
+        
+        # Workers da fila de ingestão (no modo worker, só recebem o que
+        # vem da caixa de entrada dos seus corretores)
+        tarefas.extend(
+            asyncio.create_task(self._consumir_fila_ingestao())
+            for _ in range(settings.ingestion_workers)
+        )
+        if self.redis_client and settings.sharding_enabled:
+            tarefas.append(asyncio.create_task(self._drenar_caixa_entrada()))
+        if self.spread_scheduler:
+            tarefas.append(asyncio.create_task(self.spread_scheduler.run()))
+            logger.info("Vigilante em modo spread")
+        
         try:
-            while True:
-                await asyncio.sleep(60)
-        except KeyboardInterrupt:
+            if self.modo_worker:
+                logger.info(f"Worker {self.shards.worker_id} iniciado")
+                await asyncio.Event().wait()
+            else:
+                # Servidor de webhooks (mantém o processo rodando)
+                servidor = uvicorn.Server(
+                    uvicorn.Config(
+                        self.api,
+                        host=settings.api_host,
+                        port=settings.api_port,
+                        log_level=settings.log_level.lower()
+                    )
+                )
+                logger.info(f"Webhooks em {settings.api_host}:{settings.api_port}")
+                await servidor.serve()
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+        finally:
             logger.info("Encerrando Lastro.AI...")
+            await self.inbound_buffer.flush()
+            await self.entregas.flush()
+            for tarefa in tarefas:
+                tarefa.cancel()
+            await self.shards.sair()
+            await self.lider.renunciar()
             self.scheduler.shutdown()
+            await self.twilio_client.fechar()
+            if self.calendar_index.habilitado:
+                await self.calendar_index.client.fechar()
+            if self.carteira_client is not None:
+                await self.carteira_client.fechar()
             logger.info("✅ Lastro.AI encerrado")
     
     async def processar_mensagem_corretor(
@@ -279,6 +874,9 @@ class LastroAI:
         """
         logger.info(f"Mensagem do corretor {corretor_id}: {mensagem}")
         
+        # Conta como resposta ao último template enviado (teste A/B)
+        self.orquestrador.conselheiro.tools["templates"].registrar_resposta(corretor_id)
+        
         # TODO: Implementar processamento de linguagem natural
         # para entender comandos como:
         # - "quem são meus leads mais quentes?"
@@ -291,7 +889,15 @@ class LastroAI:
 
 def main():
     """Função principal"""
-    app = LastroAI()
+    parser = argparse.ArgumentParser(description="Lastro.AI")
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Roda como worker (só Vigilante dos seus shards, sem webhooks)"
+    )
+    args = parser.parse_args()
+    
+    app = LastroAI(modo_worker=args.worker)
     asyncio.run(app.run())
 
 
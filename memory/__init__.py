@@ -2,5 +2,48 @@
 Sistema de memória do Lastro.AI
 """
 from .service import MemoryService
+from .calendar import CalendarIndex, IntervalTree, SyncTokenExpirado
+from .snapshots import CarteiraDiffer, CarteiraSnapshot
+from .suppression import SuppressionStore, fingerprint_evento
+from .ingestion import IngestionQueue
+from .delayed_queue import DelayedQueue, DelayedDispatcher, prioridade_de
+from .coalescing import CoalescingBuffer
+from .quota import QuotaStore
+from .resumos import ResumoCache
+from .memo import AnalysisMemo
+from .identity import IdentityMap, ciclo_identidade, mapa_atual
+from .sugestoes import SuggestionCache, BackendMemoria, BackendRedis
+from .janelas import SendWindowCache
+from .contexto import ContextSnapshots
+from .entregas import DeliveryStatusStore, DeliveryReconciler
+from .caixa_entrada import InboundMailbox
 
-__all__ = ["MemoryService"]
+__all__ = [
+    "MemoryService",
+    "CalendarIndex",
+    "IntervalTree",
+    "SyncTokenExpirado",
+    "CarteiraDiffer",
+    "CarteiraSnapshot",
+    "SuppressionStore",
+    "fingerprint_evento",
+    "IngestionQueue",
+    "DelayedQueue",
+    "DelayedDispatcher",
+    "prioridade_de",
+    "CoalescingBuffer",
+    "QuotaStore",
+    "ResumoCache",
+    "AnalysisMemo",
+    "IdentityMap",
+    "ciclo_identidade",
+    "mapa_atual",
+    "SuggestionCache",
+    "BackendMemoria",
+    "BackendRedis",
+    "SendWindowCache",
+    "ContextSnapshots",
+    "DeliveryStatusStore",
+    "DeliveryReconciler",
+    "InboundMailbox",
+]
@@ -0,0 +1,119 @@
+"""
+Caixa de entrada por corretor - entrega mensagens recebidas ao worker
+dono do shard do corretor
+
+O processo de webhooks só processa as mensagens dos corretores dos seus
+shards. As demais ficam numa lista por corretor no Redis:
+
+- Mensagens urgentes (e de novos leads) marcam o corretor num sorted set,
+  que o dono consulta a cada segundo para processá-las sem esperar o ciclo
+- As demais são retiradas pelo WhatsAppMonitor no ciclo do Vigilante
+
+Cada lista é limitada (as mensagens mais antigas são descartadas) e expira
+se nenhum worker a retirar.
+"""
+from typing import Any, Deque, Dict, List
+from collections import deque
+import json
+import time
+from loguru import logger
+
+
+class InboundMailbox:
+    """
+    Lista de mensagens recebidas por corretor (Redis ou memória)
+
+    Sem Redis há um único processo, dono de todos os corretores; a caixa
+    em memória só existe para manter a mesma interface.
+    """
+
+    PREFIXO = "caixa_entrada:"
+    CHAVE_URGENTES = "caixa_entrada:urgentes"
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_por_corretor: int = 200,
+        ttl_segundos: int = 24 * 3600
+    ):
+        self.redis = redis_client
+        self.max_por_corretor = max_por_corretor
+        self.ttl = ttl_segundos
+
+        # Fallback em memória
+        self._mensagens: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._urgentes: Dict[str, float] = {}
+
+        self.stats = {"depositadas": 0, "retiradas": 0, "descartadas": 0}
+
+    async def depositar(
+        self,
+        corretor_id: str,
+        mensagens: List[Dict[str, Any]],
+        urgencia: str = "baixa"
+    ):
+        """Guarda mensagens para o dono do corretor"""
+        if not mensagens:
+            return
+
+        if self.redis:
+            chave = self._chave(corretor_id)
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.rpush(chave, *[json.dumps(m, default=str) for m in mensagens])
+            pipe.ltrim(chave, -self.max_por_corretor, -1)
+            pipe.expire(chave, self.ttl)
+            if urgencia == "alta":
+                pipe.zadd(self.CHAVE_URGENTES, {corretor_id: time.time()}, nx=True)
+            tamanho = pipe.execute()[0]
+        else:
+            fila = self._mensagens.setdefault(
+                corretor_id,
+                deque(maxlen=self.max_por_corretor)
+            )
+            tamanho = len(fila) + len(mensagens)
+            fila.extend(mensagens)
+            if urgencia == "alta":
+                self._urgentes.setdefault(corretor_id, time.time())
+
+        self.stats["depositadas"] += len(mensagens)
+
+        excedente = tamanho - self.max_por_corretor
+        if excedente > 0:
+            self.stats["descartadas"] += excedente
+            logger.warning(
+                f"Caixa de entrada do corretor {corretor_id} cheia: "
+                f"{excedente} mensagens antigas descartadas"
+            )
+
+    async def retirar(self, corretor_id: str) -> List[Dict[str, Any]]:
+        """Obtém e remove as mensagens do corretor (atômico)"""
+        if self.redis:
+            chave = self._chave(corretor_id)
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.lrange(chave, 0, -1)
+            pipe.delete(chave)
+            pipe.zrem(self.CHAVE_URGENTES, corretor_id)
+            brutos = pipe.execute()[0]
+            mensagens = [json.loads(bruto) for bruto in brutos]
+        else:
+            mensagens = list(self._mensagens.pop(corretor_id, ()))
+            self._urgentes.pop(corretor_id, None)
+
+        self.stats["retiradas"] += len(mensagens)
+        return mensagens
+
+    async def corretores_urgentes(self) -> List[str]:
+        """Corretores com mensagens urgentes aguardando (mais antigos primeiro)"""
+        if self.redis:
+            return self.redis.zrange(self.CHAVE_URGENTES, 0, -1)
+        return sorted(self._urgentes, key=self._urgentes.get)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        urgentes = (
+            self.redis.zcard(self.CHAVE_URGENTES) if self.redis
+            else len(self._urgentes)
+        )
+        return {**self.stats, "corretores_urgentes": urgentes}
+
+    def _chave(self, corretor_id: str) -> str:
+        return f"{self.PREFIXO}{corretor_id}"
@@ -0,0 +1,274 @@
+"""
+Índice local da agenda - Evita consultar a API de calendário a cada ciclo
+
+Cada corretor tem uma árvore de intervalos com seus compromissos,
+mantida por sincronização incremental (sync tokens no estilo Google Calendar).
+Horários são guardados em UTC sem fuso, como no resto do sistema.
+"""
+from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta, timezone
+import random
+from loguru import logger
+from models import Compromisso
+
+
+class SyncTokenExpirado(Exception):
+    """Provedor invalidou o sync token (equivalente ao HTTP 410 Gone)"""
+    pass
+
+
+def normalizar_utc(horario: datetime) -> datetime:
+    """UTC sem fuso (horários sem fuso já são considerados UTC)"""
+    if horario.tzinfo is None:
+        return horario
+    return horario.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class _No:
+    """Nó da árvore de intervalos (treap aumentada com o maior fim da subárvore)"""
+
+    __slots__ = ("chave", "compromisso", "prioridade", "max_fim", "esq", "dir")
+
+    def __init__(self, compromisso: Compromisso):
+        self.chave = (compromisso.inicio, compromisso.id)
+        self.compromisso = compromisso
+        self.prioridade = random.random()
+        self.max_fim = compromisso.fim
+        self.esq: Optional["_No"] = None
+        self.dir: Optional["_No"] = None
+
+    def atualizar(self):
+        self.max_fim = self.compromisso.fim
+        if self.esq and self.esq.max_fim > self.max_fim:
+            self.max_fim = self.esq.max_fim
+        if self.dir and self.dir.max_fim > self.max_fim:
+            self.max_fim = self.dir.max_fim
+
+
+class IntervalTree:
+    """
+    Árvore de intervalos balanceada (treap)
+
+    Inserção/remoção em O(log n) e busca de sobreposição em O(log n + k),
+    podando subárvores cujo maior fim é anterior ao início da janela.
+    """
+
+    def __init__(self):
+        self._raiz: Optional[_No] = None
+        self._chaves: Dict[str, tuple] = {}  # compromisso_id -> chave
+
+    def __len__(self) -> int:
+        return len(self._chaves)
+
+    def inserir(self, compromisso: Compromisso):
+        """Insere ou substitui um compromisso"""
+        if compromisso.id in self._chaves:
+            self.remover(compromisso.id)
+        self._raiz = self._inserir(self._raiz, _No(compromisso))
+        self._chaves[compromisso.id] = (compromisso.inicio, compromisso.id)
+
+    def remover(self, compromisso_id: str) -> bool:
+        """Remove um compromisso pelo ID"""
+        chave = self._chaves.pop(compromisso_id, None)
+        if chave is None:
+            return False
+        self._raiz = self._remover(self._raiz, chave)
+        return True
+
+    def sobrepostos(self, inicio: datetime, fim: datetime) -> List[Compromisso]:
+        """Compromissos que intersectam [inicio, fim), ordenados por início"""
+        resultado: List[Compromisso] = []
+        self._buscar(self._raiz, inicio, fim, resultado)
+        return resultado
+
+    def _inserir(self, no: Optional[_No], novo: _No) -> _No:
+        if no is None:
+            return novo
+        if novo.chave < no.chave:
+            no.esq = self._inserir(no.esq, novo)
+            if no.esq.prioridade > no.prioridade:
+                no = self._rotacionar_direita(no)
+        else:
+            no.dir = self._inserir(no.dir, novo)
+            if no.dir.prioridade > no.prioridade:
+                no = self._rotacionar_esquerda(no)
+        no.atualizar()
+        return no
+
+    def _remover(self, no: Optional[_No], chave: tuple) -> Optional[_No]:
+        if no is None:
+            return None
+        if chave < no.chave:
+            no.esq = self._remover(no.esq, chave)
+        elif chave > no.chave:
+            no.dir = self._remover(no.dir, chave)
+        else:
+            if no.esq is None:
+                return no.dir
+            if no.dir is None:
+                return no.esq
+            if no.esq.prioridade > no.dir.prioridade:
+                no = self._rotacionar_direita(no)
+                no.dir = self._remover(no.dir, chave)
+            else:
+                no = self._rotacionar_esquerda(no)
+                no.esq = self._remover(no.esq, chave)
+        no.atualizar()
+        return no
+
+    def _buscar(
+        self,
+        no: Optional[_No],
+        inicio: datetime,
+        fim: datetime,
+        resultado: List[Compromisso]
+    ):
+        # Nenhum intervalo desta subárvore termina depois do início da janela
+        if no is None or no.max_fim <= inicio:
+            return
+        self._buscar(no.esq, inicio, fim, resultado)
+        if no.compromisso.inicio >= fim:
+            # Nós à direita começam ainda mais tarde
+            return
+        if no.compromisso.fim > inicio:
+            resultado.append(no.compromisso)
+        self._buscar(no.dir, inicio, fim, resultado)
+
+    @staticmethod
+    def _rotacionar_direita(no: _No) -> _No:
+        filho = no.esq
+        no.esq = filho.dir
+        filho.dir = no
+        no.atualizar()
+        filho.atualizar()
+        return filho
+
+    @staticmethod
+    def _rotacionar_esquerda(no: _No) -> _No:
+        filho = no.dir
+        no.dir = filho.esq
+        filho.esq = no
+        no.atualizar()
+        filho.atualizar()
+        return filho
+
+
+class CalendarIndex:
+    """
+    Agenda local de todos os corretores
+
+    O provedor de calendário deve expor
+    `listar_alteracoes(corretor_id, sync_token) -> dict` retornando
+    {"compromissos": [...], "removidos": [...], "proximo_sync_token": "..."}.
+    Com sync_token=None o provedor devolve a agenda completa.
+
+    Sem provedor a agenda fica desativada (`habilitado` False): o índice
+    fica vazio e a checagem de visitas não segura nenhum envio.
+    """
+
+    def __init__(self, calendar_client=None):
+        self.client = calendar_client
+        self._arvores: Dict[str, IntervalTree] = {}
+        self._sync_tokens: Dict[str, Optional[str]] = {}
+
+    @property
+    def habilitado(self) -> bool:
+        return self.client is not None
+
+    def arvore(self, corretor_id: str) -> IntervalTree:
+        """Árvore de compromissos do corretor (criada sob demanda)"""
+        if corretor_id not in self._arvores:
+            self._arvores[corretor_id] = IntervalTree()
+        return self._arvores[corretor_id]
+
+    def aplicar_alteracoes(
+        self,
+        corretor_id: str,
+        compromissos: List[Compromisso],
+        removidos: Optional[List[str]] = None
+    ) -> int:
+        """Aplica um lote de alterações ao índice. Retorna itens alterados."""
+        arvore = self.arvore(corretor_id)
+        alterados = 0
+
+        for compromisso_id in removidos or []:
+            alterados += arvore.remover(compromisso_id)
+
+        for compromisso in compromissos:
+            if compromisso.cancelado:
+                alterados += arvore.remover(compromisso.id)
+            else:
+                arvore.inserir(self._em_utc(compromisso))
+                alterados += 1
+
+        return alterados
+
+    async def sincronizar(self, corretor_id: str) -> Dict[str, Any]:
+        """
+        Sincronização incremental com o provedor de calendário
+
+        Returns:
+            {"alterados": 3, "completo": False}
+        """
+        if self.client is None:
+            return {"alterados": 0, "completo": False}
+
+        token = self._sync_tokens.get(corretor_id)
+
+        try:
+            resposta = await self.client.listar_alteracoes(corretor_id, token)
+        except SyncTokenExpirado:
+            # Token invalidado pelo provedor (HTTP 410) - refaz carga completa
+            logger.warning(f"Sync token expirado para {corretor_id}, recarregando agenda")
+            token = None
+            resposta = await self.client.listar_alteracoes(corretor_id, None)
+
+        if token is None:
+            self._arvores[corretor_id] = IntervalTree()
+
+        compromissos = [
+            c if isinstance(c, Compromisso) else Compromisso(**c)
+            for c in resposta.get("compromissos", [])
+        ]
+        alterados = self.aplicar_alteracoes(
+            corretor_id,
+            compromissos,
+            resposta.get("removidos", [])
+        )
+        self._sync_tokens[corretor_id] = resposta.get("proximo_sync_token")
+
+        return {"alterados": alterados, "completo": token is None}
+
+    def _em_utc(self, compromisso: Compromisso) -> Compromisso:
+        """Provedores podem devolver horários com fuso"""
+        if compromisso.inicio.tzinfo is None and compromisso.fim.tzinfo is None:
+            return compromisso
+        return compromisso.copy(update={
+            "inicio": normalizar_utc(compromisso.inicio),
+            "fim": normalizar_utc(compromisso.fim),
+        })
+
+    def compromissos_entre(
+        self,
+        corretor_id: str,
+        inicio: datetime,
+        fim: datetime
+    ) -> List[Compromisso]:
+        """Compromissos na janela, sem chamada remota"""
+        return self.arvore(corretor_id).sobrepostos(
+            normalizar_utc(inicio),
+            normalizar_utc(fim)
+        )
+
+    def compromisso_atual(
+        self,
+        corretor_id: str,
+        agora: Optional[datetime] = None
+    ) -> Optional[Compromisso]:
+        """Compromisso em andamento no instante informado"""
+        agora = normalizar_utc(agora or datetime.utcnow())
+        em_andamento = self.arvore(corretor_id).sobrepostos(
+            agora,
+            agora + timedelta(microseconds=1)
+        )
+        return em_andamento[0] if em_andamento else None
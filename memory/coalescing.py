@@ -0,0 +1,170 @@
+"""
+Buffer de agrupamento de eventos por corretor
+
+Eventos não urgentes se acumulam aqui e viram uma única mensagem
+(digest) quando a janela expira, quando o buffer enche ou no próximo
+resumo diário.
+"""
+from typing import Dict, List, Optional
+import time
+from models import Evento
+
+
+# Remove os ARGV[1] eventos mais antigos (todos, se -1) e, se o buffer
+# ficou vazio, o prazo do corretor, numa única operação: um `adicionar`
+# concorrente nunca fica sem prazo
+_LIMPAR = """
+if tonumber(ARGV[1]) < 0 then
+    redis.call('del', KEYS[1])
+else
+    redis.call('ltrim', KEYS[1], ARGV[1], -1)
+end
+local restantes = redis.call('llen', KEYS[1])
+if restantes == 0 then
+    redis.call('zrem', KEYS[2], ARGV[2])
+end
+return restantes
+"""
+
+# Lê e remove todos os eventos e o prazo do corretor numa única operação:
+# dois processos descarregando o mesmo corretor nunca veem os mesmos eventos
+_RETIRAR = """
+local eventos = redis.call('lrange', KEYS[1], 0, -1)
+redis.call('del', KEYS[1])
+redis.call('zrem', KEYS[2], ARGV[1])
+return eventos
+"""
+
+
+class CoalescingBuffer:
+    """
+    Buffer de eventos por corretor com janela de tempo e de tamanho
+
+    A janela começa no primeiro evento do buffer; o prazo de cada corretor
+    fica num sorted set para achar os vencidos sem varrer todos.
+    """
+
+    PREFIXO = "agrupamento:"
+    CHAVE_PRAZOS = "agrupamento:prazos"
+
+    def __init__(
+        self,
+        redis_client=None,
+        janela_segundos: int = 3600,
+        max_eventos: int = 10
+    ):
+        self.redis = redis_client
+        self.janela = janela_segundos
+        self.max_eventos = max_eventos
+
+        if self.redis:
+            self._limpar = self.redis.register_script(_LIMPAR)
+            self._retirar = self.redis.register_script(_RETIRAR)
+
+        # Fallback em memória
+        self._eventos: Dict[str, List[str]] = {}
+        self._prazos: Dict[str, float] = {}
+
+    async def adicionar(self, corretor_id: str, evento: Evento) -> bool:
+        """
+        Adiciona um evento ao buffer do corretor
+
+        Returns:
+            True quando o buffer atingiu o tamanho máximo (descarregar já)
+        """
+        prazo = time.time() + self.janela
+
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.rpush(self._chave(corretor_id), evento.json())
+            pipe.zadd(self.CHAVE_PRAZOS, {corretor_id: prazo}, nx=True)
+            tamanho = pipe.execute()[0]
+        else:
+            self._eventos.setdefault(corretor_id, []).append(evento.json())
+            self._prazos.setdefault(corretor_id, prazo)
+            tamanho = len(self._eventos[corretor_id])
+
+        return tamanho >= self.max_eventos
+
+    async def obter(self, corretor_id: str) -> List[Evento]:
+        """Eventos acumulados do corretor (sem remover)"""
+        if self.redis:
+            brutos = self.redis.lrange(self._chave(corretor_id), 0, -1)
+        else:
+            brutos = list(self._eventos.get(corretor_id, []))
+        return [Evento.parse_raw(bruto) for bruto in brutos]
+
+    async def limpar(self, corretor_id: str, quantidade: Optional[int] = None):
+        """
+        Remove os `quantidade` eventos mais antigos (todos, se omitido)
+
+        Eventos que chegaram depois do `obter` continuam no buffer.
+        """
+        if self.redis:
+            self._limpar(
+                keys=[self._chave(corretor_id), self.CHAVE_PRAZOS],
+                args=[-1 if quantidade is None else quantidade, corretor_id]
+            )
+            return
+
+        eventos = self._eventos.get(corretor_id, [])
+        del eventos[:len(eventos) if quantidade is None else quantidade]
+        if not eventos:
+            self._eventos.pop(corretor_id, None)
+            self._prazos.pop(corretor_id, None)
+
+    async def devolver(self, corretor_id: str, eventos: List[Evento]):
+        """
+        Devolve ao início do buffer eventos retirados cujo digest falhou
+
+        O prazo recomeça (nova tentativa depois de uma janela).
+        """
+        if not eventos:
+            return
+        brutos = [evento.json() for evento in eventos]
+        prazo = time.time() + self.janela
+
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.lpush(self._chave(corretor_id), *reversed(brutos))
+            pipe.zadd(self.CHAVE_PRAZOS, {corretor_id: prazo})
+            pipe.execute()
+            return
+
+        self._eventos[corretor_id] = brutos + self._eventos.get(corretor_id, [])
+        self._prazos[corretor_id] = prazo
+
+    async def retirar(self, corretor_id: str) -> List[Evento]:
+        """
+        Obtém e remove os eventos do corretor de forma atômica
+
+        Quem retirou é dono dos eventos: se não conseguir entregá-los,
+        chama `devolver`.
+        """
+        if self.redis:
+            brutos = self._retirar(
+                keys=[self._chave(corretor_id), self.CHAVE_PRAZOS],
+                args=[corretor_id]
+            )
+        else:
+            brutos = self._eventos.pop(corretor_id, [])
+            self._prazos.pop(corretor_id, None)
+        return [Evento.parse_raw(bruto) for bruto in brutos]
+
+    async def adiar(self, corretor_id: str, segundos: float):
+        """Adia o prazo de descarga do corretor (ex.: cota do dia esgotada)"""
+        prazo = time.time() + segundos
+        if self.redis:
+            self.redis.zadd(self.CHAVE_PRAZOS, {corretor_id: prazo}, xx=True)
+        elif corretor_id in self._prazos:
+            self._prazos[corretor_id] = prazo
+
+    async def vencidos(self) -> List[str]:
+        """Corretores cuja janela de agrupamento expirou"""
+        agora = time.time()
+        if self.redis:
+            return self.redis.zrangebyscore(self.CHAVE_PRAZOS, "-inf", agora)
+        return [c for c, prazo in self._prazos.items() if prazo <= agora]
+
+    def _chave(self, corretor_id: str) -> str:
+        return f"{self.PREFIXO}{corretor_id}"
@@ -0,0 +1,238 @@
+"""
+Contexto recente por corretor, mantido de forma incremental
+
+Em vez de varrer 7 dias de interações a cada mensagem composta, cada
+corretor tem um snapshot pequeno e limitado, atualizado quando as coisas
+acontecem:
+- últimas N interações (lista com LTRIM)
+- alertas ativos (um por lead; some quando o corretor responde o lead)
+- contadores do dia local (expiram na meia-noite seguinte)
+
+Ler o contexto é um único round trip (pipeline com três leituras).
+"""
+from typing import Any, Deque, Dict, List, Tuple
+from collections import deque
+from datetime import datetime, time as dt_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+import json
+
+from models import Evento, Interacao, Lead
+
+
+# Contadores do dia alimentados por eventos e interações
+CONTADOR_POR_EVENTO = {
+    "novo_lead": "leads_novos_hoje",
+    "visita_proxima": "visitas_proximas",
+}
+CONTADOR_POR_INTERACAO = {
+    "mensagem_recebida": "mensagens_recebidas_hoje",
+    "mensagem_enviada": "mensagens_enviadas_hoje",
+    "visita": "visitas_hoje",
+}
+
+
+def _utc_naive(horario: datetime) -> str:
+    """ISO em UTC sem fuso (ordenável e comparável)"""
+    if horario.tzinfo is not None:
+        horario = horario.astimezone(timezone.utc).replace(tzinfo=None)
+    return horario.isoformat()
+
+
+class ContextSnapshots:
+    """
+    Snapshot de contexto por corretor
+
+    Sem Redis, mantém as mesmas estruturas em memória.
+    """
+
+    PREFIXO = "contexto:"
+
+    def __init__(
+        self,
+        redis_client=None,
+        fuso: str = "America/Sao_Paulo",
+        max_interacoes: int = 20,
+        max_alertas: int = 10,
+        validade_alerta_horas: int = 48
+    ):
+        self.redis = redis_client
+        self.fuso = ZoneInfo(fuso)
+        self.max_interacoes = max_interacoes
+        self.max_alertas = max_alertas
+        self.validade_alerta = timedelta(hours=validade_alerta_horas)
+
+        self._interacoes: Dict[str, Deque[str]] = {}
+        self._alertas: Dict[str, Dict[str, str]] = {}
+        self._contadores: Dict[str, Tuple[str, Dict[str, int]]] = {}  # corretor -> (dia, contadores)
+
+    # ==================== ESCRITA ====================
+
+    def registrar_interacoes(
+        self,
+        lead: Lead,
+        interacoes: List[Interacao],
+        pipe=None
+    ):
+        """
+        Acrescenta interações de um lead ao contexto do corretor
+
+        Com `pipe`, os comandos entram no pipeline de quem chamou.
+        """
+        corretor_id = lead.corretor_id
+        itens = [
+            json.dumps({
+                "lead_id": lead.id,
+                "com": lead.nome,
+                "quando": _utc_naive(i.data),
+                "assunto": i.conteudo[:80],
+            })
+            for i in interacoes
+        ]
+        contadores: Dict[str, int] = {}
+        for i in interacoes:
+            nome = CONTADOR_POR_INTERACAO.get(getattr(i.tipo, "value", i.tipo))
+            if nome:
+                contadores[nome] = contadores.get(nome, 0) + 1
+
+        # Corretor respondeu: os alertas daquele lead deixam de valer
+        respondeu = any(
+            getattr(i.tipo, "value", i.tipo) == "mensagem_enviada" for i in interacoes
+        )
+
+        if not self.redis:
+            fila = self._interacoes.setdefault(
+                corretor_id, deque(maxlen=self.max_interacoes)
+            )
+            fila.extendleft(itens)
+            self._somar_local(corretor_id, contadores)
+            if respondeu:
+                self._alertas.get(corretor_id, {}).pop(lead.id, None)
+            return
+
+        executar = pipe is None
+        pipe = pipe if pipe is not None else self.redis.pipeline(transaction=False)
+        chave = self._chave(corretor_id, "interacoes")
+        if itens:
+            pipe.lpush(chave, *itens)
+            pipe.ltrim(chave, 0, self.max_interacoes - 1)
+        self._somar_redis(pipe, corretor_id, contadores)
+        if respondeu:
+            pipe.hdel(self._chave(corretor_id, "alertas"), lead.id)
+        if executar:
+            pipe.execute()
+
+    async def registrar_eventos(self, corretor_id: str, eventos: List[Evento]):
+        """Eventos novos viram alertas ativos e alimentam os contadores"""
+        if not eventos:
+            return
+
+        alertas = {
+            (e.lead_id or e.id): json.dumps({
+                "titulo": e.titulo,
+                "tipo": getattr(e.tipo, "value", e.tipo),
+                "urgencia": getattr(e.urgencia, "value", e.urgencia),
+                "em": _utc_naive(e.data_deteccao),
+            })
+            for e in eventos
+        }
+        contadores: Dict[str, int] = {}
+        for e in eventos:
+            nome = CONTADOR_POR_EVENTO.get(getattr(e.tipo, "value", e.tipo))
+            if nome:
+                contadores[nome] = contadores.get(nome, 0) + 1
+
+        if not self.redis:
+            ativos = self._alertas.setdefault(corretor_id, {})
+            ativos.update(alertas)
+            self._limitar_alertas(ativos)
+            self._somar_local(corretor_id, contadores)
+            return
+
+        chave = self._chave(corretor_id, "alertas")
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(chave, mapping=alertas)
+        pipe.expire(chave, int(self.validade_alerta.total_seconds()))
+        self._somar_redis(pipe, corretor_id, contadores)
+        pipe.hgetall(chave)
+        ativos = pipe.execute()[-1]
+
+        excedentes = self._excedentes(ativos)
+        if excedentes:
+            self.redis.hdel(chave, *excedentes)
+
+    # ==================== LEITURA ====================
+
+    async def ler(self, corretor_id: str) -> Dict[str, Any]:
+        """Snapshot do corretor em uma leitura"""
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.lrange(self._chave(corretor_id, "interacoes"), 0, -1)
+            pipe.hgetall(self._chave(corretor_id, "alertas"))
+            pipe.hgetall(self._chave_contadores(corretor_id))
+            interacoes, alertas, contadores = pipe.execute()
+        else:
+            interacoes = list(self._interacoes.get(corretor_id, ()))
+            alertas = dict(self._alertas.get(corretor_id, {}))
+            dia, contadores = self._contadores.get(corretor_id, ("", {}))
+            if dia != self._dia_local():
+                contadores = {}
+
+        limite = datetime.utcnow() - self.validade_alerta
+        alertas_ativos = sorted(
+            (
+                alerta for alerta in map(json.loads, alertas.values())
+                if datetime.fromisoformat(alerta["em"]) >= limite
+            ),
+            key=lambda alerta: alerta["em"],
+            reverse=True
+        )
+
+        return {
+            "interacoes": [json.loads(bruto) for bruto in interacoes],
+            "alertas": alertas_ativos,
+            "contadores": {nome: int(valor) for nome, valor in contadores.items()},
+        }
+
+    # ==================== INTERNOS ====================
+
+    def _chave(self, corretor_id: str, parte: str) -> str:
+        return f"{self.PREFIXO}{corretor_id}:{parte}"
+
+    def _dia_local(self) -> str:
+        return datetime.now(self.fuso).strftime("%Y-%m-%d")
+
+    def _chave_contadores(self, corretor_id: str) -> str:
+        return self._chave(corretor_id, f"contadores:{self._dia_local()}")
+
+    def _somar_redis(self, pipe, corretor_id: str, contadores: Dict[str, int]):
+        if not contadores:
+            return
+        chave = self._chave_contadores(corretor_id)
+        for nome, valor in contadores.items():
+            pipe.hincrby(chave, nome, valor)
+
+        # Expira na meia-noite local seguinte
+        amanha = datetime.now(self.fuso).date() + timedelta(days=1)
+        pipe.expireat(chave, int(datetime.combine(amanha, dt_time(), tzinfo=self.fuso).timestamp()))
+
+    def _somar_local(self, corretor_id: str, contadores: Dict[str, int]):
+        if not contadores:
+            return
+        hoje = self._dia_local()
+        dia, atuais = self._contadores.get(corretor_id, (hoje, {}))
+        if dia != hoje:
+            atuais = {}
+        self._contadores[corretor_id] = (hoje, atuais)
+        for nome, valor in contadores.items():
+            atuais[nome] = atuais.get(nome, 0) + valor
+
+    def _excedentes(self, alertas: Dict[str, str]) -> List[str]:
+        """Alertas mais antigos além de `max_alertas`"""
+        if len(alertas) <= self.max_alertas:
+            return []
+        por_idade = sorted(alertas, key=lambda chave: json.loads(alertas[chave])["em"])
+        return por_idade[:len(alertas) - self.max_alertas]
+
+    def _limitar_alertas(self, alertas: Dict[str, str]):
+        for chave in self._excedentes(alertas):
+            del alertas[chave]
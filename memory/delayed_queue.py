@@ -0,0 +1,399 @@
+"""
+Fila persistente de entrega atrasada
+
+Itens ordenados por (horario_envio, prioridade), com enqueue/dequeue em
+O(log n). Backend Redis (sorted set) ou SQLite embarcado quando Redis não
+está disponível; nos dois casos a fila sobrevive a reinícios.
+
+Entrega pelo menos uma vez: o item retirado fica "em voo" até o `ack`;
+se o worker morrer antes, o item volta para a fila quando o prazo de
+visibilidade expira. Cada claim conta uma tentativa; o despachante move
+para a dead letter os itens que esgotam as tentativas.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from datetime import datetime, timezone
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from loguru import logger
+
+
+PRIORIDADE_MAX = 10
+
+PRIORIDADE_POR_URGENCIA = {"alta": 9, "media": 5, "baixa": 2}
+
+
+def prioridade_de(urgencia) -> int:
+    """Prioridade na fila (1-10) a partir da urgência do evento"""
+    return PRIORIDADE_POR_URGENCIA.get(getattr(urgencia, "value", urgencia), 5)
+
+
+def _epoch(horario: datetime) -> float:
+    """Datetime (naive = UTC, como no resto do sistema) para epoch"""
+    if horario.tzinfo is None:
+        horario = horario.replace(tzinfo=timezone.utc)
+    return horario.timestamp()
+
+
+def _limitar(prioridade: int) -> int:
+    return max(1, min(PRIORIDADE_MAX, prioridade))
+
+
+def _score(horario: datetime, prioridade: int) -> float:
+    """
+    Score único que ordena por horário e, no mesmo segundo, por prioridade
+    (maior prioridade primeiro)
+    """
+    return int(_epoch(horario)) * 16 + (PRIORIDADE_MAX - _limitar(prioridade))
+
+
+def _score_agora() -> float:
+    # Inclui todas as prioridades do segundo atual
+    return int(time.time()) * 16 + 15
+
+
+_CLAIM = """
+local itens = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(itens) do
+    redis.call('zrem', KEYS[1], id)
+    redis.call('zadd', KEYS[2], ARGV[3], id)
+    redis.call('hincrby', KEYS[3], id, 1)
+end
+return itens
+"""
+
+# Itens em voo expirados voltam para a fila no segundo atual, com o score
+# recalculado a partir da prioridade guardada no enqueue (mesma fórmula de
+# `_score`; itens sem prioridade registrada usam ARGV[3])
+_REAP = """
+local itens = redis.call('zrangebyscore', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(itens) do
+    local prioridade = tonumber(redis.call('hget', KEYS[3], id) or ARGV[3])
+    redis.call('zrem', KEYS[2], id)
+    redis.call('zadd', KEYS[1], tonumber(ARGV[2]) * 16 + (tonumber(ARGV[4]) - prioridade), id)
+end
+return #itens
+"""
+
+
+class DelayedQueue:
+    """Fila de itens com horário de entrega e prioridade"""
+
+    CHAVE_PRONTOS = "fila_atrasada:prontos"
+    CHAVE_EM_VOO = "fila_atrasada:em_voo"
+    CHAVE_PAYLOAD = "fila_atrasada:payload"
+    CHAVE_PRIORIDADE = "fila_atrasada:prioridade"
+    CHAVE_TENTATIVAS = "fila_atrasada:tentativas"
+    CHAVE_DEAD_LETTER = "fila_atrasada:dead_letter"
+
+    def __init__(
+        self,
+        redis_client=None,
+        caminho_sqlite: str = "data/fila_atrasada.db",
+        visibilidade_segundos: int = 300
+    ):
+        self.redis = redis_client
+        self.visibilidade = visibilidade_segundos
+        self._novo_item = asyncio.Event()
+
+        if self.redis:
+            self._claim = self.redis.register_script(_CLAIM)
+            self._reap = self.redis.register_script(_REAP)
+            self.db = None
+        else:
+            Path(caminho_sqlite).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(caminho_sqlite, isolation_level=None)
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS fila (
+                    id TEXT PRIMARY KEY,
+                    score REAL NOT NULL,
+                    visivel_em REAL,
+                    payload TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            colunas = {linha[1] for linha in self.db.execute("PRAGMA table_info(fila)")}
+            if "tentativas" not in colunas:
+                # Banco criado antes da contagem de tentativas
+                self.db.execute(
+                    "ALTER TABLE fila ADD COLUMN tentativas INTEGER NOT NULL DEFAULT 0"
+                )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_fila_score ON fila(visivel_em, score)"
+            )
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS dead_letter (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL,
+                    erro TEXT,
+                    movido_em REAL NOT NULL
+                )"""
+            )
+
+    async def enqueue(
+        self,
+        payload: Dict[str, Any],
+        horario_envio: datetime,
+        prioridade: int = 5,
+        job_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Agenda um item
+
+        Returns:
+            {"job_id": "job_...", "posicao_fila": 3}
+        """
+        job_id = job_id or f"job_{uuid.uuid4().hex[:12]}"
+        score = _score(horario_envio, prioridade)
+        dados = json.dumps(payload, default=str)
+
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hset(self.CHAVE_PAYLOAD, job_id, dados)
+            pipe.hset(self.CHAVE_PRIORIDADE, job_id, _limitar(prioridade))
+            pipe.hdel(self.CHAVE_TENTATIVAS, job_id)
+            pipe.zadd(self.CHAVE_PRONTOS, {job_id: score})
+            pipe.zcount(self.CHAVE_PRONTOS, "-inf", f"({score}")
+            posicao = pipe.execute()[4] + 1
+        else:
+            self.db.execute(
+                "INSERT OR REPLACE INTO fila (id, score, visivel_em, payload, tentativas) "
+                "VALUES (?, ?, 0, ?, 0)",
+                (job_id, score, dados)
+            )
+            posicao = self.db.execute(
+                "SELECT COUNT(*) FROM fila WHERE visivel_em = 0 AND score < ?",
+                (score,)
+            ).fetchone()[0] + 1
+
+        # Acorda o despachante caso este item seja o próximo
+        self._novo_item.set()
+
+        return {"job_id": job_id, "posicao_fila": posicao}
+
+    async def claim(self, limite: int = 50) -> List[Dict[str, Any]]:
+        """
+        Retira os itens vencidos (ficam em voo até o ack)
+
+        Cada item traz `tentativas`: quantas vezes já foi retirado,
+        contando este claim.
+        """
+        agora = time.time()
+        limite_score = _score_agora()
+        visivel_em = agora + self.visibilidade
+
+        if self.redis:
+            # Itens em voo com prazo expirado voltam para a fila
+            self._reap(
+                keys=[self.CHAVE_PRONTOS, self.CHAVE_EM_VOO, self.CHAVE_PRIORIDADE],
+                args=[agora, int(agora), 5, PRIORIDADE_MAX]
+            )
+            ids = self._claim(
+                keys=[self.CHAVE_PRONTOS, self.CHAVE_EM_VOO, self.CHAVE_TENTATIVAS],
+                args=[limite_score, limite, visivel_em]
+            )
+            if not ids:
+                return []
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hmget(self.CHAVE_PAYLOAD, ids)
+            pipe.hmget(self.CHAVE_TENTATIVAS, ids)
+            payloads, tentativas = pipe.execute()
+        else:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute(
+                "UPDATE fila SET visivel_em = 0 WHERE visivel_em > 0 AND visivel_em <= ?",
+                (agora,)
+            )
+            linhas = self.db.execute(
+                "SELECT id, payload, tentativas + 1 FROM fila "
+                "WHERE visivel_em = 0 AND score <= ? ORDER BY score LIMIT ?",
+                (limite_score, limite)
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE fila SET visivel_em = ?, tentativas = tentativas + 1 WHERE id = ?",
+                [(visivel_em, job_id) for job_id, _, _ in linhas]
+            )
+            self.db.execute("COMMIT")
+            ids = [linha[0] for linha in linhas]
+            payloads = [linha[1] for linha in linhas]
+            tentativas = [linha[2] for linha in linhas]
+
+        return [
+            {"job_id": job_id, **json.loads(payload), "tentativas": int(n or 1)}
+            for job_id, payload, n in zip(ids, payloads, tentativas)
+            if payload
+        ]
+
+    async def ack(self, job_id: str):
+        """Confirma a entrega e remove o item"""
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.zrem(self.CHAVE_EM_VOO, job_id)
+            pipe.hdel(self.CHAVE_PAYLOAD, job_id)
+            pipe.hdel(self.CHAVE_PRIORIDADE, job_id)
+            pipe.hdel(self.CHAVE_TENTATIVAS, job_id)
+            pipe.execute()
+        else:
+            self.db.execute("DELETE FROM fila WHERE id = ?", (job_id,))
+
+    async def dead_letter(self, item: Dict[str, Any], erro: str):
+        """Tira da fila um item que esgotou as tentativas e o guarda para análise"""
+        job_id = item["job_id"]
+        payload = {k: v for k, v in item.items() if k not in ("job_id", "tentativas")}
+        registro = {
+            "payload": payload,
+            "tentativas": item.get("tentativas", 0),
+            "erro": erro,
+            "movido_em": time.time(),
+        }
+
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.zrem(self.CHAVE_EM_VOO, job_id)
+            pipe.hdel(self.CHAVE_PAYLOAD, job_id)
+            pipe.hdel(self.CHAVE_PRIORIDADE, job_id)
+            pipe.hdel(self.CHAVE_TENTATIVAS, job_id)
+            pipe.hset(self.CHAVE_DEAD_LETTER, job_id, json.dumps(registro, default=str))
+            pipe.execute()
+        else:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("DELETE FROM fila WHERE id = ?", (job_id,))
+            self.db.execute(
+                "INSERT OR REPLACE INTO dead_letter (id, payload, tentativas, erro, movido_em) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    json.dumps(payload, default=str),
+                    registro["tentativas"],
+                    erro,
+                    registro["movido_em"],
+                )
+            )
+            self.db.execute("COMMIT")
+
+    async def aguardar_novo_item(self, timeout: float) -> bool:
+        """
+        Espera um enqueue por até `timeout` segundos
+
+        O aviso é consumido ao retornar: um enqueue feito depois disso
+        acorda a próxima espera. Retorna False no timeout.
+        """
+        try:
+            await asyncio.wait_for(self._novo_item.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._novo_item.clear()
+
+    async def proximo_horario(self) -> Optional[float]:
+        """Epoch do próximo item pronto (None se a fila estiver vazia)"""
+        if self.redis:
+            itens = self.redis.zrange(self.CHAVE_PRONTOS, 0, 0, withscores=True)
+            score = itens[0][1] if itens else None
+        else:
+            linha = self.db.execute(
+                "SELECT MIN(score) FROM fila WHERE visivel_em = 0"
+            ).fetchone()
+            score = linha[0] if linha else None
+
+        return None if score is None else float(int(score) // 16)
+
+    def tamanho(self) -> Dict[str, int]:
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zcard(self.CHAVE_PRONTOS)
+            pipe.zcard(self.CHAVE_EM_VOO)
+            pipe.hlen(self.CHAVE_DEAD_LETTER)
+            prontos, em_voo, mortos = pipe.execute()
+            return {"prontos": prontos, "em_voo": em_voo, "dead_letter": mortos}
+        prontos, em_voo = self.db.execute(
+            "SELECT SUM(visivel_em = 0), SUM(visivel_em > 0) FROM fila"
+        ).fetchone()
+        mortos = self.db.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {"prontos": prontos or 0, "em_voo": em_voo or 0, "dead_letter": mortos}
+
+
+class DelayedDispatcher:
+    """
+    Despacha itens vencidos da fila
+
+    Dorme até o próximo item (ou até um enqueue mais cedo) em vez de
+    fazer polling curto.
+
+    Item que falha volta para a fila após o prazo de visibilidade; ao
+    chegar a `max_tentativas` claims sem sucesso (falhas do handler ou
+    workers que morreram no meio) vai para a dead letter.
+    """
+
+    def __init__(
+        self,
+        fila: DelayedQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+        espera_max_segundos: float = 60,
+        max_tentativas: int = 5
+    ):
+        self.fila = fila
+        self.handler = handler
+        self.espera_max = espera_max_segundos
+        self.max_tentativas = max_tentativas
+        self.stats = {"entregues": 0, "falhas": 0, "movidos_dead_letter": 0}
+
+    async def run(self):
+        while True:
+            try:
+                await self.despachar_vencidos()
+                espera = await self._tempo_ate_proximo()
+            except Exception as e:
+                logger.error(f"Erro no despachante da fila atrasada: {e}")
+                espera = self.espera_max
+
+            await self.fila.aguardar_novo_item(espera)
+
+    async def despachar_vencidos(self) -> int:
+        entregues = 0
+        while True:
+            itens = await self.fila.claim()
+            if not itens:
+                return entregues
+
+            for item in itens:
+                if item["tentativas"] > self.max_tentativas:
+                    # Retirado de novo depois de derrubar workers no meio
+                    await self._dead_letter(item, "prazo de visibilidade esgotado")
+                    continue
+
+                try:
+                    await self.handler(item)
+                except Exception as e:
+                    self.stats["falhas"] += 1
+                    logger.error(
+                        f"Erro ao entregar {item['job_id']} "
+                        f"(tentativa {item['tentativas']}): {e}"
+                    )
+                    if item["tentativas"] >= self.max_tentativas:
+                        await self._dead_letter(item, str(e))
+                    # Sem ack: volta para a fila após o prazo de visibilidade
+                    continue
+
+                await self.fila.ack(item["job_id"])
+                self.stats["entregues"] += 1
+                entregues += 1
+
+    async def _dead_letter(self, item: Dict[str, Any], erro: str):
+        await self.fila.dead_letter(item, erro)
+        self.stats["movidos_dead_letter"] += 1
+        logger.error(
+            f"Item {item['job_id']} movido para a dead letter após "
+            f"{item['tentativas']} tentativas: {erro}"
+        )
+
+    async def _tempo_ate_proximo(self) -> float:
+        proximo = await self.fila.proximo_horario()
+        if proximo is None:
+            return self.espera_max
+        return min(max(proximo - time.time(), 0.05), self.espera_max)
@@ -0,0 +1,351 @@
+"""
+Status de entrega das mensagens do WhatsApp
+
+Os callbacks de status da Twilio (sent, delivered, read, failed...)
+chegam pelo webhook, ficam num buffer curto e são gravados em lote num
+hash pequeno por mensagem: uma letra por marco com o epoch em que ele
+aconteceu (callbacks fora de ordem ou repetidos não sobrescrevem nada).
+
+O registro de envios (quem, quando, texto) é gravado pelo SendQueue. O
+DeliveryReconciler cruza os dois em segundo plano, calcula latências de
+entrega e leitura, repassa para os consumidores (TimingOptimizer,
+ConversationAnalyzer) e reenvia falhas temporárias.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import time
+from loguru import logger
+
+
+# Marco -> letra guardada no hash de status
+MARCOS = {
+    "sent": "s",
+    "delivered": "d",
+    "read": "r",
+    "failed": "f",
+    "undelivered": "u",
+}
+
+# Códigos de erro da Twilio em que vale tentar de novo
+# (fila cheia, destino inalcançável no momento, erro desconhecido, limite)
+ERROS_REENVIAVEIS = {30001, 30003, 30008, 63018}
+
+
+class DeliveryStatusStore:
+    """
+    Registro de envios e status de entrega por message_sid
+
+    Sem Redis, usa dicionários em memória.
+    """
+
+    PREFIXO_STATUS = "entrega:"
+    PREFIXO_ENVIO = "envio:"
+    PENDENTES = "entregas:pendentes"
+
+    def __init__(
+        self,
+        redis_client=None,
+        janela_segundos: float = 1.0,
+        max_lote: int = 500,
+        ttl_segundos: int = 3 * 24 * 3600
+    ):
+        self.redis = redis_client
+        self.janela_segundos = janela_segundos
+        self.max_lote = max_lote
+        self.ttl = ttl_segundos
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_agendado: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+        self._envios: Dict[str, Dict[str, str]] = {}
+        self._status: Dict[str, Dict[str, str]] = {}
+        self._pendentes: set = set()
+
+        self.stats = {"callbacks": 0, "flushes": 0, "envios_registrados": 0}
+
+    # ==================== ENVIOS ====================
+
+    def registrar_envio(
+        self,
+        message_sid: str,
+        destinatario: str,
+        mensagem: str,
+        prioridade: str = "normal",
+        reentregas: int = 0
+    ):
+        """Registra uma mensagem aceita pelo provedor (hook do SendQueue)"""
+        envio = {
+            "d": destinatario,
+            "m": mensagem,
+            "p": prioridade,
+            "t": str(int(time.time())),
+            "n": str(reentregas),
+        }
+        self.stats["envios_registrados"] += 1
+
+        if not self.redis:
+            self._envios[message_sid] = envio
+            return
+
+        chave = f"{self.PREFIXO_ENVIO}{message_sid}"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(chave, mapping=envio)
+        pipe.expire(chave, self.ttl)
+        pipe.execute()
+
+    # ==================== CALLBACKS ====================
+
+    async def receber(self, atualizacao: Dict[str, Any]) -> None:
+        """
+        Enfileira um callback de status
+
+        Args:
+            atualizacao: {"message_sid", "status", "codigo_erro"}
+        """
+        if atualizacao.get("status") not in MARCOS or not atualizacao.get("message_sid"):
+            return  # queued/sending/accepted não interessam
+
+        self._buffer.append({**atualizacao, "em": int(time.time())})
+        self.stats["callbacks"] += 1
+
+        if len(self._buffer) >= self.max_lote:
+            await self.flush()
+        elif self._flush_agendado is None:
+            loop = asyncio.get_running_loop()
+            self._flush_agendado = loop.call_later(
+                self.janela_segundos,
+                lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def flush(self) -> int:
+        """Grava os callbacks pendentes em lote. Retorna quantos foram gravados."""
+        if self._flush_agendado is not None:
+            self._flush_agendado.cancel()
+            self._flush_agendado = None
+
+        async with self._lock:
+            lote, self._buffer = self._buffer, []
+            if not lote:
+                return 0
+
+            try:
+                self._gravar_lote(lote)
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote de status de entrega: {e}")
+                self._buffer = lote + self._buffer
+                return 0
+
+            self.stats["flushes"] += 1
+            return len(lote)
+
+    def _gravar_lote(self, lote: List[Dict[str, Any]]):
+        if not self.redis:
+            for atualizacao in lote:
+                status = self._status.setdefault(atualizacao["message_sid"], {})
+                status.setdefault(MARCOS[atualizacao["status"]], str(atualizacao["em"]))
+                if atualizacao.get("codigo_erro"):
+                    status.setdefault("e", str(atualizacao["codigo_erro"]))
+                self._pendentes.add(atualizacao["message_sid"])
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for atualizacao in lote:
+            chave = f"{self.PREFIXO_STATUS}{atualizacao['message_sid']}"
+            pipe.hsetnx(chave, MARCOS[atualizacao["status"]], atualizacao["em"])
+            if atualizacao.get("codigo_erro"):
+                pipe.hsetnx(chave, "e", atualizacao["codigo_erro"])
+            pipe.expire(chave, self.ttl)
+        pipe.sadd(self.PENDENTES, *{a["message_sid"] for a in lote})
+        pipe.execute()
+
+    # ==================== RECONCILIAÇÃO ====================
+
+    def retirar_pendentes(self, limite: int) -> List[str]:
+        """Mensagens com status novo desde a última reconciliação"""
+        if not self.redis:
+            sids = []
+            while self._pendentes and len(sids) < limite:
+                sids.append(self._pendentes.pop())
+            return sids
+        return self.redis.spop(self.PENDENTES, limite) or []
+
+    def devolver_pendentes(self, sids: List[str]):
+        """Recoloca mensagens retiradas cuja reconciliação falhou"""
+        if not sids:
+            return
+        if not self.redis:
+            self._pendentes.update(sids)
+            return
+        self.redis.sadd(self.PENDENTES, *sids)
+
+    def ler(self, sids: List[str]) -> List[Tuple[Dict[str, str], Dict[str, str]]]:
+        """(envio, status) de cada mensagem; envio vazio se não for nossa"""
+        if not self.redis:
+            return [
+                (self._envios.get(sid, {}), self._status.get(sid, {}))
+                for sid in sids
+            ]
+
+        pipe = self.redis.pipeline(transaction=False)
+        for sid in sids:
+            pipe.hgetall(f"{self.PREFIXO_ENVIO}{sid}")
+            pipe.hgetall(f"{self.PREFIXO_STATUS}{sid}")
+        brutos = pipe.execute()
+        return list(zip(brutos[::2], brutos[1::2]))
+
+    def marcar_reconciliados(self, marcos: Dict[str, str]):
+        """Guarda os marcos já repassados (campo "x") de cada mensagem"""
+        if not marcos:
+            return
+        if not self.redis:
+            for sid, letras in marcos.items():
+                self._status.setdefault(sid, {})["x"] = letras
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for sid, letras in marcos.items():
+            pipe.hset(f"{self.PREFIXO_STATUS}{sid}", "x", letras)
+        pipe.execute()
+
+
+class DeliveryReconciler:
+    """
+    Cruza status de entrega com o registro de envios
+
+    Cada consumidor recebe, por lote, `registrar_entregas(entregas)` com
+    um item por marco novo:
+        {"corretor_id", "enviado_em" (UTC), "entrega_s", "leitura_s", "falhou"}
+    """
+
+    def __init__(
+        self,
+        store: DeliveryStatusStore,
+        memory_service,
+        consumidores: Optional[List[Any]] = None,
+        reenviar: Optional[Callable[..., Awaitable[Dict[str, Any]]]] = None,
+        intervalo_segundos: float = 5.0,
+        lote: int = 500,
+        max_reenvios: int = 1
+    ):
+        self.store = store
+        self.memory = memory_service
+        self.consumidores = consumidores or []
+        self.reenviar = reenviar
+        self.intervalo = intervalo_segundos
+        self.lote = lote
+        self.max_reenvios = max_reenvios
+        self._reenvios: set = set()
+
+        self.stats = {
+            "reconciliadas": 0,
+            "sem_registro": 0,
+            "entregues": 0,
+            "lidas": 0,
+            "falhas": 0,
+            "reenviadas": 0,
+        }
+
+    async def run(self):
+        while True:
+            try:
+                while await self.reconciliar() >= self.lote:
+                    pass
+            except Exception as e:
+                logger.error(f"Erro na reconciliação de entregas: {e}")
+            await asyncio.sleep(self.intervalo)
+
+    async def reconciliar(self) -> int:
+        """Processa um lote de mensagens com status novo"""
+        sids = self.store.retirar_pendentes(self.lote)
+        if not sids:
+            return 0
+
+        try:
+            await self._reconciliar_lote(sids)
+        except Exception:
+            # SPOP já tirou as mensagens do conjunto: sem devolver, os
+            # marcos novos delas nunca seriam repassados
+            self.store.devolver_pendentes(sids)
+            raise
+        return len(sids)
+
+    async def _reconciliar_lote(self, sids: List[str]):
+        registros = [
+            (sid, envio, status)
+            for sid, (envio, status) in zip(sids, self.store.ler(sids))
+            if envio
+        ]
+        self.stats["sem_registro"] += len(sids) - len(registros)
+
+        corretores = await self.memory.resolver_corretores_por_telefone(
+            [envio["d"] for _, envio, _ in registros]
+        )
+
+        entregas: List[Dict[str, Any]] = []
+        marcos: Dict[str, str] = {}
+
+        for sid, envio, status in registros:
+            ja_repassados = status.get("x", "")
+            novos = {
+                letra for letra in MARCOS.values()
+                if letra in status and letra not in ja_repassados
+            }
+            if not novos:
+                continue
+            marcos[sid] = ja_repassados + "".join(sorted(novos))
+
+            enviado = float(envio["t"])
+            entrega = {
+                "corretor_id": corretores.get(envio["d"]),
+                "enviado_em": datetime.fromtimestamp(enviado, timezone.utc).replace(tzinfo=None),
+                "entrega_s": float(status["d"]) - enviado if "d" in novos else None,
+                "leitura_s": float(status["r"]) - enviado if "r" in novos else None,
+                "falhou": bool(novos & {"f", "u"}),
+            }
+            self.stats["entregues"] += entrega["entrega_s"] is not None
+            self.stats["lidas"] += entrega["leitura_s"] is not None
+
+            if entrega["falhou"]:
+                self.stats["falhas"] += 1
+                self._tentar_reenvio(envio, status)
+
+            if entrega["corretor_id"]:
+                entregas.append(entrega)
+
+        for consumidor in self.consumidores:
+            try:
+                await consumidor.registrar_entregas(entregas)
+            except Exception as e:
+                logger.error(f"Erro ao repassar entregas para {consumidor.name}: {e}")
+
+        self.store.marcar_reconciliados(marcos)
+        self.stats["reconciliadas"] += len(registros)
+
+    def _tentar_reenvio(self, envio: Dict[str, str], status: Dict[str, str]):
+        codigo = int(status["e"]) if status.get("e", "").isdigit() else None
+        reentregas = int(envio.get("n", 0))
+        if self.reenviar is None or codigo not in ERROS_REENVIAVEIS:
+            return
+        if reentregas >= self.max_reenvios:
+            return
+
+        self.stats["reenviadas"] += 1
+        tarefa = asyncio.create_task(self._reenviar(envio, reentregas + 1))
+        self._reenvios.add(tarefa)
+        tarefa.add_done_callback(self._reenvios.discard)
+
+    async def _reenviar(self, envio: Dict[str, str], reentregas: int):
+        try:
+            await self.reenviar(
+                envio["d"],
+                envio["m"],
+                prioridade=envio.get("p", "normal"),
+                reentregas=reentregas
+            )
+        except Exception as e:
+            logger.error(f"Erro ao reenviar mensagem para {envio['d']}: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.stats, **self.store.stats}
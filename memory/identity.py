@@ -0,0 +1,68 @@
+"""
+Mapa de identidade por ciclo
+
+Dentro de um ciclo (processamento de um corretor), cada corretor e lead
+é buscado e desserializado no máximo uma vez: o MemoryService consulta o
+mapa do ciclo atual antes de ir ao Redis/banco. O mapa é propagado por
+contextvars, então chega aos agentes e ferramentas (e às tasks criadas
+dentro do ciclo) sem mudar suas assinaturas.
+"""
+from typing import Any, Dict, Iterator, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class IdentityMap:
+    """Entidades já carregadas no ciclo, por chave de cache"""
+
+    def __init__(self):
+        self._entidades: Dict[str, Any] = {}
+        self.stats = {"leituras": 0, "evitadas": 0}
+
+    def obter(self, chave: str) -> Optional[Any]:
+        self.stats["leituras"] += 1
+        entidade = self._entidades.get(chave)
+        if entidade is not None:
+            self.stats["evitadas"] += 1
+        return entidade
+
+    def guardar(self, chave: str, entidade: Any):
+        if entidade is not None:
+            self._entidades[chave] = entidade
+
+
+_mapa_atual: ContextVar[Optional[IdentityMap]] = ContextVar(
+    "mapa_identidade",
+    default=None
+)
+
+# Totais acumulados de todos os ciclos encerrados (métricas)
+ESTATISTICAS = {"ciclos": 0, "leituras": 0, "evitadas": 0}
+
+
+def mapa_atual() -> Optional[IdentityMap]:
+    """Mapa do ciclo em andamento (None fora de um ciclo)"""
+    return _mapa_atual.get()
+
+
+@contextmanager
+def ciclo_identidade() -> Iterator[IdentityMap]:
+    """
+    Abre um ciclo com mapa de identidade próprio
+
+    Chamadas aninhadas reutilizam o mapa do ciclo externo.
+    """
+    existente = _mapa_atual.get()
+    if existente is not None:
+        yield existente
+        return
+
+    mapa = IdentityMap()
+    token = _mapa_atual.set(mapa)
+    try:
+        yield mapa
+    finally:
+        _mapa_atual.reset(token)
+        ESTATISTICAS["ciclos"] += 1
+        ESTATISTICAS["leituras"] += mapa.stats["leituras"]
+        ESTATISTICAS["evitadas"] += mapa.stats["evitadas"]
@@ -0,0 +1,326 @@
+"""
+Fila de ingestão limitada - Protege a memória quando a entrada supera o
+processamento (composição por LLM, envio pelo WhatsApp)
+
+- Faixas de prioridade: ALTA nunca espera atrás de MEDIA/BAIXA
+- Cada faixa tem um limite em memória; o excedente vai para um segmento
+  em disco (JSONL) e é reabastecido em ordem FIFO
+- Segmentos em disco sobrevivem a reinícios e são reprocessados na subida
+  (cada worker usa o seu diretório: `{diretorio_spill}/{worker_id}/`)
+- O offset de leitura do disco só avança quando o consumidor `confirmar`
+  o item; itens que falharam voltam para o fim da faixa (`devolver`)
+- Quando o disco também enche, `put` espera (backpressure)
+"""
+from typing import Dict, Any, Deque, List, Optional, Tuple
+from collections import deque
+from pathlib import Path
+import asyncio
+import itertools
+import json
+import time
+from loguru import logger
+
+
+FAIXAS = ("alta", "media", "baixa")
+
+# Registro de uma faixa: (enfileirado_em, item, tentativas)
+Registro = Tuple[float, Any, int]
+
+
+class _SegmentoDisco:
+    """
+    Segmento JSONL de uma faixa
+
+    `leitura` é até onde o arquivo já foi lido para a memória; `offset`
+    (persistido) é até onde os itens lidos foram confirmados. Após um
+    reinício, tudo o que passou de `offset` é lido de novo.
+
+    O I/O de arquivo roda fora do event loop (`asyncio.to_thread`).
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self.caminho_offset = caminho.with_suffix(".offset")
+        self.offset = 0
+        self.leitura = 0
+        self.itens = 0
+
+        # Fim de cada registro lido e ainda não confirmado -> confirmado?
+        # (ordem do arquivo)
+        self._lidos: Dict[int, bool] = {}
+
+        # Contagem na subida do processo, antes do event loop consumir a fila
+        if self.caminho.exists():
+            if self.caminho_offset.exists():
+                self.offset = int(self.caminho_offset.read_text() or 0)
+            self.leitura = self.offset
+            with open(self.caminho, "rb") as f:
+                f.seek(self.offset)
+                self.itens = sum(1 for _ in f)
+
+    @property
+    def tamanho_bytes(self) -> int:
+        return self.caminho.stat().st_size if self.caminho.exists() else 0
+
+    async def anexar(self, registro: Registro):
+        linha = json.dumps(registro, default=str) + "\n"
+        await asyncio.to_thread(self._anexar, linha)
+        self.itens += 1
+
+    def _anexar(self, linha: str):
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            f.write(linha)
+
+    async def ler(self, quantidade: int) -> List[Tuple[Registro, int]]:
+        """Lê até `quantidade` registros, com o offset do fim de cada um"""
+        lidos = await asyncio.to_thread(self._ler, self.leitura, quantidade)
+
+        for _, fim in lidos:
+            self._lidos[fim] = False
+        if lidos:
+            self.leitura = lidos[-1][1]
+        self.itens = max(self.itens - len(lidos), 0)
+
+        return lidos
+
+    def _ler(self, inicio: int, quantidade: int) -> List[Tuple[Registro, int]]:
+        lidos = []
+        with open(self.caminho, "rb") as f:
+            f.seek(inicio)
+            for _ in range(quantidade):
+                linha = f.readline()
+                if not linha:
+                    break
+                registro = tuple(json.loads(linha))
+                if len(registro) == 2:
+                    # Formato anterior, sem contagem de tentativas
+                    registro = (*registro, 0)
+                lidos.append((registro, f.tell()))
+        return lidos
+
+    async def confirmar(self, fim: int):
+        """Marca o registro como processado e avança o offset persistido"""
+        if fim not in self._lidos:
+            return
+        self._lidos[fim] = True
+
+        avancou = False
+        for pendente, confirmado in list(self._lidos.items()):
+            if not confirmado:
+                break
+            del self._lidos[pendente]
+            self.offset = pendente
+            avancou = True
+
+        if not avancou:
+            return
+
+        if not self.itens and not self._lidos:
+            # Segmento consumido e confirmado por completo
+            self.offset = 0
+            self.leitura = 0
+            await asyncio.to_thread(self._remover)
+        else:
+            await asyncio.to_thread(
+                self.caminho_offset.write_text, str(self.offset)
+            )
+
+    def _remover(self):
+        self.caminho.unlink(missing_ok=True)
+        self.caminho_offset.unlink(missing_ok=True)
+
+
+class IngestionQueue:
+    """
+    Fila assíncrona limitada com faixas de prioridade e spill para disco
+
+    Consumo: `faixa, item, recibo = await fila.get()`, depois
+    `confirmar(recibo)` quando o item foi processado ou `devolver(recibo)`
+    quando falhou (volta para o fim da faixa até `max_tentativas`).
+    """
+
+    def __init__(
+        self,
+        diretorio_spill: str = "data/spill",
+        worker_id: Optional[str] = None,
+        max_memoria_por_faixa: int = 1000,
+        max_spill_bytes: int = 256 * 1024 * 1024,
+        max_tentativas: int = 3
+    ):
+        self.max_memoria = max_memoria_por_faixa
+        self.max_spill_bytes = max_spill_bytes
+        self.max_tentativas = max_tentativas
+
+        # Segmentos por worker: processos no mesmo host não disputam arquivos
+        diretorio = Path(diretorio_spill)
+        if worker_id:
+            diretorio = diretorio / worker_id
+        diretorio.mkdir(parents=True, exist_ok=True)
+
+        # Cada item em memória é (enfileirado_em, item, tentativas, fim_no_disco)
+        self._memoria: Dict[str, Deque[Tuple[float, Any, int, Optional[int]]]] = {
+            faixa: deque() for faixa in FAIXAS
+        }
+        self._disco: Dict[str, _SegmentoDisco] = {
+            faixa: _SegmentoDisco(diretorio / f"{faixa}.jsonl") for faixa in FAIXAS
+        }
+
+        # recibo -> (faixa, item, tentativas, fim_no_disco)
+        self._em_voo: Dict[int, Tuple[str, Any, int, Optional[int]]] = {}
+        self._recibos = itertools.count(1)
+
+        self._disponivel = asyncio.Condition()
+        self.stats = {
+            "enfileirados": 0,
+            "consumidos": 0,
+            "confirmados": 0,
+            "devolvidos": 0,
+            "descartados": 0,
+            "spill": 0,
+            "replay": 0,
+            "backpressure_esperas": 0,
+        }
+
+        # O que ficou em disco de uma execução anterior é lido no primeiro `get`
+        for faixa in FAIXAS:
+            if self._disco[faixa].itens:
+                logger.info(
+                    f"Fila de ingestão: {self._disco[faixa].itens} itens "
+                    f"em disco na faixa {faixa}, reprocessando"
+                )
+
+    async def put(self, item: Any, urgencia: str = "media"):
+        """Enfileira um item (espera se memória e disco estiverem cheios)"""
+        faixa = urgencia if urgencia in FAIXAS else "media"
+
+        async with self._disponivel:
+            await self._inserir(faixa, (time.time(), item, 0))
+            self.stats["enfileirados"] += 1
+            self._disponivel.notify_all()
+
+    async def _inserir(self, faixa: str, registro: Registro, forcar: bool = False):
+        """Memória ou disco; `forcar` ignora o limite de disco (devoluções)"""
+        while True:
+            segmento = self._disco[faixa]
+
+            # Enquanto houver itens em disco, novos itens vão para o disco
+            # (mantém a ordem FIFO da faixa)
+            if not segmento.itens and len(self._memoria[faixa]) < self.max_memoria:
+                self._memoria[faixa].append((*registro, None))
+                return
+
+            if forcar or segmento.tamanho_bytes < self.max_spill_bytes:
+                await segmento.anexar(registro)
+                self.stats["spill"] += 1
+                return
+
+            self.stats["backpressure_esperas"] += 1
+            await self._disponivel.wait()
+
+    async def get(self) -> Tuple[str, Any, int]:
+        """
+        Retira o próximo item, sempre da faixa mais urgente disponível
+
+        Returns:
+            (faixa, item, recibo)
+        """
+        async with self._disponivel:
+            while True:
+                for faixa in FAIXAS:
+                    if not self._memoria[faixa]:
+                        await self._reabastecer(faixa)
+                    if not self._memoria[faixa]:
+                        continue
+
+                    _, item, tentativas, fim = self._memoria[faixa].popleft()
+                    recibo = next(self._recibos)
+                    self._em_voo[recibo] = (faixa, item, tentativas, fim)
+                    self.stats["consumidos"] += 1
+                    # Libera produtores em backpressure
+                    self._disponivel.notify_all()
+                    return faixa, item, recibo
+
+                await self._disponivel.wait()
+
+    async def confirmar(self, recibo: int):
+        """Item processado: o offset do disco pode passar dele"""
+        async with self._disponivel:
+            em_voo = self._em_voo.pop(recibo, None)
+            if em_voo is None:
+                return
+
+            faixa, _, _, fim = em_voo
+            if fim is not None:
+                await self._disco[faixa].confirmar(fim)
+            self.stats["confirmados"] += 1
+
+    async def devolver(self, recibo: int):
+        """
+        Item que falhou volta para o fim da faixa; após `max_tentativas`
+        é descartado com log
+        """
+        async with self._disponivel:
+            em_voo = self._em_voo.pop(recibo, None)
+            if em_voo is None:
+                return
+
+            faixa, item, tentativas, fim = em_voo
+            tentativas += 1
+
+            if tentativas >= self.max_tentativas:
+                logger.error(
+                    f"Fila de ingestão: item da faixa {faixa} descartado "
+                    f"após {tentativas} tentativas: {item}"
+                )
+                self.stats["descartados"] += 1
+            else:
+                await self._inserir(faixa, (time.time(), item, tentativas), forcar=True)
+                self.stats["devolvidos"] += 1
+                self._disponivel.notify_all()
+
+            # A cópia devolvida substitui o registro original no disco
+            if fim is not None:
+                await self._disco[faixa].confirmar(fim)
+
+    async def _reabastecer(self, faixa: str):
+        segmento = self._disco[faixa]
+        if not segmento.itens:
+            return
+
+        lidos = await segmento.ler(self.max_memoria - len(self._memoria[faixa]))
+        self._memoria[faixa].extend(
+            (*registro, fim) for registro, fim in lidos
+        )
+        self.stats["replay"] += len(lidos)
+
+    def profundidade(self, faixa: Optional[str] = None) -> int:
+        """Itens aguardando (memória + disco)"""
+        faixas = [faixa] if faixa else FAIXAS
+        return sum(
+            len(self._memoria[f]) + self._disco[f].itens for f in faixas
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Métricas da fila
+
+        Returns:
+            {
+                "profundidade": {"alta": 0, "media": 12, "baixa": 340},
+                "em_disco": {"alta": 0, "media": 0, "baixa": 300},
+                "lag_segundos": {"alta": 0.0, "media": 1.2, "baixa": 95.4},
+                "enfileirados": 1200,
+                ...
+            }
+        """
+        agora = time.time()
+        return {
+            "profundidade": {f: self.profundidade(f) for f in FAIXAS},
+            "em_disco": {f: self._disco[f].itens for f in FAIXAS},
+            # A cabeça em memória é sempre o item mais antigo da faixa
+            "lag_segundos": {
+                f: (agora - self._memoria[f][0][0]) if self._memoria[f] else 0.0
+                for f in FAIXAS
+            },
+            **self.stats,
+        }
@@ -0,0 +1,124 @@
+"""
+Janelas de envio pré-calculadas por corretor
+
+O horário preferencial do corretor (horario_inicio/horario_fim) está no
+fuso local dele. As próximas janelas são convertidas uma vez para epoch
+UTC e guardadas em ordem; decidir se uma mensagem sai agora só olha a
+primeira janela ainda aberta (O(1) amortizado, sem I/O). As janelas são
+recalculadas quando as preferências mudam (MemoryService.save_corretor),
+quando acabam ou quando passam de `idade_max_segundos` (alterações
+feitas por outro processo).
+"""
+from typing import Deque, Dict, Optional, Tuple
+from collections import deque
+from datetime import datetime, time as dt_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+import time
+
+
+Janela = Tuple[float, float]  # (início, fim) em epoch UTC
+
+
+def epoch_utc(horario: datetime) -> float:
+    """Epoch de um datetime (naive = UTC)"""
+    if horario.tzinfo is None:
+        horario = horario.replace(tzinfo=timezone.utc)
+    return horario.timestamp()
+
+
+def utc_naive(epoch: float) -> datetime:
+    """Datetime UTC sem fuso (convenção do resto do sistema)"""
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+class SendWindowCache:
+    """Próximas janelas de envio de cada corretor, no fuso local"""
+
+    def __init__(
+        self,
+        fuso: str = "America/Sao_Paulo",
+        dias: int = 7,
+        idade_max_segundos: int = 600
+    ):
+        self.fuso = ZoneInfo(fuso)
+        self.dias = dias
+        self.idade_max = idade_max_segundos
+        self._janelas: Dict[str, Deque[Janela]] = {}
+        self._calculado_em: Dict[str, float] = {}
+        self.stats = {"decisoes": 0, "recalculos": 0}
+
+    def atualizar(self, corretor, ate: Optional[float] = None):
+        """
+        Recalcula as janelas a partir das preferências do corretor
+
+        Args:
+            ate: instante que as janelas precisam cobrir, além dos `dias`
+                padrão (decisões para horários futuros)
+        """
+        preferencias = corretor.preferencias
+        inicio = dt_time.fromisoformat(preferencias.horario_inicio)
+        fim = dt_time.fromisoformat(preferencias.horario_fim)
+
+        agora = time.time()
+        hoje = datetime.now(self.fuso).date()
+        janelas: Deque[Janela] = deque()
+
+        dias = self.dias
+        if ate is not None and ate > agora:
+            dias = max(dias, int((ate - agora) // 86400) + 1)
+
+        # Começa ontem para cobrir janelas que atravessam a meia-noite
+        for dia in range(-1, dias + 1):
+            data = hoje + timedelta(days=dia)
+            abre = datetime.combine(data, inicio, tzinfo=self.fuso)
+            fecha = datetime.combine(data, fim, tzinfo=self.fuso)
+            if fecha <= abre:
+                fecha += timedelta(days=1)
+            if fecha.timestamp() > agora:
+                janelas.append((abre.timestamp(), fecha.timestamp()))
+
+        self._janelas[corretor.id] = janelas
+        self._calculado_em[corretor.id] = agora
+        self.stats["recalculos"] += 1
+
+    def invalidar(self, corretor_id: str):
+        self._janelas.pop(corretor_id, None)
+        self._calculado_em.pop(corretor_id, None)
+
+    def janela(self, corretor_id: str, instante: float) -> Optional[Janela]:
+        """
+        Janela aberta em `instante` ou a próxima a abrir
+
+        None se o corretor ainda não tem janelas válidas (chamar
+        `atualizar` com o corretor).
+        """
+        janelas = self._janelas.get(corretor_id)
+        if janelas is None:
+            return None
+        if time.time() - self._calculado_em[corretor_id] > self.idade_max:
+            return None
+
+        # Descarta só as janelas já encerradas: um `instante` futuro não
+        # pode apagar as janelas das decisões de agora
+        agora = time.time()
+        while janelas and janelas[0][1] < agora:
+            janelas.popleft()
+
+        for janela in janelas:
+            if janela[1] >= instante:
+                self.stats["decisoes"] += 1
+                return janela
+        return None
+
+    def abertura_apos(self, corretor_id: str, instante: float) -> Optional[float]:
+        """Início da primeira janela que abre depois de `instante`"""
+        for abre, _ in self._janelas.get(corretor_id, ()):
+            if abre > instante:
+                return abre
+        return None
+
+    def proxima_meia_noite(self, instante: float) -> float:
+        """Próxima meia-noite local (epoch)"""
+        local = datetime.fromtimestamp(instante, self.fuso)
+        amanha = datetime.combine(local.date() + timedelta(days=1), dt_time(), tzinfo=self.fuso)
+        return amanha.timestamp()
@@ -0,0 +1,94 @@
+"""
+Memoização de análises do Analista
+
+Detecção de padrões (6h), briefing (7h) e relatório semanal (segunda 7h)
+rodam as mesmas análises sobre os mesmos dados. O resultado é guardado
+por (corretor, ferramenta, parâmetros, dia, versão dos dados): qualquer
+escrita de lead ou interação do corretor incrementa a versão e invalida
+apenas as análises dele.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+
+
+class AnalysisMemo:
+    """
+    Cache de resultados de análises
+
+    Sem Redis, usa um LRU em memória limitado a `max_itens`.
+    """
+
+    PREFIXO = "memo:"
+
+    def __init__(
+        self,
+        memory_service,
+        ttl_segundos: int = 24 * 3600,
+        max_itens: int = 10000
+    ):
+        self.memory = memory_service
+        self.redis = getattr(memory_service, "redis", None)
+        self.ttl = ttl_segundos
+        self.max_itens = max_itens
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def obter_ou_calcular(
+        self,
+        corretor_id: str,
+        ferramenta: str,
+        parametros: Dict[str, Any],
+        calcular: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Resultado memorizado ou calculado (e memorizado) agora"""
+        versao = await self.memory.versao_dados(corretor_id)
+        chave = self._chave(corretor_id, ferramenta, parametros, versao)
+
+        bruto = self._ler(chave)
+        if bruto is not None:
+            self.stats["hits"] += 1
+            return json.loads(bruto)
+
+        self.stats["misses"] += 1
+        bruto = json.dumps(await calcular(), default=str)
+        self._gravar(chave, bruto)
+        # Mesma forma de um hit (datetimes viram texto, chaves viram str)
+        return json.loads(bruto)
+
+    def _chave(
+        self,
+        corretor_id: str,
+        ferramenta: str,
+        parametros: Dict[str, Any],
+        versao: int
+    ) -> str:
+        # Janelas relativas a "agora" (últimos N dias) mudam de um dia
+        # para o outro mesmo sem escrita nova
+        dia = datetime.utcnow().strftime("%Y-%m-%d")
+        params = hashlib.blake2b(
+            json.dumps(parametros, sort_keys=True, default=str).encode(),
+            digest_size=8
+        ).hexdigest()
+        return f"{self.PREFIXO}{corretor_id}:{ferramenta}:{params}:{dia}:v{versao}"
+
+    def _ler(self, chave: str) -> Optional[str]:
+        if self.redis:
+            return self.redis.get(chave)
+
+        bruto = self._local.get(chave)
+        if bruto is not None:
+            self._local.move_to_end(chave)
+        return bruto
+
+    def _gravar(self, chave: str, bruto: str):
+        if self.redis:
+            self.redis.setex(chave, self.ttl, bruto)
+            return
+
+        self._local[chave] = bruto
+        self._local.move_to_end(chave)
+        while len(self._local) > self.max_itens:
+            self._local.popitem(last=False)
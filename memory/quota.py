@@ -0,0 +1,225 @@
+"""
+Cota diária de mensagens por corretor, compartilhada entre workers
+
+- Contador atômico no Redis que expira à meia-noite local do corretor
+  (`preferencias.fuso`; sem fuso próprio, o fuso padrão do sistema)
+- Suavização opcional por token bucket: com rajada 2 e 5 mensagens numa
+  jornada de 13h, o corretor ganha um token a cada ~2h36 em vez de
+  gastar as 5 mensagens na primeira hora
+- Verificar e consumir é um único round trip (script Lua)
+"""
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+
+_CONSUMIR = """
+local usadas = tonumber(redis.call('get', KEYS[1]) or '0')
+if usadas >= tonumber(ARGV[1]) then
+    return {0, -1}
+end
+
+local intervalo = tonumber(ARGV[4])
+if intervalo > 0 then
+    local agora = tonumber(ARGV[3])
+    local rajada = tonumber(ARGV[5])
+    local bucket = redis.call('hmget', KEYS[2], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or rajada
+    local ts = tonumber(bucket[2]) or agora
+    tokens = math.min(rajada, tokens + (agora - ts) / intervalo)
+    if tokens < 1 then
+        return {0, math.ceil((1 - tokens) * intervalo)}
+    end
+    redis.call('hset', KEYS[2], 'tokens', tostring(tokens - 1), 'ts', agora)
+    redis.call('pexpire', KEYS[2], math.ceil(rajada * intervalo))
+end
+
+redis.call('incr', KEYS[1])
+redis.call('expireat', KEYS[1], ARGV[2])
+return {1, 0}
+"""
+
+# Devolve a mensagem do dia e, com suavização, o token do bucket
+_DEVOLVER = """
+local usadas = tonumber(redis.call('get', KEYS[1]) or '0')
+if usadas > 0 then
+    usadas = redis.call('decr', KEYS[1])
+end
+local tokens = tonumber(redis.call('hget', KEYS[2], 'tokens'))
+if tokens then
+    redis.call('hset', KEYS[2], 'tokens', tostring(math.min(tonumber(ARGV[1]), tokens + 1)))
+end
+return usadas
+"""
+
+
+class QuotaStore:
+    """
+    Cota diária de mensagens
+
+    Sem Redis, mantém apenas o dia corrente de cada corretor em memória.
+    """
+
+    PREFIXO_CONTADOR = "cota:"
+    PREFIXO_BUCKET = "cota_bucket:"
+
+    def __init__(
+        self,
+        redis_client=None,
+        fuso: str = "America/Sao_Paulo",
+        rajada: int = 2
+    ):
+        self.redis = redis_client
+        self.fuso = ZoneInfo(fuso)
+        self.rajada = rajada
+
+        if self.redis:
+            self._consumir = self.redis.register_script(_CONSUMIR)
+            self._devolver = self.redis.register_script(_DEVOLVER)
+
+        # Fallback em memória: corretor_id -> (data local, usadas)
+        self._contadores: Dict[str, Tuple[str, int]] = {}
+        # corretor_id -> (tokens, timestamp)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def consumir(
+        self,
+        corretor_id: str,
+        limite: int,
+        intervalo_token: Optional[timedelta] = None,
+        agora: Optional[datetime] = None,
+        fuso: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Verifica e consome uma mensagem da cota do corretor
+
+        Args:
+            limite: Máximo de mensagens no dia local
+            intervalo_token: Tempo para repor um token (None = sem suavização)
+            fuso: Fuso do corretor (None = fuso padrão)
+
+        Returns:
+            {"permitido": False, "esgotada": False, "retry_segundos": 5400.0}
+        """
+        agora = self._normalizar(agora)
+        data, meia_noite = self._dia_local(agora, fuso)
+        agora_ms = int(agora.timestamp() * 1000)
+        intervalo_ms = int(intervalo_token.total_seconds() * 1000) if intervalo_token else 0
+
+        if self.redis:
+            permitido, retry_ms = self._consumir(
+                keys=[
+                    f"{self.PREFIXO_CONTADOR}{corretor_id}:{data}",
+                    f"{self.PREFIXO_BUCKET}{corretor_id}",
+                ],
+                args=[limite, int(meia_noite.timestamp()), agora_ms, intervalo_ms, self.rajada]
+            )
+        else:
+            permitido, retry_ms = self._consumir_local(
+                corretor_id, data, limite, agora_ms, intervalo_ms
+            )
+
+        if permitido:
+            return {"permitido": True, "esgotada": False, "retry_segundos": None}
+
+        # Cota do dia esgotada: só na virada do dia local
+        if retry_ms < 0:
+            return {
+                "permitido": False,
+                "esgotada": True,
+                "retry_segundos": (meia_noite - agora).total_seconds()
+            }
+        return {"permitido": False, "esgotada": False, "retry_segundos": retry_ms / 1000}
+
+    async def devolver(
+        self,
+        corretor_id: str,
+        agora: Optional[datetime] = None,
+        fuso: Optional[str] = None
+    ):
+        """
+        Devolve uma mensagem consumida que acabou não sendo enviada
+
+        Devolve também o token do bucket, quando há suavização.
+        """
+        data, _ = self._dia_local(self._normalizar(agora), fuso)
+
+        if self.redis:
+            self._devolver(
+                keys=[
+                    f"{self.PREFIXO_CONTADOR}{corretor_id}:{data}",
+                    f"{self.PREFIXO_BUCKET}{corretor_id}",
+                ],
+                args=[self.rajada]
+            )
+            return
+
+        data_atual, usadas = self._contadores.get(corretor_id, (data, 0))
+        if data_atual == data and usadas > 0:
+            self._contadores[corretor_id] = (data, usadas - 1)
+
+        if corretor_id in self._buckets:
+            tokens, ts = self._buckets[corretor_id]
+            self._buckets[corretor_id] = (min(self.rajada, tokens + 1), ts)
+
+    async def usadas(
+        self,
+        corretor_id: str,
+        agora: Optional[datetime] = None,
+        fuso: Optional[str] = None
+    ) -> int:
+        """Mensagens já consumidas no dia local"""
+        data, _ = self._dia_local(self._normalizar(agora), fuso)
+
+        if self.redis:
+            return int(self.redis.get(f"{self.PREFIXO_CONTADOR}{corretor_id}:{data}") or 0)
+
+        data_atual, usadas = self._contadores.get(corretor_id, (data, 0))
+        return usadas if data_atual == data else 0
+
+    def _normalizar(self, agora: Optional[datetime]) -> datetime:
+        """Horário com fuso (naive = UTC, como no resto do sistema)"""
+        if agora is None:
+            return datetime.now(self.fuso)
+        if agora.tzinfo is None:
+            return agora.replace(tzinfo=ZoneInfo("UTC"))
+        return agora
+
+    def _dia_local(
+        self,
+        agora: datetime,
+        fuso: Optional[str] = None
+    ) -> Tuple[str, datetime]:
+        """Data local e meia-noite local seguinte (no fuso do corretor)"""
+        zona = ZoneInfo(fuso) if fuso else self.fuso
+        local = agora.astimezone(zona)
+        meia_noite = datetime.combine(
+            local.date() + timedelta(days=1),
+            time(0),
+            tzinfo=zona
+        )
+        return local.date().isoformat(), meia_noite
+
+    def _consumir_local(
+        self,
+        corretor_id: str,
+        data: str,
+        limite: int,
+        agora_ms: int,
+        intervalo_ms: int
+    ) -> Tuple[int, int]:
+        data_atual, usadas = self._contadores.get(corretor_id, (data, 0))
+        if data_atual != data:
+            usadas = 0
+        if usadas >= limite:
+            return 0, -1
+
+        if intervalo_ms > 0:
+            tokens, ts = self._buckets.get(corretor_id, (self.rajada, agora_ms))
+            tokens = min(self.rajada, tokens + (agora_ms - ts) / intervalo_ms)
+            if tokens < 1:
+                return 0, int((1 - tokens) * intervalo_ms) + 1
+            self._buckets[corretor_id] = (tokens - 1, agora_ms)
+
+        self._contadores[corretor_id] = (data, usadas + 1)
+        return 1, 0
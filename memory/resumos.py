@@ -0,0 +1,77 @@
+"""
+Cache dos resumos pré-calculados
+
+Os briefings (Analista) são calculados antes do horário de envio e
+guardados aqui; no horário, o envio só formata e dispara. O TTL curto
+garante que um briefing de outro dia nunca seja reaproveitado.
+"""
+from typing import Any, Dict, Optional, Tuple
+import json
+import time
+
+
+class ResumoCache:
+    """
+    Briefings prontos por (tipo de resumo, corretor)
+
+    Sem Redis, usa um dicionário em memória com expiração.
+    """
+
+    PREFIXO = "resumo:"
+
+    def __init__(self, redis_client=None, ttl_segundos: int = 2 * 3600):
+        self.redis = redis_client
+        self.ttl = ttl_segundos
+        self._cache: Dict[str, Tuple[float, str]] = {}
+
+    async def salvar(
+        self,
+        tipo: str,
+        corretor_id: str,
+        dados: Dict[str, Any]
+    ):
+        chave = self._chave(tipo, corretor_id)
+        bruto = json.dumps(dados, default=str)
+
+        if self.redis:
+            self.redis.setex(chave, self.ttl, bruto)
+            return
+
+        self._expirar()
+        self._cache[chave] = (time.time() + self.ttl, bruto)
+
+    async def obter(
+        self,
+        tipo: str,
+        corretor_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Briefing pré-calculado (None se não houver)"""
+        chave = self._chave(tipo, corretor_id)
+
+        if self.redis:
+            bruto = self.redis.get(chave)
+        else:
+            expira_em, bruto = self._cache.get(chave, (0, None))
+            if expira_em < time.time():
+                bruto = None
+
+        return json.loads(bruto) if bruto else None
+
+    async def remover(
+        self,
+        tipo: str,
+        corretor_id: str
+    ):
+        chave = self._chave(tipo, corretor_id)
+        if self.redis:
+            self.redis.delete(chave)
+        else:
+            self._cache.pop(chave, None)
+
+    def _chave(self, tipo: str, corretor_id: str) -> str:
+        return f"{self.PREFIXO}{tipo}:{corretor_id}"
+
+    def _expirar(self):
+        agora = time.time()
+        for chave in [c for c, (expira_em, _) in self._cache.items() if expira_em < agora]:
+            del self._cache[chave]
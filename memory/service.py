@@ -1,11 +1,13 @@
 """
 Sistema de Memória - Gerencia dados persistentes de corretores e leads
 """
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any
 from datetime import datetime
 import redis
 import json
-from models import Corretor, Lead, Evento
+from models import Corretor, Lead, Evento, Interacao
+from .identity import mapa_atual
+from .contexto import ContextSnapshots
 
 
 class MemoryService:
@@ -15,14 +17,21 @@ class MemoryService:
     Usa Redis para cache rápido e PostgreSQL para persistência
     """
     
+    PREFIXO_VERSAO = "versao_dados:"
+    
     def __init__(
         self,
         redis_client: Optional[redis.Redis] = None,
-        db_session=None  # SQLAlchemy session
+        db_session=None,  # SQLAlchemy session
+        fuso: str = "America/Sao_Paulo"
     ):
         self.redis = redis_client
         self.db = db_session
         self._cache = {}  # Cache em memória quando Redis não disponível
+        
+        # Contexto recente por corretor (atualizado a cada interação/evento)
+        self.contexto = ContextSnapshots(redis_client, fuso)
+        self._observadores_corretor: List[Callable[[Corretor], None]] = []
     
     # ==================== CORRETORES ====================
     
@@ -31,10 +40,17 @@ class MemoryService:
         # Tenta cache primeiro
         cache_key = f"corretor:{corretor_id}"
         
+        # Já carregado neste ciclo
+        carregado = self._do_ciclo(cache_key)
+        if carregado:
+            return carregado
+        
         if self.redis:
             cached = self.redis.get(cache_key)
             if cached:
-                return Corretor.parse_raw(cached)
+                corretor = Corretor.parse_raw(cached)
+                self._guardar_no_ciclo(cache_key, corretor)
+                return corretor
         elif cache_key in self._cache:
             return self._cache[cache_key]
         
@@ -54,10 +70,21 @@ class MemoryService:
             corretor.json()
         )
         
+        # Índice número -> corretor (roteamento de mensagens recebidas)
+        self.redis.set(f"corretor_telefone:{corretor.telefone}", corretor.id)
+        self._guardar_no_ciclo(cache_key, corretor)
+        
+        for observador in self._observadores_corretor:
+            observador(corretor)
+        
         # TODO: Salvar no banco de dados
         
         return True
     
+    def observar_corretor(self, callback: Callable[[Corretor], None]):
+        """Registra um callback chamado a cada corretor salvo"""
+        self._observadores_corretor.append(callback)
+    
     async def list_corretores_ativos(self) -> List[Corretor]:
         """Lista todos os corretores ativos"""
         # TODO: Buscar do banco de dados
@@ -68,10 +95,18 @@ class MemoryService:
     async def get_lead(self, lead_id: str) -> Optional[Lead]:
         """Busca lead por ID"""
         cache_key = f"lead:{lead_id}"
+        
+        # Já carregado neste ciclo
+        carregado = self._do_ciclo(cache_key)
+        if carregado:
+            return carregado
+        
         cached = self.redis.get(cache_key)
         
         if cached:
-            return Lead.parse_raw(cached)
+            lead = Lead.parse_raw(cached)
+            self._guardar_no_ciclo(cache_key, lead)
+            return lead
         
         # TODO: Buscar do banco
         return None
@@ -85,9 +120,59 @@ class MemoryService:
             lead.json()
         )
         
+        # Índice telefone -> lead (resolução de remetentes do WhatsApp)
+        self.redis.set(f"lead_telefone:{lead.telefone}", lead.id)
+        self._guardar_no_ciclo(cache_key, lead)
+        
+        # Análises memorizadas do corretor ficam obsoletas
+        await self.incrementar_versao_dados([lead.corretor_id])
+        
         # TODO: Salvar no banco
         return True
     
+    async def resolver_remetentes(
+        self,
+        telefones: List[str]
+    ) -> Dict[str, Lead]:
+        """
+        Resolve telefones de remetentes para leads em lote
+        
+        Dois round trips (MGET do índice + MGET dos leads) para qualquer
+        quantidade de telefones.
+        """
+        telefones = list(dict.fromkeys(telefones))
+        if not telefones or not self.redis:
+            return {}
+        
+        lead_ids = self.redis.mget([f"lead_telefone:{t}" for t in telefones])
+        encontrados = [(t, lid) for t, lid in zip(telefones, lead_ids) if lid]
+        if not encontrados:
+            return {}
+        
+        brutos = self.redis.mget([f"lead:{lid}" for _, lid in encontrados])
+        
+        leads = {
+            telefone: Lead.parse_raw(bruto)
+            for (telefone, _), bruto in zip(encontrados, brutos)
+            if bruto
+        }
+        for lead in leads.values():
+            self._guardar_no_ciclo(f"lead:{lead.id}", lead)
+        
+        return leads
+    
+    async def resolver_corretores_por_telefone(
+        self,
+        telefones: List[str]
+    ) -> Dict[str, str]:
+        """Resolve números de WhatsApp para IDs de corretor em lote"""
+        telefones = list(dict.fromkeys(telefones))
+        if not telefones or not self.redis:
+            return {}
+        
+        ids = self.redis.mget([f"corretor_telefone:{t}" for t in telefones])
+        return {t: cid for t, cid in zip(telefones, ids) if cid}
+    
     async def get_leads_by_corretor(
         self, 
         corretor_id: str
@@ -164,15 +249,101 @@ class MemoryService:
         interacao: Dict[str, Any]
     ) -> bool:
         """Adiciona interação ao histórico do lead"""
-        lead = await self.get_lead(lead_id)
-        if not lead:
-            return False
+        return await self.adicionar_interacoes_em_lote(
+            {lead_id: [Interacao(**interacao)]}
+        ) > 0
+    
+    async def adicionar_interacoes_em_lote(
+        self,
+        interacoes: Dict[str, List[Interacao]]
+    ) -> int:
+        """
+        Adiciona interações a vários leads de uma vez
         
-        # TODO: Converter dict para Interacao model
-        # lead.interacoes.append(interacao)
-        lead.data_ultima_interacao = datetime.utcnow()
+        Usa um MGET e um pipeline de SETEX, independente do tamanho do lote.
+        Sem Redis, atualiza os leads carregados no ciclo e o contexto do
+        corretor em memória.
         
-        return await self.save_lead(lead)
+        Returns:
+            Quantidade de leads atualizados
+        """
+        if not interacoes:
+            return 0
+        
+        lead_ids = list(interacoes)
+        if self.redis:
+            brutos = self.redis.mget([f"lead:{lead_id}" for lead_id in lead_ids])
+            leads = [Lead.parse_raw(bruto) if bruto else None for bruto in brutos]
+            pipe = self.redis.pipeline(transaction=False)
+        else:
+            leads = [self._do_ciclo(f"lead:{lead_id}") for lead_id in lead_ids]
+            pipe = None
+        
+        atualizados = 0
+        corretores = set()
+        
+        for lead_id, lead in zip(lead_ids, leads):
+            if lead is None:
+                continue
+            
+            lead.interacoes.extend(interacoes[lead_id])
+            lead.data_ultima_interacao = datetime.utcnow()
+            
+            if pipe is not None:
+                pipe.setex(f"lead:{lead_id}", 7200, lead.json())
+            self.contexto.registrar_interacoes(lead, interacoes[lead_id], pipe)
+            self._guardar_no_ciclo(f"lead:{lead_id}", lead)
+            corretores.add(lead.corretor_id)
+            atualizados += 1
+        
+        # Análises memorizadas dos corretores afetados ficam obsoletas
+        if pipe is None:
+            await self.incrementar_versao_dados(list(corretores))
+        else:
+            for corretor_id in corretores:
+                pipe.incr(f"{self.PREFIXO_VERSAO}{corretor_id}")
+            pipe.execute()
+        
+        return atualizados
+    
+    # ==================== MAPA DE IDENTIDADE ====================
+    
+    def _do_ciclo(self, cache_key: str) -> Optional[Any]:
+        """Entidade já carregada no ciclo atual (ver memory.identity)"""
+        mapa = mapa_atual()
+        return mapa.obter(cache_key) if mapa else None
+    
+    def _guardar_no_ciclo(self, cache_key: str, entidade: Any):
+        mapa = mapa_atual()
+        if mapa:
+            mapa.guardar(cache_key, entidade)
+    
+    # ==================== VERSÃO DOS DADOS ====================
+    
+    async def versao_dados(self, corretor_id: str) -> int:
+        """
+        Versão dos dados de um corretor
+        
+        Incrementada a cada escrita de lead ou interação; usada para
+        invalidar análises memorizadas.
+        """
+        chave = f"{self.PREFIXO_VERSAO}{corretor_id}"
+        if self.redis:
+            return int(self.redis.get(chave) or 0)
+        return self._cache.get(chave, 0)
+    
+    async def incrementar_versao_dados(self, corretor_ids: List[str]):
+        """Marca os dados dos corretores como alterados"""
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=False)
+            for corretor_id in set(corretor_ids):
+                pipe.incr(f"{self.PREFIXO_VERSAO}{corretor_id}")
+            pipe.execute()
+            return
+        
+        for corretor_id in set(corretor_ids):
+            chave = f"{self.PREFIXO_VERSAO}{corretor_id}"
+            self._cache[chave] = self._cache.get(chave, 0) + 1
     
     # ==================== MÉTRICAS ====================
     
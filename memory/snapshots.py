@@ -0,0 +1,294 @@
+"""
+Snapshots da carteira de imóveis - Detecta mudanças sem comparar tudo
+
+Cada imóvel tem um hash de conteúdo e a carteira tem um resumo em árvore
+(estilo Merkle): raiz -> nós internos -> buckets -> imóveis, com
+`RAMIFICACAO` filhos por nó. A comparação desce nível a nível só pelos
+nós cujo hash mudou: uma mudança custa ~RAMIFICACAO hashes por nível, e
+não os hashes de todos os buckets.
+
+O provedor da carteira deve expor:
+- `raiz_carteira(corretor_id, fanout) -> str`
+- `hashes_filhos(corretor_id, nivel, indices, fanout) -> {indice: [hash, ...]}`
+  (hashes dos filhos de cada nó `indice` do `nivel`; a raiz é o nível 0)
+- `listar_bucket(corretor_id, bucket, fanout) -> [{"id", "preco", "status"}, ...]`
+
+Os hashes do provedor devem ser calculados com `hash_imovel`, `bucket_de`,
+`hash_bucket` e `niveis_arvore` deste módulo (ou servidos a partir de um
+CarteiraSnapshot).
+"""
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime
+import hashlib
+import json
+
+
+DEFAULT_FANOUT = 1024
+
+# Filhos por nó da árvore (o fanout deve ser uma potência dela)
+RAMIFICACAO = 32
+
+# Campos que compõem o hash de conteúdo do imóvel
+CAMPOS_HASH = ("preco", "status")
+
+
+def hash_imovel(imovel: Dict[str, Any]) -> str:
+    """Hash de conteúdo de um imóvel (apenas campos monitorados)"""
+    conteudo = json.dumps(
+        {campo: imovel.get(campo) for campo in CAMPOS_HASH},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.blake2b(conteudo.encode(), digest_size=16).hexdigest()
+
+
+def bucket_de(imovel_id: str, fanout: int = DEFAULT_FANOUT) -> int:
+    """Bucket estável de um imóvel"""
+    digest = hashlib.blake2b(imovel_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % fanout
+
+
+def hash_bucket(itens: Dict[str, str]) -> str:
+    """Hash de um bucket a partir dos pares (imovel_id, hash)"""
+    h = hashlib.blake2b(digest_size=16)
+    for imovel_id in sorted(itens):
+        h.update(imovel_id.encode())
+        h.update(itens[imovel_id].encode())
+    return h.hexdigest()
+
+
+def hash_no(filhos: List[str]) -> str:
+    """Hash de um nó interno a partir dos hashes dos filhos"""
+    h = hashlib.blake2b(digest_size=16)
+    for filho in filhos:
+        h.update(filho.encode())
+    return h.hexdigest()
+
+
+def profundidade(fanout: int, ramificacao: int = RAMIFICACAO) -> int:
+    """Níveis abaixo da raiz até os buckets"""
+    niveis, nos = 0, 1
+    while nos < fanout:
+        nos *= ramificacao
+        niveis += 1
+    if nos != fanout:
+        raise ValueError(
+            f"fanout {fanout} não é potência da ramificação {ramificacao}"
+        )
+    return niveis
+
+
+def niveis_arvore(
+    hashes_bucket: List[str],
+    ramificacao: int = RAMIFICACAO
+) -> List[List[str]]:
+    """Hashes de cada nível, da raiz ([raiz]) até os buckets"""
+    profundidade(len(hashes_bucket), ramificacao)
+    niveis = [list(hashes_bucket)]
+    while len(niveis[0]) > 1:
+        abaixo = niveis[0]
+        niveis.insert(0, [
+            hash_no(abaixo[i:i + ramificacao])
+            for i in range(0, len(abaixo), ramificacao)
+        ])
+    return niveis
+
+
+class CarteiraSnapshot:
+    """Último estado conhecido da carteira de um corretor"""
+
+    def __init__(self, fanout: int = DEFAULT_FANOUT, ramificacao: int = RAMIFICACAO):
+        self.fanout = fanout
+        self.ramificacao = ramificacao
+        # bucket -> imovel_id -> (hash, preco)
+        self.buckets: List[Dict[str, Tuple[str, Any]]] = [{} for _ in range(fanout)]
+        self.niveis: List[List[str]] = niveis_arvore(
+            [hash_bucket({})] * fanout,
+            ramificacao
+        )
+        self._alterados: set = set()
+
+    @property
+    def raiz(self) -> str:
+        return self.niveis[0][0]
+
+    @property
+    def hashes_bucket(self) -> List[str]:
+        return self.niveis[-1]
+
+    @classmethod
+    def from_imoveis(
+        cls,
+        imoveis: List[Dict[str, Any]],
+        fanout: int = DEFAULT_FANOUT,
+        ramificacao: int = RAMIFICACAO
+    ) -> "CarteiraSnapshot":
+        """Monta o snapshot completo a partir de uma lista de imóveis"""
+        snapshot = cls(fanout, ramificacao)
+        por_bucket: Dict[int, List[Dict[str, Any]]] = {}
+        for imovel in imoveis:
+            por_bucket.setdefault(bucket_de(imovel["id"], fanout), []).append(imovel)
+        for bucket, itens in por_bucket.items():
+            snapshot.substituir_bucket(bucket, itens)
+        snapshot.atualizar_raiz()
+        return snapshot
+
+    def hashes_filhos(self, nivel: int, indices: List[int]) -> Dict[int, List[str]]:
+        """Hashes dos filhos dos nós pedidos (mesmo formato do provedor)"""
+        abaixo = self.niveis[nivel + 1]
+        r = self.ramificacao
+        return {indice: abaixo[indice * r:(indice + 1) * r] for indice in indices}
+
+    def substituir_bucket(
+        self,
+        bucket: int,
+        imoveis: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Substitui o conteúdo de um bucket e retorna as mudanças de preço
+
+        Imóveis novos, removidos ou com mudança só de status atualizam o
+        snapshot mas não geram mudança.
+        """
+        anterior = self.buckets[bucket]
+        novo: Dict[str, Tuple[str, Any]] = {}
+        mudancas = []
+        agora = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+        for imovel in imoveis:
+            imovel_id = imovel["id"]
+            conteudo = hash_imovel(imovel)
+            preco = imovel.get("preco")
+            novo[imovel_id] = (conteudo, preco)
+
+            if imovel_id not in anterior:
+                continue
+
+            hash_anterior, preco_anterior = anterior[imovel_id]
+            if hash_anterior != conteudo and preco_anterior != preco:
+                mudancas.append({
+                    "imovel_id": imovel_id,
+                    "tipo_mudanca": "preco",
+                    "valor_anterior": preco_anterior,
+                    "valor_novo": preco,
+                    "data": agora
+                })
+
+        self.buckets[bucket] = novo
+        self.niveis[-1][bucket] = hash_bucket(
+            {imovel_id: item[0] for imovel_id, item in novo.items()}
+        )
+        self._alterados.add(bucket)
+        return mudancas
+
+    def atualizar_raiz(self):
+        """Recalcula só os ancestrais dos buckets substituídos"""
+        alterados, r = self._alterados, self.ramificacao
+        for nivel in range(len(self.niveis) - 2, -1, -1):
+            alterados = {indice // r for indice in alterados}
+            abaixo = self.niveis[nivel + 1]
+            for indice in alterados:
+                self.niveis[nivel][indice] = hash_no(abaixo[indice * r:(indice + 1) * r])
+        self._alterados = set()
+
+
+class CarteiraDiffer:
+    """
+    Motor de diff incremental das carteiras
+
+    Compara a raiz; se difere, desce a árvore pedindo ao provedor só os
+    filhos dos nós alterados (uma chamada por nível) e busca apenas os
+    buckets alterados.
+    """
+
+    def __init__(
+        self,
+        carteira_client=None,
+        fanout: int = DEFAULT_FANOUT,
+        ramificacao: int = RAMIFICACAO
+    ):
+        self.client = carteira_client
+        self.fanout = fanout
+        self.ramificacao = ramificacao
+        self.profundidade = profundidade(fanout, ramificacao)
+        self._snapshots: Dict[str, CarteiraSnapshot] = {}
+
+    @property
+    def habilitado(self) -> bool:
+        return self.client is not None
+
+    async def detectar_mudancas(self, corretor_id: str) -> Dict[str, Any]:
+        """
+        Retorna mudanças de preço desde o último ciclo
+
+        Returns:
+            {
+                "mudancas": [...],
+                "buckets_verificados": 3,
+                "hashes_comparados": 64,
+                "baseline": False
+            }
+        """
+        if self.client is None:
+            return {
+                "mudancas": [],
+                "buckets_verificados": 0,
+                "hashes_comparados": 0,
+                "baseline": False
+            }
+
+        raiz = await self.client.raiz_carteira(corretor_id, self.fanout)
+        snapshot = self._snapshots.get(corretor_id)
+        baseline = snapshot is None
+
+        if snapshot is None:
+            snapshot = CarteiraSnapshot(self.fanout, self.ramificacao)
+            self._snapshots[corretor_id] = snapshot
+        elif raiz == snapshot.raiz:
+            # Carteira inalterada
+            return {
+                "mudancas": [],
+                "buckets_verificados": 0,
+                "hashes_comparados": 1,
+                "baseline": False
+            }
+
+        # Desce só pelos nós cujo hash difere do snapshot
+        alterados, comparados = [0], 1
+        for nivel in range(self.profundidade):
+            if not alterados:
+                break
+            filhos = await self.client.hashes_filhos(
+                corretor_id,
+                nivel,
+                alterados,
+                self.fanout
+            )
+            local = snapshot.niveis[nivel + 1]
+            proximos = []
+            for indice in alterados:
+                for posicao, hash_remoto in enumerate(filhos[indice]):
+                    filho = indice * self.ramificacao + posicao
+                    if hash_remoto != local[filho]:
+                        proximos.append(filho)
+                comparados += len(filhos[indice])
+            alterados = proximos
+
+        mudancas = []
+        for bucket in alterados:
+            imoveis = await self.client.listar_bucket(corretor_id, bucket, self.fanout)
+            mudancas.extend(snapshot.substituir_bucket(bucket, imoveis))
+
+        snapshot.atualizar_raiz()
+
+        return {
+            # Primeira carga apenas forma o snapshot de referência
+            "mudancas": [] if baseline else mudancas,
+            "buckets_verificados": len(alterados),
+            "hashes_comparados": comparados,
+            "baseline": baseline
+        }
+
+    def snapshot(self, corretor_id: str) -> Optional[CarteiraSnapshot]:
+        """Snapshot atual do corretor, se existir"""
+        return self._snapshots.get(corretor_id)
@@ -0,0 +1,186 @@
+"""
+Cache de sugestões de mensagem geradas pelo modelo
+
+Muitos leads estão em situações praticamente iguais ("perguntou sobre
+financiamento", 24h sem resposta). A sugestão é gerada com o nome do lead
+como marcador e guardada pelo fingerprint normalizado da situação, então
+situações idênticas não voltam ao Gemini.
+
+O armazenamento é plugável: qualquer objeto com `obter(chave)` e
+`gravar(chave, valor, ttl)` (ver BackendMemoria e BackendRedis).
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+
+
+# Marcador do primeiro nome do lead no texto guardado
+MARCADOR_NOME = "{nome}"
+
+# Faixas de preço (R$) usadas no fingerprint
+FAIXA_PRECO = 100_000
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sem acentos, números genéricos e espaços simples"""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"\d+", "#", texto.lower())
+    return " ".join(texto.split())
+
+
+def fingerprint_sugestao(lead, contexto: str) -> str:
+    """
+    Fingerprint da situação do lead (sem dados pessoais)
+
+    Considera o que muda a sugestão: status, perfil da busca (tipo,
+    quartos, bairros, faixa de preço, características, financiamento) e o
+    contexto normalizado.
+    """
+    busca = lead.busca
+    faixa = (
+        int(busca.preco_max // FAIXA_PRECO) if busca.preco_max else None
+    )
+    partes = [
+        getattr(lead.status, "value", lead.status),
+        normalizar_texto(busca.tipo or ""),
+        f"{busca.quartos_min}-{busca.quartos_max}",
+        ",".join(sorted(normalizar_texto(b) for b in busca.bairros)),
+        str(faixa),
+        ",".join(sorted(normalizar_texto(c) for c in busca.caracteristicas)),
+        str(busca.financiamento),
+        normalizar_texto(contexto),
+    ]
+    conteudo = "|".join(partes)
+    return hashlib.blake2b(conteudo.encode(), digest_size=12).hexdigest()
+
+
+class BackendMemoria:
+    """LRU em memória com expiração por item"""
+
+    def __init__(self, max_itens: int = 5000):
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def obter(self, chave: str) -> Optional[str]:
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        expira_em, valor = item
+        if expira_em < time.time():
+            del self._itens[chave]
+            return None
+        self._itens.move_to_end(chave)
+        return valor
+
+    def gravar(self, chave: str, valor: str, ttl: int):
+        self._itens[chave] = (time.time() + ttl, valor)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+
+class BackendRedis:
+    """
+    Redis com TTL por chave e limite de tamanho
+
+    Um ZSET indexa as chaves por horário de gravação; acima de `max_itens`
+    as mais antigas são removidas.
+    """
+
+    INDICE = "sugestoes:indice"
+
+    def __init__(self, redis_client, max_itens: int = 50000):
+        self.redis = redis_client
+        self.max_itens = max_itens
+
+    def obter(self, chave: str) -> Optional[str]:
+        return self.redis.get(chave)
+
+    def gravar(self, chave: str, valor: str, ttl: int):
+        agora = time.time()
+        pipe = self.redis.pipeline()
+        pipe.setex(chave, ttl, valor)
+        pipe.zadd(self.INDICE, {chave: agora})
+        pipe.zremrangebyscore(self.INDICE, "-inf", agora - ttl)
+        pipe.zcard(self.INDICE)
+        tamanho = pipe.execute()[-1]
+
+        excesso = tamanho - self.max_itens
+        if excesso > 0:
+            antigas = [c for c, _ in self.redis.zpopmin(self.INDICE, excesso)]
+            if antigas:
+                self.redis.delete(*antigas)
+
+
+class SuggestionCache:
+    """
+    Sugestões por fingerprint da situação
+
+    Sem backend explícito, usa Redis se houver cliente, senão memória.
+    Gerações em andamento são compartilhadas: pedidos da mesma situação
+    esperam a mesma chamada ao modelo.
+    """
+
+    PREFIXO = "sugestao:"
+
+    def __init__(
+        self,
+        backend=None,
+        redis_client=None,
+        ttl_segundos: int = 24 * 3600,
+        max_itens: int = 5000
+    ):
+        if backend is None:
+            backend = (
+                BackendRedis(redis_client, max_itens)
+                if redis_client else BackendMemoria(max_itens)
+            )
+        self.backend = backend
+        self.ttl = ttl_segundos
+        self._em_voo: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def obter_ou_gerar(
+        self,
+        fingerprint: str,
+        gerar: Callable[[], Awaitable[str]]
+    ) -> str:
+        """Texto guardado (com MARCADOR_NOME) ou gerado e guardado agora"""
+        chave = f"{self.PREFIXO}{fingerprint}"
+
+        geracao = self._em_voo.get(chave)
+        if geracao is None:
+            texto = self.backend.obter(chave)
+            if texto is not None:
+                self.stats["hits"] += 1
+                return texto
+
+            self.stats["misses"] += 1
+            geracao = asyncio.ensure_future(self._gerar_e_gravar(chave, gerar))
+            self._em_voo[chave] = geracao
+            geracao.add_done_callback(lambda _: self._em_voo.pop(chave, None))
+
+        # Quem desiste de esperar não cancela a geração dos demais
+        return await asyncio.shield(geracao)
+
+    async def _gerar_e_gravar(
+        self,
+        chave: str,
+        gerar: Callable[[], Awaitable[str]]
+    ) -> str:
+        texto = await gerar()
+        if texto:
+            self.backend.gravar(chave, texto, self.ttl)
+        return texto
+
+    def get_metrics(self) -> Dict[str, Any]:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "taxa_acerto": round(self.stats["hits"] / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,169 @@
+"""
+Supressão de eventos repetidos entre ciclos
+
+Cada evento tem um fingerprint determinístico (tipo, corretor, sujeito e
+janela de tempo). Situações já reportadas na mesma janela são descartadas
+antes da priorização e da composição de mensagens. A urgência fica fora
+do fingerprint: um lead que passa de média para alta urgência continua
+sendo a mesma situação e não gera um segundo alerta na janela.
+
+Um evento só conta como reportado depois de enviado, agendado ou
+agrupado num digest: até lá ele fica apenas reservado por alguns minutos
+(evita que dois processamentos simultâneos reportem a mesma situação).
+"""
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+import hashlib
+import time
+from models import Evento, EventoTipo
+
+
+# Janela (segundos) em que a mesma situação não é reportada de novo
+JANELAS_SUPRESSAO: Dict[str, int] = {
+    EventoTipo.NOVO_LEAD.value: 24 * 3600,
+    EventoTipo.LEAD_SEM_RESPOSTA.value: 24 * 3600,
+    EventoTipo.CLIENTE_URGENTE.value: 2 * 3600,
+    EventoTipo.PADRAO_DETECTADO.value: 7 * 24 * 3600,
+    EventoTipo.VISITA_PROXIMA.value: 24 * 3600,
+    EventoTipo.IMOVEL_MUDANCA_PRECO.value: 24 * 3600,
+    EventoTipo.FOLLOW_UP_PENDENTE.value: 24 * 3600,
+}
+JANELA_PADRAO = 24 * 3600
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def janela_supressao(tipo: str) -> int:
+    """Janela de supressão em segundos para o tipo de evento"""
+    return JANELAS_SUPRESSAO.get(getattr(tipo, "value", tipo), JANELA_PADRAO)
+
+
+def fingerprint_evento(
+    tipo: str,
+    corretor_id: str,
+    sujeito: str,
+    agora: Optional[datetime] = None,
+    ancora: Optional[datetime] = None
+) -> str:
+    """
+    Fingerprint determinístico de uma situação
+
+    A janela de tempo é contada a partir da `ancora` (ex.: última interação
+    do lead), então a mesma situação gera o mesmo fingerprint em todos os
+    ciclos da janela, sem sofrer com a virada de um relógio global.
+    """
+    agora = agora or datetime.utcnow()
+    ancora = ancora or _EPOCH
+    decorrido = max((agora - ancora).total_seconds(), 0)
+    janela = int(decorrido // janela_supressao(tipo))
+
+    tipo = getattr(tipo, "value", tipo)
+    conteudo = f"{tipo}|{corretor_id}|{sujeito}|{janela}"
+    return hashlib.blake2b(conteudo.encode(), digest_size=10).hexdigest()
+
+
+class SuppressionStore:
+    """
+    Registro de situações já reportadas, com TTL
+
+    Usa `SET NX EX` no Redis (um pipeline por ciclo) ou um dicionário com
+    expiração quando Redis não está disponível.
+
+    Fluxo: `filtrar_novos` reserva os eventos por `reserva_segundos`;
+    quem os processa chama `confirmar` (reportado: vale a janela inteira)
+    ou `liberar` (falhou: pode ser reportado de novo no próximo ciclo).
+    Reservas não confirmadas expiram sozinhas (ex.: processo caiu).
+    """
+
+    PREFIXO = "supressao:"
+
+    def __init__(self, redis_client=None, reserva_segundos: int = 300):
+        self.redis = redis_client
+        self.reserva_segundos = reserva_segundos
+        self._local: Dict[str, float] = {}  # fingerprint -> expira_em
+        self.stats = {"verificados": 0, "suprimidos": 0, "liberados": 0}
+
+    async def filtrar_novos(self, eventos: List[Evento]) -> List[Evento]:
+        """
+        Retorna apenas eventos ainda não reportados (nem reservados) e os
+        reserva para este processamento
+        """
+        if not eventos:
+            return []
+
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=False)
+            for evento in eventos:
+                pipe.set(
+                    f"{self.PREFIXO}{evento.id}",
+                    1,
+                    nx=True,
+                    ex=self.reserva_segundos
+                )
+            novos_flags = pipe.execute()
+        else:
+            novos_flags = [self._reservar_local(evento) for evento in eventos]
+
+        novos = [
+            evento for evento, novo in zip(eventos, novos_flags) if novo
+        ]
+
+        self.stats["verificados"] += len(eventos)
+        self.stats["suprimidos"] += len(eventos) - len(novos)
+
+        return novos
+
+    async def confirmar(self, eventos: List[Evento]):
+        """Eventos enviados, agendados ou agrupados: suprimidos pela janela inteira"""
+        if not eventos:
+            return
+
+        if not self.redis:
+            agora = time.monotonic()
+            for evento in eventos:
+                self._local[evento.id] = agora + janela_supressao(evento.tipo)
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for evento in eventos:
+            pipe.set(f"{self.PREFIXO}{evento.id}", 1, ex=janela_supressao(evento.tipo))
+        pipe.execute()
+
+    async def liberar(self, eventos: List[Evento]):
+        """Eventos que não chegaram ao corretor voltam a poder ser reportados"""
+        if not eventos:
+            return
+
+        self.stats["liberados"] += len(eventos)
+        if not self.redis:
+            for evento in eventos:
+                self._local.pop(evento.id, None)
+            return
+
+        self.redis.delete(*[f"{self.PREFIXO}{evento.id}" for evento in eventos])
+
+    def _reservar_local(self, evento: Evento) -> bool:
+        agora = time.monotonic()
+
+        # Limpeza preguiçosa quando o dicionário cresce
+        if len(self._local) > 10000:
+            self._local = {
+                fp: expira for fp, expira in self._local.items() if expira > agora
+            }
+
+        expira = self._local.get(evento.id)
+        if expira is not None and expira > agora:
+            return False
+
+        self._local[evento.id] = agora + self.reserva_segundos
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores acumulados de supressão"""
+        verificados = self.stats["verificados"]
+        return {
+            **self.stats,
+            "taxa_supressao": (
+                self.stats["suprimidos"] / verificados if verificados else 0.0
+            )
+        }
@@ -16,6 +16,7 @@ from .schemas import (
     InteracaoTipo,
     Sentimento,
     BuscaImovel,
+    Compromisso,
 )
 
 __all__ = [
@@ -33,4 +34,5 @@ __all__ = [
     "InteracaoTipo",
     "Sentimento",
     "BuscaImovel",
+    "Compromisso",
 ]
@@ -98,6 +98,7 @@ class CorretorPreferencias(BaseModel):
     resumo_diario: bool = True
     resumo_semanal: bool = True
     max_mensagens_dia: int = 5
+    fuso: Optional[str] = None  # ex.: "America/Manaus"; None = fuso padrão
 
 
 class CorretorAtuacao(BaseModel):
@@ -143,6 +144,19 @@ class Corretor(BaseModel):
     data_cadastro: datetime = Field(default_factory=datetime.utcnow)
 
 
+class Compromisso(BaseModel):
+    """Compromisso da agenda do corretor (visita, reunião)"""
+    id: str
+    corretor_id: str
+    tipo: str = "visita"  # visita, reuniao, outro
+    inicio: datetime
+    fim: datetime
+    lead_id: Optional[str] = None
+    lead_nome: Optional[str] = None
+    imovel: Optional[str] = None
+    cancelado: bool = False
+
+
 class EventoTipo(str, Enum):
     """Tipos de eventos detectados"""
     NOVO_LEAD = "novo_lead"
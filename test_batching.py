@@ -0,0 +1,121 @@
+"""
+Testes dos micro-lotes de geração (workers.GenerationBatcher)
+
+O modelo é um stub local que responde o prompt de lote com o JSON
+configurado em cada teste.
+"""
+import asyncio
+import json
+import re
+import pytest
+from workers import GenerationBatcher
+
+
+class ModeloStub:
+    """
+    Prompt de lote: devolve `resposta_lote(ids)`; prompt individual:
+    devolve "individual:<prompt>"
+    """
+
+    def __init__(self, resposta_lote=None):
+        self.resposta_lote = resposta_lote or self._json_completo
+        self.prompts = []
+
+    async def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        ids = [int(i) for i in re.findall(r"### Pedido (\d+)", prompt)]
+        if not ids:
+            return f"individual:{prompt}"
+        return self.resposta_lote(ids, prompt)
+
+    @staticmethod
+    def _json_completo(ids, prompt):
+        pedidos = re.findall(r"### Pedido \d+\n(.+)", prompt)
+        return json.dumps([
+            {"id": i, "resposta": f"lote:{pedido}"} for i, pedido in zip(ids, pedidos)
+        ])
+
+    def lotes(self):
+        return [p for p in self.prompts if "### Pedido" in p]
+
+
+async def gerar_todos(batcher, prompts):
+    return await asyncio.gather(*[batcher.gerar(p) for p in prompts])
+
+
+@pytest.mark.asyncio
+async def test_pedidos_simultaneos_viram_um_lote():
+    modelo = ModeloStub()
+    batcher = GenerationBatcher(modelo, janela_ms=10, max_lote=10)
+
+    respostas = await gerar_todos(batcher, ["a", "b", "c"])
+
+    assert respostas == ["lote:a", "lote:b", "lote:c"]
+    assert len(modelo.prompts) == 1
+    assert batcher.stats["lotes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lote_cheio_e_dividido():
+    modelo = ModeloStub()
+    batcher = GenerationBatcher(modelo, janela_ms=10, max_lote=2)
+
+    respostas = await gerar_todos(batcher, ["a", "b", "c", "d", "e"])
+
+    assert respostas == ["lote:a", "lote:b", "lote:c", "lote:d", "individual:e"]
+    assert len(modelo.lotes()) == 2
+    assert batcher.stats["chamadas_modelo"] == 3
+
+
+@pytest.mark.asyncio
+async def test_prompts_identicos_viram_um_pedido():
+    modelo = ModeloStub()
+    batcher = GenerationBatcher(modelo, janela_ms=10, max_lote=10)
+
+    respostas = await gerar_todos(batcher, ["a", "b", "a", "a"])
+
+    assert respostas == ["lote:a", "lote:b", "lote:a", "lote:a"]
+    assert modelo.prompts[0].count("### Pedido") == 2
+    assert batcher.stats["pedidos"] == 4
+
+
+@pytest.mark.asyncio
+async def test_json_malformado_refaz_individualmente():
+    modelo = ModeloStub(lambda ids, prompt: '[{"id": 1, "resposta": "lote:a"')
+    batcher = GenerationBatcher(modelo, janela_ms=10, max_lote=10)
+
+    respostas = await gerar_todos(batcher, ["a", "b"])
+
+    assert respostas == ["individual:a", "individual:b"]
+    assert batcher.stats["refeitos_individualmente"] == 2
+
+
+@pytest.mark.asyncio
+async def test_json_parcial_refaz_so_os_faltantes():
+    def so_o_primeiro(ids, prompt):
+        # Texto em volta do JSON, item inválido e id fora do lote são ignorados
+        return 'Segue: [{"id": 1, "resposta": "lote:a"}, "x", {"id": 9, "resposta": "?"}]'
+
+    modelo = ModeloStub(so_o_primeiro)
+    batcher = GenerationBatcher(modelo, janela_ms=10, max_lote=10)
+
+    respostas = await gerar_todos(batcher, ["a", "b", "c"])
+
+    assert respostas == ["lote:a", "individual:b", "individual:c"]
+    assert batcher.stats["refeitos_individualmente"] == 2
+
+
+@pytest.mark.asyncio
+async def test_erro_individual_chega_a_quem_pediu():
+    class ModeloQuebrado(ModeloStub):
+        async def __call__(self, prompt):
+            self.prompts.append(prompt)
+            raise RuntimeError("modelo fora do ar")
+
+    batcher = GenerationBatcher(ModeloQuebrado(), janela_ms=10, max_lote=10)
+
+    resultados = await asyncio.gather(
+        batcher.gerar("a"), batcher.gerar("b"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in resultados)
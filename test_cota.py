@@ -0,0 +1,89 @@
+"""
+Testes da cota diária de mensagens (memory.QuotaStore)
+
+Rodam com Redis (fakeredis) e com o fallback em memória; o horário é
+passado explicitamente em `agora` (UTC sem fuso, como no resto do sistema),
+sempre no futuro: o contador no Redis expira na meia-noite real (EXPIREAT).
+"""
+from datetime import datetime, timedelta
+import fakeredis
+import pytest
+from memory import QuotaStore
+
+
+INTERVALO = timedelta(hours=2)
+
+
+@pytest.fixture(params=["redis", "memoria"])
+def cota(request):
+    redis_client = (
+        fakeredis.FakeRedis(decode_responses=True) if request.param == "redis" else None
+    )
+    return QuotaStore(redis_client, fuso="America/Sao_Paulo", rajada=2)
+
+
+async def consumir(cota, agora, limite=5, **kwargs):
+    return await cota.consumir(
+        "corretor_1", limite, INTERVALO, agora=agora, **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_bucket_repoe_token_apos_intervalo(cota):
+    agora = datetime(2031, 3, 4, 12, 0)  # 09:00 em São Paulo
+
+    assert (await consumir(cota, agora))["permitido"]
+    assert (await consumir(cota, agora))["permitido"]
+
+    # Rajada gasta: espera o próximo token
+    bloqueado = await consumir(cota, agora)
+    assert not bloqueado["permitido"] and not bloqueado["esgotada"]
+    assert bloqueado["retry_segundos"] == pytest.approx(2 * 3600, abs=1)
+
+    assert not (await consumir(cota, agora + timedelta(hours=1)))["permitido"]
+    assert (await consumir(cota, agora + timedelta(hours=2)))["permitido"]
+
+
+@pytest.mark.asyncio
+async def test_cota_esgotada_ate_a_meia_noite_local(cota):
+    agora = datetime(2031, 3, 4, 12, 0)
+
+    for _ in range(2):
+        assert (await cota.consumir("corretor_1", 2, agora=agora))["permitido"]
+
+    esgotada = await cota.consumir("corretor_1", 2, agora=agora)
+    assert esgotada["esgotada"]
+    # Meia-noite em São Paulo = 03:00 UTC
+    assert esgotada["retry_segundos"] == 15 * 3600
+
+    assert not (await cota.consumir("corretor_1", 2, agora=datetime(2031, 3, 5, 2, 59)))["permitido"]
+    assert (await cota.consumir("corretor_1", 2, agora=datetime(2031, 3, 5, 3, 0)))["permitido"]
+
+
+@pytest.mark.asyncio
+async def test_dia_segue_o_fuso_do_corretor(cota):
+    # 03:30 UTC: já é dia 5 em São Paulo, ainda dia 4 em Manaus (UTC-4)
+    agora = datetime(2031, 3, 5, 3, 30)
+
+    for _ in range(2):
+        await cota.consumir("corretor_1", 2, agora=datetime(2031, 3, 4, 20, 0), fuso="America/Manaus")
+
+    esgotada = await cota.consumir("corretor_1", 2, agora=agora, fuso="America/Manaus")
+    assert esgotada["esgotada"]
+    assert esgotada["retry_segundos"] == 30 * 60
+
+    assert await cota.usadas("corretor_1", agora=agora) == 0
+
+
+@pytest.mark.asyncio
+async def test_devolver_repoe_contador_e_token(cota):
+    agora = datetime(2031, 3, 4, 12, 0)
+
+    await consumir(cota, agora)
+    await consumir(cota, agora)
+    assert not (await consumir(cota, agora))["permitido"]
+
+    await cota.devolver("corretor_1", agora=agora)
+
+    assert await cota.usadas("corretor_1", agora=agora) == 1
+    assert (await consumir(cota, agora))["permitido"]
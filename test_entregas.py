@@ -0,0 +1,80 @@
+"""
+Testes da reconciliação de status de entrega (memory.DeliveryReconciler)
+
+Rodam com Redis (fakeredis) e com o fallback em memória. A resolução de
+corretores é um falso local que pode falhar sob demanda.
+"""
+import fakeredis
+import pytest
+from memory import DeliveryReconciler, DeliveryStatusStore
+
+
+class MemoriaFalsa:
+    def __init__(self):
+        self.falhar = False
+
+    async def resolver_corretores_por_telefone(self, telefones):
+        if self.falhar:
+            raise ConnectionError("banco fora do ar")
+        return {telefone: "corretor_1" for telefone in telefones}
+
+
+class ConsumidorFalso:
+    name = "consumidor_falso"
+
+    def __init__(self):
+        self.entregas = []
+
+    async def registrar_entregas(self, entregas):
+        self.entregas.extend(entregas)
+
+
+@pytest.fixture(params=["redis", "memoria"])
+def store(request):
+    redis_client = (
+        fakeredis.FakeRedis(decode_responses=True) if request.param == "redis" else None
+    )
+    return DeliveryStatusStore(redis_client)
+
+
+async def registrar_lidas(store, sids):
+    for sid in sids:
+        store.registrar_envio(sid, "+5511999990000", "Oi")
+        await store.receber({"message_sid": sid, "status": "delivered"})
+        await store.receber({"message_sid": sid, "status": "read"})
+    await store.flush()
+
+
+@pytest.mark.asyncio
+async def test_falha_na_reconciliacao_devolve_os_sids(store):
+    memoria = MemoriaFalsa()
+    consumidor = ConsumidorFalso()
+    reconciliador = DeliveryReconciler(store, memoria, consumidores=[consumidor])
+    await registrar_lidas(store, ["SM1", "SM2"])
+
+    memoria.falhar = True
+    with pytest.raises(ConnectionError):
+        await reconciliador.reconciliar()
+    assert consumidor.entregas == []
+
+    # Os marcos não se perdem: saem na próxima rodada
+    memoria.falhar = False
+    assert await reconciliador.reconciliar() == 2
+    assert len(consumidor.entregas) == 2
+    assert all(e["leitura_s"] is not None for e in consumidor.entregas)
+
+
+@pytest.mark.asyncio
+async def test_marcos_repassados_uma_vez(store):
+    consumidor = ConsumidorFalso()
+    reconciliador = DeliveryReconciler(store, MemoriaFalsa(), consumidores=[consumidor])
+    await registrar_lidas(store, ["SM1"])
+
+    await reconciliador.reconciliar()
+    # Callback repetido não gera nova entrega
+    await store.receber({"message_sid": "SM1", "status": "read"})
+    await store.flush()
+    await reconciliador.reconciliar()
+
+    assert len(consumidor.entregas) == 1
+    assert reconciliador.stats["lidas"] == 1
@@ -0,0 +1,82 @@
+"""
+Testes da fila de envio do WhatsApp (api.SendQueue)
+
+A API da Twilio é simulada com httpx.MockTransport: nenhuma requisição
+sai da máquina.
+"""
+import asyncio
+import httpx
+import pytest
+from api import SendQueue, WhatsAppClient
+
+
+class TwilioFalsa:
+    """Responde com os status configurados, em ordem (o último se repete)"""
+
+    def __init__(self, *status):
+        self.status = list(status)
+        self.requisicoes = []
+
+    def __call__(self, requisicao: httpx.Request) -> httpx.Response:
+        self.requisicoes.append(requisicao)
+        status = self.status.pop(0) if len(self.status) > 1 else self.status[0]
+        if status == 429:
+            return httpx.Response(429, json={"code": 20429, "message": "Too Many Requests"})
+        return httpx.Response(
+            201, json={"sid": f"SM{len(self.requisicoes)}", "status": "queued"}
+        )
+
+
+def criar_fila(twilio: TwilioFalsa, **kwargs) -> SendQueue:
+    cliente = WhatsAppClient("AC123", "token", "+5511000000000")
+    cliente.http = httpx.AsyncClient(
+        base_url="https://api.twilio.com",
+        transport=httpx.MockTransport(twilio)
+    )
+    return SendQueue(cliente, espera_reenvio_segundos=0.01, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_429_volta_para_a_fila_e_sai_depois():
+    twilio = TwilioFalsa(429, 201)
+    enviados = []
+    fila = criar_fila(twilio, ao_enviar=lambda sid, *args: enviados.append(sid))
+
+    resultado = await fila.enviar("+5511999990000", "Oi")
+
+    assert resultado["sucesso"]
+    assert len(twilio.requisicoes) == 2
+    assert fila.stats["reenfileiradas"] == 1
+    assert enviados == ["SM2"]
+    await fila.fechar()
+
+
+@pytest.mark.asyncio
+async def test_reenvios_por_429_sao_limitados():
+    twilio = TwilioFalsa(429)
+    fila = criar_fila(twilio, max_reenvios=2)
+
+    resultado = await fila.enviar("+5511999990000", "Oi")
+
+    assert not resultado["sucesso"]
+    assert resultado["codigo_erro"] == 20429
+    # Envio original + 2 reenvios; o cliente não repete 429 por conta própria
+    assert len(twilio.requisicoes) == 3
+    assert fila.stats == {"enfileiradas": 1, "reenfileiradas": 2, "falhas_definitivas": 1}
+    await fila.fechar()
+
+
+@pytest.mark.asyncio
+async def test_fechar_falha_mensagens_aguardando_reenvio():
+    twilio = TwilioFalsa(429)
+    fila = criar_fila(twilio)
+    fila.espera_reenvio = 60
+
+    tarefa = asyncio.ensure_future(fila.enviar("+5511999990000", "Oi"))
+    while not fila.stats["reenfileiradas"]:
+        await asyncio.sleep(0.001)
+
+    await fila.fechar()
+
+    resultado = await tarefa
+    assert resultado["erro"] == "Fila de envio encerrada"
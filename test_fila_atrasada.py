@@ -0,0 +1,110 @@
+"""
+Testes da fila de entregas futuras (memory.DelayedQueue)
+
+Rodam nos dois backends: Redis (fakeredis) e SQLite em diretório
+temporário. O relógio é controlado pelo monkeypatch de `time.time`.
+"""
+from datetime import datetime, timedelta
+import asyncio
+import fakeredis
+import pytest
+from memory import DelayedDispatcher, DelayedQueue
+from memory import delayed_queue
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1_700_000_000.0]
+    monkeypatch.setattr(delayed_queue.time, "time", lambda: agora[0])
+    return agora
+
+
+@pytest.fixture(params=["redis", "sqlite"])
+def fila(request, tmp_path):
+    if request.param == "redis":
+        return DelayedQueue(
+            fakeredis.FakeRedis(decode_responses=True),
+            visibilidade_segundos=60
+        )
+    return DelayedQueue(
+        caminho_sqlite=str(tmp_path / "fila.db"),
+        visibilidade_segundos=60
+    )
+
+
+def vencido(relogio) -> datetime:
+    return datetime.utcfromtimestamp(relogio[0] - 1)
+
+
+@pytest.mark.asyncio
+async def test_item_sem_ack_volta_apos_visibilidade(fila, relogio):
+    await fila.enqueue({"tipo": "mensagem"}, vencido(relogio))
+
+    primeiro = await fila.claim()
+    assert [item["tentativas"] for item in primeiro] == [1]
+
+    # Em voo: invisível até o prazo de visibilidade
+    relogio[0] += 59
+    assert await fila.claim() == []
+
+    relogio[0] += 2
+    segundo = await fila.claim()
+    assert [item["job_id"] for item in segundo] == [primeiro[0]["job_id"]]
+    assert segundo[0]["tentativas"] == 2
+
+
+@pytest.mark.asyncio
+async def test_ack_remove_o_item(fila, relogio):
+    await fila.enqueue({"tipo": "mensagem"}, vencido(relogio))
+    item, = await fila.claim()
+
+    await fila.ack(item["job_id"])
+    relogio[0] += 120
+
+    assert await fila.claim() == []
+    assert fila.tamanho() == {"prontos": 0, "em_voo": 0, "dead_letter": 0}
+
+
+@pytest.mark.asyncio
+async def test_item_futuro_e_ordem_por_prioridade(fila, relogio):
+    horario = vencido(relogio)
+    await fila.enqueue({"n": "baixa"}, horario, prioridade=2)
+    await fila.enqueue({"n": "alta"}, horario, prioridade=9)
+    await fila.enqueue({"n": "futuro"}, horario + timedelta(hours=1))
+
+    assert [item["n"] for item in await fila.claim()] == ["alta", "baixa"]
+
+
+@pytest.mark.asyncio
+async def test_despachante_move_para_dead_letter(fila, relogio):
+    entregas = []
+
+    async def handler(item):
+        entregas.append(item["tentativas"])
+        raise RuntimeError("twilio fora do ar")
+
+    despachante = DelayedDispatcher(fila, handler, max_tentativas=2)
+    await fila.enqueue({"tipo": "mensagem"}, vencido(relogio))
+
+    await despachante.despachar_vencidos()
+    relogio[0] += 61
+    await despachante.despachar_vencidos()
+    relogio[0] += 61
+    await despachante.despachar_vencidos()
+
+    assert entregas == [1, 2]
+    assert despachante.stats["movidos_dead_letter"] == 1
+    assert fila.tamanho() == {"prontos": 0, "em_voo": 0, "dead_letter": 1}
+
+
+@pytest.mark.asyncio
+async def test_aguardar_novo_item(fila, relogio):
+    assert await fila.aguardar_novo_item(0.01) is False
+
+    espera = asyncio.create_task(fila.aguardar_novo_item(5))
+    await asyncio.sleep(0)
+    await fila.enqueue({"tipo": "mensagem"}, vencido(relogio))
+
+    assert await espera is True
+    # O aviso foi consumido
+    assert await fila.aguardar_novo_item(0.01) is False
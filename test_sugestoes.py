@@ -0,0 +1,149 @@
+"""
+Testes do cache de sugestões (memory.SuggestionCache)
+
+O modelo é um falso local passado em AgenteConselheiro(modelo=...):
+nenhuma chamada sai para o Gemini.
+"""
+from datetime import datetime
+import pytest
+from agents.conselheiro import AgenteConselheiro
+from memory import BackendMemoria, DelayedQueue, SuggestionCache
+from memory import sugestoes
+from models import BuscaImovel, Lead
+
+
+class ModeloFalso:
+    """Devolve respostas fixas e conta as chamadas"""
+
+    def __init__(self, resposta="Oi {nome}! Ainda procurando em Pinheiros?", erro=None):
+        self.resposta = resposta
+        self.erro = erro
+        self.prompts = []
+
+    async def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.erro:
+            raise self.erro
+        return self.resposta
+
+
+class MemoriaFalsa:
+    redis = None
+
+
+def criar_lead(lead_id="lead_1", nome="Maria Silva", **busca) -> Lead:
+    return Lead(
+        id=lead_id,
+        nome=nome,
+        telefone="+5511999990000",
+        origem="zap_imoveis",
+        corretor_id="corretor_1",
+        data_primeiro_contato=datetime(2024, 1, 1),
+        busca=BuscaImovel(bairros=["Pinheiros"], tipo="apartamento", **busca),
+    )
+
+
+def criar_conselheiro(modelo, tmp_path) -> AgenteConselheiro:
+    return AgenteConselheiro(
+        MemoriaFalsa(),
+        fila_atrasada=DelayedQueue(caminho_sqlite=str(tmp_path / "fila.db")),
+        modelo=modelo,
+        sugestoes=SuggestionCache(BackendMemoria()),
+        janela_lote_ms=1,
+    )
+
+
+@pytest.mark.asyncio
+async def test_fingerprint_identico_nao_chama_modelo(tmp_path):
+    modelo = ModeloFalso()
+    conselheiro = criar_conselheiro(modelo, tmp_path)
+
+    primeira = await conselheiro.sugerir_mensagem_para_lead(
+        criar_lead("lead_1", "Maria Silva"), contexto="24h sem resposta"
+    )
+    segunda = await conselheiro.sugerir_mensagem_para_lead(
+        criar_lead("lead_2", "João Souza"), contexto="24h  SEM resposta"
+    )
+
+    assert len(modelo.prompts) == 1
+    assert primeira == "Oi Maria! Ainda procurando em Pinheiros?"
+    assert segunda == "Oi João! Ainda procurando em Pinheiros?"
+    assert conselheiro.sugestoes.stats == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_situacao_diferente_chama_modelo(tmp_path):
+    modelo = ModeloFalso()
+    conselheiro = criar_conselheiro(modelo, tmp_path)
+
+    await conselheiro.sugerir_mensagem_para_lead(criar_lead(), contexto="24h sem resposta")
+    await conselheiro.sugerir_mensagem_para_lead(
+        criar_lead(financiamento=True), contexto="24h sem resposta"
+    )
+
+    assert len(modelo.prompts) == 2
+
+
+@pytest.mark.asyncio
+async def test_sugestao_expira_apos_ttl(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(sugestoes.time, "time", lambda: agora[0])
+    cache = SuggestionCache(BackendMemoria(), ttl_segundos=60)
+    modelo = ModeloFalso()
+
+    async def gerar():
+        return await modelo("prompt")
+
+    await cache.obter_ou_gerar("fp", gerar)
+    agora[0] += 59
+    await cache.obter_ou_gerar("fp", gerar)
+    assert len(modelo.prompts) == 1
+
+    agora[0] += 2
+    await cache.obter_ou_gerar("fp", gerar)
+    assert len(modelo.prompts) == 2
+
+
+def test_backend_memoria_descarta_menos_usado():
+    backend = BackendMemoria(max_itens=2)
+    backend.gravar("a", "A", ttl=60)
+    backend.gravar("b", "B", ttl=60)
+
+    # Leitura renova "a": o menos usado passa a ser "b"
+    assert backend.obter("a") == "A"
+    backend.gravar("c", "C", ttl=60)
+
+    assert backend.obter("b") is None
+    assert backend.obter("a") == "A"
+    assert backend.obter("c") == "C"
+
+
+@pytest.mark.asyncio
+async def test_falha_do_modelo_usa_sugestao_padrao_sem_cache(tmp_path):
+    modelo = ModeloFalso(erro=RuntimeError("modelo fora do ar"))
+    conselheiro = criar_conselheiro(modelo, tmp_path)
+    lead = criar_lead()
+
+    texto = await conselheiro.sugerir_mensagem_para_lead(lead, contexto="24h sem resposta")
+
+    assert texto.startswith("Oi Maria! Ainda interessado")
+
+    # Falha não fica no cache: a próxima situação igual tenta o modelo de novo
+    modelo.erro = None
+    texto = await conselheiro.sugerir_mensagem_para_lead(lead, contexto="24h sem resposta")
+    assert texto == "Oi Maria! Ainda procurando em Pinheiros?"
+    assert len(modelo.prompts) == 2
+
+
+@pytest.mark.asyncio
+async def test_resposta_sem_marcador_usa_sugestao_padrao(tmp_path):
+    modelo = ModeloFalso(resposta="Oi Maria Silva! Ainda procurando?")
+    conselheiro = criar_conselheiro(modelo, tmp_path)
+    lead = criar_lead(caracteristicas=["financiamento"])
+
+    texto = await conselheiro.sugerir_mensagem_para_lead(lead, contexto="perguntou sobre financiamento")
+
+    # Texto com o nome de um lead não pode ser reaproveitado para outros
+    assert texto.startswith("Oi Maria! Vi que você perguntou sobre financiamento")
+    await conselheiro.sugerir_mensagem_para_lead(lead, contexto="perguntou sobre financiamento")
+    assert len(modelo.prompts) == 2
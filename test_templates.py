@@ -0,0 +1,99 @@
+"""
+Testes do contrato dos templates (tools.MessageTemplates)
+
+Os payloads montados pelo Conselheiro para cada tipo de evento são
+conferidos contra as variáveis declaradas: uma variável que some de um
+template (ou de um payload) falha aqui, e não na hora do envio.
+"""
+from datetime import datetime
+import pytest
+from agents.conselheiro import AgenteConselheiro
+from memory import DelayedQueue
+from models import Evento, EventoTipo, EventoUrgencia
+from tools.communication import MessageComposer, MessageTemplates
+
+
+class MemoriaFalsa:
+    redis = None
+
+
+@pytest.fixture
+def conselheiro(tmp_path):
+    return AgenteConselheiro(
+        MemoriaFalsa(),
+        fila_atrasada=DelayedQueue(caminho_sqlite=str(tmp_path / "fila.db")),
+        modelo=None,
+    )
+
+
+def criar_evento(tipo: EventoTipo, **metadata) -> Evento:
+    return Evento(
+        id=f"evt_{tipo.value}",
+        tipo=tipo,
+        urgencia=EventoUrgencia.ALTA,
+        corretor_id="corretor_1",
+        titulo="Maria Silva mencionou urgência",
+        descricao="Mensagem: preciso fechar ainda hoje",
+        acao_recomendada="Responder imediatamente",
+        timestamp=datetime(2024, 1, 1),
+        metadata=metadata,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("corretor_id", ["corretor_1", "corretor_2", "corretor_3"])
+async def test_novo_lead_mostra_a_origem(conselheiro, corretor_id):
+    evento = criar_evento(
+        EventoTipo.NOVO_LEAD,
+        nome="Maria Silva",
+        origem="zap_imoveis",
+        imovel_interesse="3q Pinheiros",
+    )
+
+    composicao = await conselheiro._compor_mensagem_evento(corretor_id, evento, {})
+
+    # Vale para qualquer variante do teste A/B
+    assert "zap_imoveis" in composicao["mensagem"]
+    assert "3q Pinheiros" in composicao["mensagem"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tipo, metadata", [
+    (EventoTipo.NOVO_LEAD, {"nome": "Maria Silva"}),
+    (EventoTipo.VISITA_PROXIMA, {"minutos_ate": 30, "lead_nome": "Maria", "imovel": "Rua A, 10"}),
+    (EventoTipo.CLIENTE_URGENTE, {}),
+    (EventoTipo.IMOVEL_MUDANCA_PRECO, {}),
+])
+async def test_payloads_do_conselheiro_seguem_o_contrato(conselheiro, tipo, metadata):
+    composicao = await conselheiro._compor_mensagem_evento(
+        "corretor_1", criar_evento(tipo, **metadata), {}
+    )
+
+    assert "{" not in composicao["mensagem"]
+
+
+@pytest.mark.asyncio
+async def test_payload_incompleto_falha_ao_compor():
+    composer = MessageComposer(MessageTemplates())
+
+    with pytest.raises(ValueError, match="origem"):
+        await composer.execute(
+            "novo_lead",
+            {"nome": "Maria", "descricao_busca": "3q", "sugestao_mensagem": "Oi"},
+        )
+
+    with pytest.raises(ValueError, match="extra"):
+        await composer.execute(
+            "visita_proxima",
+            {"minutos_ate": 30, "lead_nome": "Maria", "imovel": "Rua A", "extra": 1},
+        )
+
+
+def test_template_fora_do_contrato_falha_na_carga():
+    class TemplatesSemOrigem(MessageTemplates):
+        VARIANTES = {
+            "novo_lead": {"v2": "🔔 {nome}: {descricao_busca}\n\"{sugestao_mensagem}\""},
+        }
+
+    with pytest.raises(ValueError, match="origem"):
+        TemplatesSemOrigem()
@@ -0,0 +1,80 @@
+"""
+Testes de coordenação entre workers (workers.leases, LeaderElection, TaskQueue)
+
+Dois workers compartilham o mesmo fakeredis; a expiração de um lease é
+simulada apagando a chave.
+"""
+import fakeredis
+import pytest
+from workers import LeaderElection, TaskQueue
+from workers import tasks
+from workers.leases import LIBERAR_LEASE, RENOVAR_LEASE
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_lease_so_e_renovado_e_liberado_pelo_dono(redis_client):
+    renovar = redis_client.register_script(RENOVAR_LEASE)
+    liberar = redis_client.register_script(LIBERAR_LEASE)
+    redis_client.set("lease", "worker_a", px=1000)
+
+    assert renovar(keys=["lease"], args=["worker_b", 60000]) == 0
+    assert liberar(keys=["lease"], args=["worker_b"]) == 0
+    assert redis_client.get("lease") == "worker_a"
+    assert redis_client.pttl("lease") <= 1000
+
+    assert renovar(keys=["lease"], args=["worker_a", 60000]) == 1
+    assert redis_client.pttl("lease") > 1000
+
+    assert liberar(keys=["lease"], args=["worker_a"]) == 1
+    assert redis_client.get("lease") is None
+
+
+@pytest.mark.asyncio
+async def test_lider_que_perdeu_o_lease_nao_apaga_o_do_novo(redis_client):
+    antigo = LeaderElection(redis_client, worker_id="worker_a")
+    novo = LeaderElection(redis_client, worker_id="worker_b")
+
+    assert await antigo.sincronizar()
+    assert not await novo.sincronizar()
+
+    # Lease do antigo expira (ex.: pausa longa) e o novo assume
+    redis_client.delete(LeaderElection.CHAVE_LIDER)
+    assert await novo.sincronizar()
+
+    assert not await antigo.sincronizar()
+    await antigo.renunciar()
+    assert redis_client.get(LeaderElection.CHAVE_LIDER) == "worker_b"
+
+    await novo.renunciar()
+    assert redis_client.get(LeaderElection.CHAVE_LIDER) is None
+
+
+@pytest.mark.asyncio
+async def test_tarefa_sem_confirmacao_volta_apos_visibilidade(redis_client, monkeypatch):
+    agora = [1_700_000_000.0]
+    monkeypatch.setattr(tasks.time, "time", lambda: agora[0])
+
+    fila = TaskQueue(redis_client, timeout_espera=1, visibilidade_segundos=60)
+    await fila.enviar([{"job": "resumo_manha", "corretor_id": "corretor_1"}])
+
+    # Worker pega a tarefa e morre sem confirmar
+    perdida = await TaskQueue(redis_client, visibilidade_segundos=60).receber()
+    assert fila.pendentes() == 0
+
+    agora[0] += 59
+    assert fila.recuperar_expiradas() == 0
+
+    agora[0] += 2
+    assert fila.recuperar_expiradas() == 1
+
+    tarefa = await fila.receber()
+    assert tarefa["tarefa_id"] == perdida["tarefa_id"]
+
+    await fila.confirmar(tarefa)
+    agora[0] += 120
+    assert fila.recuperar_expiradas() == 0
+    assert fila.get_metrics()["em_processamento"] == 0
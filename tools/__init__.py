@@ -1,7 +1,7 @@
 """
 Ferramentas para os agentes
 """
-from .base import BaseTool
+from .base import BaseTool, MemoizedTool
 from .monitoring import (
     WhatsAppMonitor,
     PortalMonitor,
@@ -27,6 +27,7 @@ from .communication import (
 
 __all__ = [
     "BaseTool",
+    "MemoizedTool",
     # Monitoring
     "WhatsAppMonitor",
     "PortalMonitor",
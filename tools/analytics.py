@@ -11,9 +11,13 @@ from models import Lead, Sentimento, InteracaoTipo
 class ConversationAnalyzer(BaseTool):
     """Analisa conversas para extrair insights e padrões"""
     
+    PREFIXO_LEITURA = "leitura_mensagens:"
+    
     def __init__(self, memory_service):
         super().__init__()
         self.memory = memory_service
+        # Sem Redis: corretor -> {"entregues", "lidas", "falhas", "leitura_s_total"}
+        self._leitura: Dict[str, Dict[str, float]] = {}
     
     async def execute(
         self, 
@@ -36,7 +40,13 @@ class ConversationAnalyzer(BaseTool):
                     {"objecao": "preço alto", "frequencia": 5},
                     {"objecao": "localização", "frequencia": 3}
                 ],
-                "horarios_maior_engajamento": ["10:00-12:00", "19:00-21:00"]
+                "horarios_maior_engajamento": ["10:00-12:00", "19:00-21:00"],
+                "leitura_mensagens": {
+                    "entregues": 120,
+                    "taxa_leitura": 0.85,
+                    "tempo_medio_leitura_min": 14.2,
+                    "falhas": 3
+                }
             }
         """
         data_inicio = datetime.utcnow() - timedelta(days=dias)
@@ -79,7 +89,58 @@ class ConversationAnalyzer(BaseTool):
             "sentimento_geral": sentimento_predominante,
             "palavras_mais_mencionadas": dict(palavras_comuns),
             "objecoes_comuns": [],  # TODO: NLP mais sofisticado
-            "horarios_maior_engajamento": faixas_horario
+            "horarios_maior_engajamento": faixas_horario,
+            "leitura_mensagens": self.resumo_leitura(corretor_id)
+        }
+    
+    async def registrar_entregas(self, entregas: List[Dict[str, Any]]):
+        """Totais de entrega/leitura das mensagens do Lastro (DeliveryReconciler)"""
+        incrementos: Dict[str, Dict[str, float]] = {}
+        for entrega in entregas:
+            totais = incrementos.setdefault(entrega["corretor_id"], {})
+            if entrega["entrega_s"] is not None:
+                totais["entregues"] = totais.get("entregues", 0) + 1
+            if entrega["leitura_s"] is not None:
+                totais["lidas"] = totais.get("lidas", 0) + 1
+                totais["leitura_s_total"] = totais.get("leitura_s_total", 0) + entrega["leitura_s"]
+            if entrega["falhou"]:
+                totais["falhas"] = totais.get("falhas", 0) + 1
+        
+        redis = getattr(self.memory, "redis", None)
+        if not redis:
+            for corretor_id, totais in incrementos.items():
+                atuais = self._leitura.setdefault(corretor_id, {})
+                for nome, valor in totais.items():
+                    atuais[nome] = atuais.get(nome, 0) + valor
+            return
+        
+        if incrementos:
+            pipe = redis.pipeline(transaction=False)
+            for corretor_id, totais in incrementos.items():
+                for nome, valor in totais.items():
+                    pipe.hincrbyfloat(f"{self.PREFIXO_LEITURA}{corretor_id}", nome, valor)
+            pipe.execute()
+    
+    def resumo_leitura(self, corretor_id: str) -> Dict[str, Any]:
+        """Seção `leitura_mensagens` (muda sem alterar a versão dos dados)"""
+        redis = getattr(self.memory, "redis", None)
+        if redis:
+            totais = {
+                nome: float(valor)
+                for nome, valor in redis.hgetall(f"{self.PREFIXO_LEITURA}{corretor_id}").items()
+            }
+        else:
+            totais = self._leitura.get(corretor_id, {})
+        
+        entregues = totais.get("entregues", 0)
+        lidas = totais.get("lidas", 0)
+        return {
+            "entregues": int(entregues),
+            "taxa_leitura": round(min(lidas / entregues, 1.0), 2) if entregues else None,
+            "tempo_medio_leitura_min": (
+                round(totais.get("leitura_s_total", 0) / lidas / 60, 1) if lidas else None
+            ),
+            "falhas": int(totais.get("falhas", 0))
         }
     
     def _agrupar_horarios(self, horarios: List[int]) -> List[str]:
@@ -2,7 +2,7 @@
 Ferramentas base para os agentes
 """
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 
 class BaseTool(ABC):
@@ -21,3 +21,47 @@ class BaseTool(ABC):
         """Converte para formato do Agno"""
         # Implementação específica para o framework Agno
         pass
+
+
+class MemoizedTool(BaseTool):
+    """
+    Ferramenta com resultado memorizado por corretor e parâmetros
+    
+    Envolve uma ferramenta de análise cujo primeiro argumento é o
+    corretor_id (ver memory.AnalysisMemo).
+    
+    `secoes_ao_vivo` são partes do resultado que mudam sem alterar a versão
+    dos dados do corretor (ex.: totais de leitura vindos dos callbacks de
+    entrega): são recalculadas a cada chamada, fora da memória.
+    """
+    
+    def __init__(
+        self,
+        ferramenta: BaseTool,
+        memo,
+        secoes_ao_vivo: Optional[Dict[str, Callable[[str], Any]]] = None
+    ):
+        super().__init__()
+        self.ferramenta = ferramenta
+        self.memo = memo
+        self.secoes_ao_vivo = secoes_ao_vivo or {}
+        self.name = ferramenta.name
+        self.description = ferramenta.description
+    
+    async def execute(self, corretor_id: str, **kwargs) -> Dict[str, Any]:
+        resultado = await self.memo.obter_ou_calcular(
+            corretor_id,
+            self.name,
+            kwargs,
+            lambda: self.ferramenta.execute(corretor_id, **kwargs)
+        )
+        if not self.secoes_ao_vivo:
+            return resultado
+        
+        return {
+            **resultado,
+            **{
+                secao: calcular(corretor_id)
+                for secao, calcular in self.secoes_ao_vivo.items()
+            },
+        }
@@ -1,8 +1,11 @@
 """
 Ferramentas de comunicação - usadas pelo Agente Conselheiro
 """
-from typing import Dict, Any, List, Optional
-from datetime import datetime, time
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from string import Formatter
+import hashlib
+from memory.janelas import SendWindowCache, epoch_utc, utc_naive
 from .base import BaseTool
 
 
@@ -11,13 +14,15 @@ class WhatsAppSender(BaseTool):
     
     def __init__(self, twilio_client):
         super().__init__()
+        # api.SendQueue (limite por número + pool HTTP); None em desenvolvimento
         self.twilio_client = twilio_client
     
     async def execute(
         self, 
         destinatario: str,  # número do corretor
         mensagem: str,
-        midia_url: Optional[str] = None
+        midia_url: Optional[str] = None,
+        prioridade: str = "normal"
     ) -> Dict[str, Any]:
         """
         Envia mensagem pelo WhatsApp
@@ -26,6 +31,7 @@ class WhatsAppSender(BaseTool):
             destinatario: Número do WhatsApp (formato: +5511999998888)
             mensagem: Texto da mensagem
             midia_url: URL de imagem/documento (opcional)
+            prioridade: Faixa na fila de envio ("alta", "normal", "resumo")
         
         Returns:
             {
@@ -35,7 +41,37 @@ class WhatsAppSender(BaseTool):
                 "status": "enviado"
             }
         """
-        # TODO: Implementar envio real via Twilio
+        if self.twilio_client is None:
+            return self._simular_envio()
+        
+        return await self.twilio_client.enviar(
+            destinatario,
+            mensagem,
+            midia_url,
+            prioridade=prioridade
+        )
+    
+    async def send_many(
+        self,
+        mensagens: List[Dict[str, Any]],
+        prioridade: str = "resumo"
+    ) -> List[Dict[str, Any]]:
+        """
+        Envia várias mensagens de uma vez (resumos)
+        
+        Args:
+            mensagens: [{"destinatario": "+55...", "mensagem": "...", "midia_url": None}]
+            prioridade: Faixa na fila de envio (resumos saem depois dos alertas)
+        
+        Returns:
+            Um resultado por mensagem, na mesma ordem
+        """
+        if self.twilio_client is None:
+            return [self._simular_envio() for _ in mensagens]
+        
+        return await self.twilio_client.enviar_muitas(mensagens, prioridade=prioridade)
+    
+    def _simular_envio(self) -> Dict[str, Any]:
         return {
             "sucesso": True,
             "message_sid": "SM_mock_123",
@@ -45,7 +81,13 @@ class WhatsAppSender(BaseTool):
 
 
 class MessageComposer(BaseTool):
-    """Compõe mensagens a partir de templates"""
+    """
+    Compõe mensagens a partir de templates
+    
+    Compor não conta como envio: quem envia chama
+    `MessageTemplates.registrar_envio` com o `template_usado` depois que a
+    mensagem foi aceita pelo provedor.
+    """
     
     def __init__(self, template_service):
         super().__init__()
@@ -54,7 +96,8 @@ class MessageComposer(BaseTool):
     async def execute(
         self,
         tipo_mensagem: str,  # novo_lead, follow_up, resumo_semanal
-        variaveis: Dict[str, Any]
+        variaveis: Dict[str, Any],
+        corretor_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Gera mensagem formatada
@@ -62,6 +105,7 @@ class MessageComposer(BaseTool):
         Args:
             tipo_mensagem: Tipo do template
             variaveis: Dados para preencher template
+            corretor_id: Destinatário (fixa a variante do teste A/B)
         
         Returns:
             {
@@ -70,22 +114,52 @@ class MessageComposer(BaseTool):
                 "tom": "direto"
             }
         """
-        template = await self.templates.get_template(tipo_mensagem)
-        mensagem = template.format(**variaveis)
+        # Payload fora do contrato do template falha aqui, antes de qualquer envio
+        self.templates.validar_variaveis(tipo_mensagem, variaveis)
+        template = self.templates.selecionar(tipo_mensagem, corretor_id)
+        mensagem = template.render(variaveis)
         
         return {
             "mensagem": mensagem,
-            "template_usado": tipo_mensagem,
+            "template_usado": template.id,
             "tom": "direto"
         }
 
 
 class TimingOptimizer(BaseTool):
-    """Otimiza o horário de envio de mensagens"""
+    """
+    Otimiza o horário de envio de mensagens
     
-    def __init__(self, memory_service):
+    As janelas do horário preferencial ficam pré-calculadas no fuso do
+    corretor (memory.SendWindowCache); o corretor só é buscado quando elas
+    ainda não existem ou expiraram.
+    
+    Latências de entrega/leitura (memory.DeliveryReconciler) alimentam a
+    taxa de leitura por hora local; mensagens de urgência baixa esperam,
+    dentro da janela, pela hora em que o corretor mais lê.
+    """
+    
+    PREFIXO_ENGAJAMENTO = "engajamento:"
+    
+    def __init__(
+        self,
+        memory_service,
+        fuso: str = "America/Sao_Paulo",
+        min_amostras_hora: int = 20,
+        ganho_minimo_leitura: float = 0.1
+    ):
         super().__init__()
         self.memory = memory_service
+        self.janelas = SendWindowCache(fuso)
+        self.min_amostras_hora = min_amostras_hora
+        self.ganho_minimo_leitura = ganho_minimo_leitura
+        
+        # corretor -> hora local -> {"entregues", "lidas", "leitura_s"}
+        self._engajamento: Dict[str, Dict[int, Dict[str, float]]] = {}
+        
+        # Preferências alteradas recalculam as janelas
+        if hasattr(memory_service, "observar_corretor"):
+            memory_service.observar_corretor(self.janelas.atualizar)
     
     async def execute(
         self,
@@ -99,70 +173,168 @@ class TimingOptimizer(BaseTool):
         Args:
             corretor_id: ID do corretor
             urgencia: Urgência da mensagem
-            horario_atual: Horário de referência (default: agora)
+            horario_atual: Horário de referência (default: agora; sem fuso = UTC)
         
         Returns:
             {
                 "enviar_agora": True/False,
-                "horario_recomendado": "2026-01-11 10:00:00",
+                "horario_recomendado": "2026-01-11T13:00:00",  # UTC
                 "motivo": "Horário comercial preferencial do corretor",
                 "aguardar_minutos": 0
             }
         """
         if horario_atual is None:
             horario_atual = datetime.utcnow()
-        
-        # Busca preferências do corretor
-        corretor = await self.memory.get_corretor(corretor_id)
+        instante = epoch_utc(horario_atual)
         
         # Urgência alta envia imediatamente
         if urgencia == "alta":
             return {
                 "enviar_agora": True,
-                "horario_recomendado": horario_atual.isoformat(),
+                "horario_recomendado": utc_naive(instante).isoformat(),
                 "motivo": "Urgência alta",
                 "aguardar_minutos": 0
             }
         
-        # Verifica se está no horário comercial do corretor
-        hora_inicio = time.fromisoformat(corretor.preferencias.horario_inicio)
-        hora_fim = time.fromisoformat(corretor.preferencias.horario_fim)
-        hora_atual = horario_atual.time()
-        
-        dentro_horario = hora_inicio <= hora_atual <= hora_fim
+        janela = self.janelas.janela(corretor_id, instante)
+        if janela is None:
+            janela = await self._recalcular_janela(corretor_id, instante)
+        if janela is None:
+            # Corretor desconhecido: não há horário preferencial para esperar
+            return {
+                "enviar_agora": True,
+                "horario_recomendado": utc_naive(instante).isoformat(),
+                "motivo": "Horário preferencial do corretor indisponível",
+                "aguardar_minutos": 0
+            }
         
-        if dentro_horario:
+        inicio, fim = janela
+        if inicio <= instante:
+            melhor = (
+                self._hora_maior_leitura(corretor_id, instante, fim)
+                if urgencia == "baixa" else None
+            )
+            if melhor is not None:
+                return {
+                    "enviar_agora": False,
+                    "horario_recomendado": utc_naive(melhor).isoformat(),
+                    "motivo": "Horário em que o corretor mais lê as mensagens",
+                    "aguardar_minutos": int((melhor - instante) / 60)
+                }
             return {
                 "enviar_agora": True,
-                "horario_recomendado": horario_atual.isoformat(),
+                "horario_recomendado": utc_naive(instante).isoformat(),
                 "motivo": "Dentro do horário preferencial",
                 "aguardar_minutos": 0
             }
         
-        # Fora do horário - agendar para próximo horário
-        proximo_horario = horario_atual.replace(
-            hour=hora_inicio.hour,
-            minute=hora_inicio.minute,
-            second=0
-        )
-        
-        if proximo_horario <= horario_atual:
-            # Adiciona 1 dia
-            from datetime import timedelta
-            proximo_horario += timedelta(days=1)
-        
-        minutos_espera = int((proximo_horario - horario_atual).total_seconds() / 60)
-        
+        # Fora do horário - agendar para o início da próxima janela
         return {
             "enviar_agora": False,
-            "horario_recomendado": proximo_horario.isoformat(),
+            "horario_recomendado": utc_naive(inicio).isoformat(),
             "motivo": "Fora do horário comercial do corretor",
-            "aguardar_minutos": minutos_espera
+            "aguardar_minutos": int((inicio - instante) / 60)
         }
+    
+    async def _recalcular_janela(
+        self,
+        corretor_id: str,
+        instante: float
+    ) -> Optional[Tuple[float, float]]:
+        """Busca o corretor e recalcula as janelas até cobrir `instante`"""
+        corretor = await self.memory.get_corretor(corretor_id)
+        if corretor is None:
+            return None
+        
+        self.janelas.atualizar(corretor, ate=instante)
+        self._carregar_engajamento(corretor_id)
+        return self.janelas.janela(corretor_id, instante)
+    
+    async def registrar_entregas(self, entregas: List[Dict[str, Any]]):
+        """Soma entregas/leituras por hora local de envio (DeliveryReconciler)"""
+        incrementos: Dict[str, Dict[str, float]] = {}
+        for entrega in entregas:
+            hora = datetime.fromtimestamp(
+                epoch_utc(entrega["enviado_em"]), self.janelas.fuso
+            ).hour
+            campos = incrementos.setdefault(entrega["corretor_id"], {})
+            if entrega["entrega_s"] is not None:
+                campos[f"{hora}:entregues"] = campos.get(f"{hora}:entregues", 0) + 1
+            if entrega["leitura_s"] is not None:
+                campos[f"{hora}:lidas"] = campos.get(f"{hora}:lidas", 0) + 1
+                campos[f"{hora}:leitura_s"] = campos.get(f"{hora}:leitura_s", 0) + entrega["leitura_s"]
+        
+        for corretor_id, campos in incrementos.items():
+            self._somar_engajamento(corretor_id, campos)
+        
+        redis = getattr(self.memory, "redis", None)
+        if redis and incrementos:
+            pipe = redis.pipeline(transaction=False)
+            for corretor_id, campos in incrementos.items():
+                chave = f"{self.PREFIXO_ENGAJAMENTO}{corretor_id}"
+                for campo, valor in campos.items():
+                    pipe.hincrbyfloat(chave, campo, valor)
+            pipe.execute()
+    
+    def _carregar_engajamento(self, corretor_id: str):
+        """Lê o agregado persistido (outro processo ou reinício)"""
+        redis = getattr(self.memory, "redis", None)
+        if not redis:
+            return
+        campos = redis.hgetall(f"{self.PREFIXO_ENGAJAMENTO}{corretor_id}")
+        self._engajamento.pop(corretor_id, None)
+        self._somar_engajamento(
+            corretor_id, {campo: float(valor) for campo, valor in campos.items()}
+        )
+    
+    def _somar_engajamento(self, corretor_id: str, campos: Dict[str, float]):
+        horas = self._engajamento.setdefault(corretor_id, {})
+        for campo, valor in campos.items():
+            hora, nome = campo.split(":", 1)
+            agregado = horas.setdefault(int(hora), {"entregues": 0, "lidas": 0, "leitura_s": 0})
+            agregado[nome] += valor
+    
+    def _taxa_leitura(self, corretor_id: str, hora: int) -> Optional[float]:
+        agregado = self._engajamento.get(corretor_id, {}).get(hora)
+        if not agregado or agregado["entregues"] < self.min_amostras_hora:
+            return None
+        return min(agregado["lidas"] / agregado["entregues"], 1.0)
+    
+    def _hora_maior_leitura(
+        self,
+        corretor_id: str,
+        instante: float,
+        fim: float
+    ) -> Optional[float]:
+        """
+        Início da hora, até o fim da janela, com leitura claramente melhor
+        que a da hora atual (None = enviar agora)
+        """
+        if corretor_id not in self._engajamento:
+            return None
+        
+        local = datetime.fromtimestamp(instante, self.janelas.fuso)
+        atual = self._taxa_leitura(corretor_id, local.hour)
+        if atual is None:
+            return None
+        
+        melhor, melhor_taxa = None, atual + self.ganho_minimo_leitura
+        hora = local.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        while hora.timestamp() < fim:
+            taxa = self._taxa_leitura(corretor_id, hora.hour)
+            if taxa is not None and taxa >= melhor_taxa:
+                melhor, melhor_taxa = hora.timestamp(), taxa
+            hora += timedelta(hours=1)
+        return melhor
 
 
 class ContextLoader(BaseTool):
-    """Carrega contexto recente para personalizar mensagens"""
+    """
+    Carrega contexto recente para personalizar mensagens
+    
+    Lê o snapshot incremental do corretor (memory.ContextSnapshots) em vez
+    de varrer o histórico.
+    """
     
     def __init__(self, memory_service):
         super().__init__()
@@ -177,6 +349,11 @@ class ContextLoader(BaseTool):
         """
         Carrega contexto relevante
         
+        Args:
+            corretor_id: ID do corretor
+            lead_id: Lead da mensagem (interações dele vêm primeiro)
+            dias_historico: Idade máxima das interações
+        
         Returns:
             {
                 "ultimas_interacoes": [
@@ -195,19 +372,89 @@ class ContextLoader(BaseTool):
                 }
             }
         """
-        # TODO: Carregar contexto completo do corretor
+        snapshot = await self.memory.contexto.ler(corretor_id)
+        
+        limite = (datetime.utcnow() - timedelta(days=dias_historico)).isoformat()
+        interacoes = [i for i in snapshot["interacoes"] if i["quando"] >= limite]
+        if lead_id:
+            interacoes.sort(key=lambda i: i["lead_id"] != lead_id)
+        
         return {
-            "ultimas_interacoes": [],
-            "alertas_recentes": [],
-            "performance_recente": {}
+            "ultimas_interacoes": [
+                {
+                    "com": i["com"],
+                    "quando": self._quando(i["quando"]),
+                    "assunto": i["assunto"]
+                }
+                for i in interacoes
+            ],
+            "alertas_recentes": [a["titulo"] for a in snapshot["alertas"]],
+            "performance_recente": snapshot["contadores"]
         }
+    
+    def _quando(self, iso_utc: str) -> str:
+        """Ex.: "hoje às 09:15", "ontem às 18:40", "12/01 às 10:00" (fuso local)"""
+        fuso = self.memory.contexto.fuso
+        local = datetime.fromisoformat(iso_utc).replace(tzinfo=timezone.utc).astimezone(fuso)
+        dias = (datetime.now(fuso).date() - local.date()).days
+        
+        dia = {0: "hoje", 1: "ontem"}.get(dias, local.strftime("%d/%m"))
+        return f"{dia} às {local.strftime('%H:%M')}"
+
+
+class TemplateCompilado:
+    """
+    Template pré-processado em partes (texto literal, variável)
+    
+    O parse do texto acontece uma vez; render só concatena.
+    """
+    
+    def __init__(self, nome: str, versao: str, texto: str):
+        self.nome = nome
+        self.versao = versao
+        self.id = f"{nome}_{versao}"
+        self.texto = texto
+        self.partes: List[Tuple[str, Optional[str], str]] = []
+        
+        for literal, campo, especificacao, conversao in Formatter().parse(texto):
+            if campo is not None and (not campo.isidentifier() or conversao):
+                raise ValueError(
+                    f"Template {self.id}: variável inválida {{{campo}}}"
+                )
+            self.partes.append((literal, campo, especificacao or ""))
+        
+        self.variaveis = frozenset(c for _, c, _ in self.partes if c)
+    
+    def render(self, variaveis: Dict[str, Any]) -> str:
+        faltando = self.variaveis - variaveis.keys()
+        if faltando:
+            raise ValueError(
+                f"Template {self.id}: faltam variáveis {sorted(faltando)}"
+            )
+        
+        saida = []
+        for literal, campo, especificacao in self.partes:
+            saida.append(literal)
+            if campo:
+                saida.append(format(variaveis[campo], especificacao))
+        return "".join(saida)
 
 
 class MessageTemplates(BaseTool):
-    """Gerencia templates de mensagens"""
+    """
+    Gerencia templates de mensagens
+    
+    Templates são compilados e validados na carga: todas as variantes de
+    um template precisam usar exatamente as variáveis declaradas em
+    `VARIAVEIS`, e o MessageComposer confere o payload de quem chama
+    contra a mesma declaração. A variante
+    de cada corretor é fixa (hash do corretor_id) e cada uma conta envios
+    e respostas para o teste A/B.
+    """
     
     TEMPLATES = {
         "novo_lead": """🔔 Novo lead: {nome}
+Origem: {origem}
 {descricao_busca}
 
 💡 Responder em até 5min aumenta conversão em 9x
@@ -242,35 +489,217 @@ Enviar?""",
 
 Oportunidade: {oportunidade}
 
-{sugestao_acao}"""
+{sugestao_acao}""",
+        
+        "visita_proxima": """⏰ Visita em {minutos_ate} minutos
+
+Cliente: {lead_nome}
+Local: {imovel}
+
+Tudo pronto?""",
+        
+        "cliente_urgente": """🔔 URGENTE: {titulo}
+
+{descricao}
+
+{acao_recomendada}""",
+        
+        # Demais tipos de evento
+        "evento": """🔔 {titulo}
+
+{descricao}
+
+{acao_recomendada}"""
+    }
+    
+    # Variantes em teste A/B (além da v1 em TEMPLATES)
+    VARIANTES = {
+        "novo_lead": {
+            "v2": """🔔 {nome} acabou de chegar ({origem}): {descricao_busca}
+
+Responda agora (até 5min converte 9x mais):
+"{sugestao_mensagem}"
+""",
+        },
     }
     
+    # Contrato de cada template: variáveis que o payload deve trazer
+    VARIAVEIS = {
+        "novo_lead": frozenset({"nome", "origem", "descricao_busca", "sugestao_mensagem"}),
+        "lead_sem_resposta": frozenset({
+            "nome", "descricao_lead", "horas", "contexto_lead", "sugestao_mensagem"
+        }),
+        "resumo_semanal": frozenset({
+            "periodo", "metricas", "destaque", "atencao", "insight", "call_to_action"
+        }),
+        "padrao_detectado": frozenset({"descricao_padrao", "oportunidade", "sugestao_acao"}),
+        "visita_proxima": frozenset({"minutos_ate", "lead_nome", "imovel"}),
+        "cliente_urgente": frozenset({"titulo", "descricao", "acao_recomendada"}),
+        "evento": frozenset({"titulo", "descricao", "acao_recomendada"}),
+    }
+    
+    PREFIXO_CONTADORES = "templates:contadores"
+    PREFIXO_ULTIMO = "templates:ultimo:"
+    
+    def __init__(
+        self,
+        redis_client=None,
+        ttl_ultimo_segundos: int = 7 * 24 * 3600
+    ):
+        super().__init__()
+        self.redis = redis_client
+        self.ttl_ultimo = ttl_ultimo_segundos
+        self.compilados: Dict[str, Dict[str, TemplateCompilado]] = {}
+        self.contadores: Dict[str, Dict[str, int]] = {}
+        
+        # Último template enviado a cada corretor (fallback sem Redis; com
+        # Redis fica compartilhado, já que a resposta pode chegar por outro
+        # processo)
+        self._ultimo_enviado: Dict[str, str] = {}
+        
+        for nome, texto in self.TEMPLATES.items():
+            self._carregar(nome, "v1", texto)
+        for nome, variantes in self.VARIANTES.items():
+            if nome not in self.TEMPLATES:
+                raise ValueError(f"Variante de template inexistente: {nome}")
+            for versao, texto in variantes.items():
+                self._carregar(nome, versao, texto)
+    
     async def execute(self, template_name: str) -> str:
-        """Retorna template por nome"""
+        """Retorna template (v1) por nome"""
         return self.TEMPLATES.get(template_name, "")
     
     async def get_template(self, name: str) -> str:
         """Alias para execute"""
         return await self.execute(name)
+    
+    def selecionar(
+        self,
+        nome: str,
+        corretor_id: Optional[str] = None
+    ) -> TemplateCompilado:
+        """Variante do template para o corretor (v1 sem corretor)"""
+        if nome not in self.compilados:
+            raise ValueError(f"Template desconhecido: {nome}")
+        
+        variantes = self.compilados[nome]
+        if corretor_id is None or len(variantes) == 1:
+            return variantes["v1"]
+        
+        versoes = sorted(variantes)
+        indice = hashlib.blake2b(
+            f"{nome}:{corretor_id}".encode(),
+            digest_size=4
+        ).digest()
+        return variantes[versoes[int.from_bytes(indice, "big") % len(versoes)]]
+    
+    def validar_variaveis(self, nome: str, variaveis: Dict[str, Any]):
+        """Confere o payload contra as variáveis declaradas do template"""
+        if nome not in self.VARIAVEIS:
+            raise ValueError(f"Template desconhecido: {nome}")
+        
+        esperadas = self.VARIAVEIS[nome]
+        faltando = esperadas - variaveis.keys()
+        sobrando = variaveis.keys() - esperadas
+        if faltando or sobrando:
+            raise ValueError(
+                f"Template {nome}: faltam variáveis {sorted(faltando)}, "
+                f"sobram {sorted(sobrando)}"
+            )
+    
+    def registrar_envio(
+        self,
+        template_id: str,
+        corretor_id: Optional[str] = None
+    ):
+        """Conta um envio aceito pelo provedor para o teste A/B"""
+        if template_id not in self.contadores:
+            return
+        
+        self._incrementar(template_id, "envios")
+        if not corretor_id:
+            return
+        
+        if self.redis:
+            self.redis.set(
+                f"{self.PREFIXO_ULTIMO}{corretor_id}",
+                template_id,
+                ex=self.ttl_ultimo
+            )
+        else:
+            self._ultimo_enviado[corretor_id] = template_id
+    
+    def registrar_resposta(self, corretor_id: str):
+        """Atribui a resposta do corretor ao último template enviado a ele"""
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.get(f"{self.PREFIXO_ULTIMO}{corretor_id}")
+            pipe.delete(f"{self.PREFIXO_ULTIMO}{corretor_id}")
+            template_id = pipe.execute()[0]
+        else:
+            template_id = self._ultimo_enviado.pop(corretor_id, None)
+        
+        if template_id in self.contadores:
+            self._incrementar(template_id, "respostas")
+    
+    def get_metrics(self) -> Dict[str, Dict[str, int]]:
+        if not self.redis:
+            return {t: dict(c) for t, c in self.contadores.items()}
+        
+        metricas: Dict[str, Dict[str, int]] = {}
+        for campo, valor in self.redis.hgetall(self.PREFIXO_CONTADORES).items():
+            template_id, contador = campo.rsplit(":", 1)
+            metricas.setdefault(template_id, {})[contador] = int(valor)
+        return metricas
+    
+    def _carregar(self, nome: str, versao: str, texto: str):
+        compilado = TemplateCompilado(nome, versao, texto)
+        
+        declaradas = self.VARIAVEIS.get(nome)
+        if declaradas is None:
+            raise ValueError(f"Template {compilado.id} sem variáveis declaradas")
+        if compilado.variaveis != declaradas:
+            raise ValueError(
+                f"Template {compilado.id} usa variáveis diferentes das declaradas: "
+                f"{sorted(compilado.variaveis ^ declaradas)}"
+            )
+        
+        self.compilados.setdefault(nome, {})[versao] = compilado
+        self.contadores[compilado.id] = {"envios": 0, "respostas": 0}
+    
+    def _incrementar(self, template_id: str, contador: str):
+        if self.redis:
+            self.redis.hincrby(self.PREFIXO_CONTADORES, f"{template_id}:{contador}", 1)
+        else:
+            self.contadores[template_id][contador] += 1
 
 
 class NotificationScheduler(BaseTool):
     """Agenda notificações para envio futuro"""
     
-    def __init__(self):
+    def __init__(self, fila_atrasada):
         super().__init__()
-        self.queue = []  # Em produção, usar Redis/Celery
+        # Fila persistente ordenada por (horario_envio, prioridade)
+        self.fila = fila_atrasada
     
     async def execute(
         self,
         destinatario: str,
         mensagem: str,
         horario_envio: datetime,
-        prioridade: int = 5  # 1-10
+        prioridade: int = 5,  # 1-10
+        corretor_id: Optional[str] = None,
+        template_id: Optional[str] = None,
+        fallback_modelo: Optional[bool] = None
     ) -> Dict[str, Any]:
         """
         Agenda mensagem para envio futuro
         
+        Com `corretor_id`, a entrega passa pelas checagens de agenda e cota
+        do corretor (ver Orquestrador.entregar_mensagem_agendada); o envio
+        do `template_id` e o fallback do modelo (`fallback_modelo`, None se
+        a mensagem não usa o modelo) só são contados quando a mensagem sai.
+        
         Returns:
             {
                 "agendado": True,
@@ -279,18 +708,23 @@ class NotificationScheduler(BaseTool):
                 "posicao_fila": 3
             }
         """
-        job = {
-            "destinatario": destinatario,
-            "mensagem": mensagem,
-            "horario_envio": horario_envio,
-            "prioridade": prioridade
-        }
-        
-        self.queue.append(job)
+        job = await self.fila.enqueue(
+            {
+                "tipo": "mensagem",
+                "corretor_id": corretor_id,
+                "destinatario": destinatario,
+                "mensagem": mensagem,
+                "prioridade": prioridade,
+                "template": template_id,
+                "fallback_modelo": fallback_modelo
+            },
+            horario_envio=horario_envio,
+            prioridade=prioridade
+        )
         
         return {
             "agendado": True,
-            "job_id": f"job_{len(self.queue)}",
+            "job_id": job["job_id"],
             "horario_envio": horario_envio.isoformat(),
-            "posicao_fila": len(self.queue)
+            "posicao_fila": job["posicao_fila"]
         }
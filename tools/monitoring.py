@@ -1,22 +1,28 @@
 """
 Ferramentas de monitoramento - usadas pelo Agente Vigilante
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+from memory.calendar import normalizar_utc
 from .base import BaseTool
-from models import Lead, Evento, EventoTipo, EventoUrgencia
+from models import Compromisso, Lead, Evento, EventoTipo, EventoUrgencia
 
 
 class WhatsAppMonitor(BaseTool):
     """Monitora novas mensagens no WhatsApp do corretor"""
     
-    def __init__(self, twilio_client):
+    def __init__(self, twilio_client, caixa_entrada=None):
         super().__init__()
         self.twilio_client = twilio_client
+        self.caixa = caixa_entrada  # memory.InboundMailbox
     
     async def execute(self, corretor_id: str) -> Dict[str, Any]:
         """
-        Verifica novas mensagens não lidas no WhatsApp
+        Retorna as mensagens deixadas para este worker na caixa de entrada
+        do corretor desde o último ciclo
+        
+        Mensagens dos corretores dos shards do processo de webhooks são
+        processadas direto da fila de ingestão e não passam por aqui.
         
         Returns:
             {
@@ -26,17 +32,24 @@ class WhatsAppMonitor(BaseTool):
                         "nome": "Maria Silva",
                         "conteudo": "Oi, vi o anúncio...",
                         "horario": "2026-01-11 10:30:00",
-                        "lead_id": "lead_abc123"
+                        "lead_id": "lead_abc123",
+                        "urgente": False
                     }
                 ],
                 "total": 3
             }
         """
-        # TODO: Implementar integração real com Twilio/WhatsApp
-        # Por enquanto, retorna mock
+        if self.caixa is None:
+            return {
+                "novas_mensagens": [],
+                "total": 0
+            }
+        
+        mensagens = await self.caixa.retirar(corretor_id)
+        
         return {
-            "novas_mensagens": [],
-            "total": 0
+            "novas_mensagens": mensagens,
+            "total": len(mensagens)
         }
 
 
@@ -72,13 +85,26 @@ class PortalMonitor(BaseTool):
 class CalendarCheck(BaseTool):
     """Verifica compromissos próximos no calendário"""
     
-    async def execute(self, corretor_id: str, horas_antecedencia: int = 2) -> Dict[str, Any]:
+    def __init__(self, calendar_index=None):
+        super().__init__()
+        self.index = calendar_index  # memory.CalendarIndex
+    
+    async def execute(
+        self, 
+        corretor_id: str, 
+        horas_antecedencia: int = 2,
+        agora: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         Lista visitas e compromissos nas próximas X horas
         
+        Consulta apenas o índice local (sem chamada remota). O índice é
+        mantido atualizado por `sincronizar`.
+        
         Args:
             corretor_id: ID do corretor
             horas_antecedencia: Quantas horas à frente verificar
+            agora: Horário de referência (default: agora; sem fuso = UTC)
         
         Returns:
             {
@@ -94,11 +120,55 @@ class CalendarCheck(BaseTool):
                 "total": 1
             }
         """
-        # TODO: Integrar com Google Calendar
+        if self.index is None:
+            return {
+                "compromissos_proximos": [],
+                "total": 0
+            }
+        
+        agora = normalizar_utc(agora or datetime.utcnow())
+        compromissos = self.index.compromissos_entre(
+            corretor_id,
+            agora,
+            agora + timedelta(hours=horas_antecedencia)
+        )
+        
+        proximos = []
+        for compromisso in compromissos:
+            # Compromissos já em andamento não são "próximos"
+            if compromisso.inicio < agora:
+                continue
+            
+            proximos.append({
+                "compromisso_id": compromisso.id,
+                "tipo": compromisso.tipo,
+                "lead_id": compromisso.lead_id,
+                "lead_nome": compromisso.lead_nome or "Sem nome",
+                "imovel": compromisso.imovel or "Local não informado",
+                "horario": compromisso.inicio.strftime("%Y-%m-%d %H:%M:%S"),
+                "minutos_ate": int((compromisso.inicio - agora).total_seconds() / 60)
+            })
+        
         return {
-            "compromissos_proximos": [],
-            "total": 0
+            "compromissos_proximos": proximos,
+            "total": len(proximos)
         }
+    
+    async def sincronizar(self, corretor_id: str) -> Dict[str, Any]:
+        """Atualiza o índice local com as alterações do calendário"""
+        if self.index is None:
+            return {"alterados": 0, "completo": False}
+        return await self.index.sincronizar(corretor_id)
+    
+    def em_compromisso(
+        self,
+        corretor_id: str,
+        agora: Optional[datetime] = None
+    ) -> Optional[Compromisso]:
+        """Visita/reunião em andamento agora (None se livre; sem I/O)"""
+        if self.index is None:
+            return None
+        return self.index.compromisso_atual(corretor_id, agora)
 
 
 class LeadStatusCheck(BaseTool):
@@ -129,7 +199,8 @@ class LeadStatusCheck(BaseTool):
                         "horas_sem_resposta": 26,
                         "score": 9,
                         "ultima_mensagem": "Tem financiamento?",
-                        "contexto": "Lead quente, perguntou sobre financiamento"
+                        "contexto": "Lead quente, perguntou sobre financiamento",
+                        "ultima_interacao": "2026-01-10 08:00:00"
                     }
                 ],
                 "total": 3
@@ -161,7 +232,8 @@ class LeadStatusCheck(BaseTool):
                         "horas_sem_resposta": int(tempo_sem_resposta.total_seconds() / 3600),
                         "score": lead.score,
                         "ultima_mensagem": ultima_msg,
-                        "contexto": lead.proximo_passo or "Aguardando resposta"
+                        "contexto": lead.proximo_passo or "Aguardando resposta",
+                        "ultima_interacao": lead.data_ultima_interacao.isoformat()
                     })
         
         # Ordena por score (mais quentes primeiro)
@@ -176,9 +248,16 @@ class LeadStatusCheck(BaseTool):
 class ImovelMonitor(BaseTool):
     """Monitora mudanças na carteira de imóveis do corretor"""
     
+    def __init__(self, carteira_differ=None):
+        super().__init__()
+        self.differ = carteira_differ  # memory.CarteiraDiffer
+    
     async def execute(self, corretor_id: str) -> Dict[str, Any]:
         """
-        Detecta mudanças em imóveis da carteira (preço, status, etc)
+        Detecta mudanças de preço em imóveis da carteira
+        
+        Usa o diff por hashes: só os buckets alterados desde o último
+        ciclo são buscados e comparados.
         
         Returns:
             {
@@ -194,8 +273,16 @@ class ImovelMonitor(BaseTool):
                 "total": 1
             }
         """
-        # TODO: Integrar com sistema de carteira de imóveis
+        if self.differ is None:
+            return {
+                "mudancas": [],
+                "total": 0
+            }
+        
+        resultado = await self.differ.detectar_mudancas(corretor_id)
+        
         return {
-            "mudancas": [],
-            "total": 0
+            "mudancas": resultado["mudancas"],
+            "total": len(resultado["mudancas"]),
+            "buckets_verificados": resultado["buckets_verificados"]
         }
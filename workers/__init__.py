@@ -0,0 +1,22 @@
+"""
+Coordenação de execução dos ciclos do Lastro.AI
+"""
+from .spread import SpreadScheduler, offset_estavel
+from .sharding import ShardCoordinator, HashRing
+from .leader import LeaderElection
+from .tasks import TaskQueue
+from .priority import OutboundScheduler
+from .batching import GenerationBatcher
+from .latency import LatencyBudget
+
+__all__ = [
+    "SpreadScheduler",
+    "offset_estavel",
+    "ShardCoordinator",
+    "HashRing",
+    "LeaderElection",
+    "TaskQueue",
+    "OutboundScheduler",
+    "GenerationBatcher",
+    "LatencyBudget",
+]
@@ -0,0 +1,151 @@
+"""
+Micro-lotes de geração no modelo
+
+Um ciclo pode gerar dezenas de pedidos ao modelo ao mesmo tempo (uma
+sugestão por LEAD_SEM_RESPOSTA, em vários corretores). Pedidos que
+chegam dentro de uma janela curta viram um único prompt estruturado; a
+resposta (JSON) é separada de volta por pedido. Se o JSON não vier
+completo, os pedidos sem resposta são refeitos individualmente.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+from loguru import logger
+
+
+class GenerationBatcher:
+    """
+    Junta pedidos ao modelo em lotes
+
+    `gerar(prompt)` tem a mesma assinatura do modelo, então o batcher
+    pode ser usado no lugar dele.
+    """
+
+    def __init__(
+        self,
+        modelo: Callable[[str], Awaitable[str]],
+        janela_ms: int = 50,
+        max_lote: int = 10
+    ):
+        self.modelo = modelo
+        self.janela = janela_ms / 1000
+        self.max_lote = max_lote
+
+        # prompt -> futuros à espera (prompts idênticos viram um pedido)
+        self._pendentes: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lotes: set = set()
+
+        self.stats = {
+            "pedidos": 0,
+            "lotes": 0,
+            "chamadas_modelo": 0,
+            "refeitos_individualmente": 0,
+        }
+
+    async def gerar(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendentes.setdefault(prompt, []).append(futuro)
+        self.stats["pedidos"] += 1
+
+        if len(self._pendentes) >= self.max_lote:
+            self._disparar()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.janela, self._disparar)
+
+        return await futuro
+
+    def _disparar(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        lote, self._pendentes = self._pendentes, {}
+        if not lote:
+            return
+
+        tarefa = asyncio.create_task(self._executar(lote))
+        self._lotes.add(tarefa)
+        tarefa.add_done_callback(self._lotes.discard)
+
+    async def _executar(self, lote: Dict[str, List[asyncio.Future]]):
+        prompts = list(lote)
+        if len(prompts) == 1:
+            await self._individual(prompts[0], lote[prompts[0]])
+            return
+
+        self.stats["lotes"] += 1
+        respostas: Dict[int, str] = {}
+        try:
+            self.stats["chamadas_modelo"] += 1
+            bruto = await self.modelo(self._prompt_lote(prompts))
+            respostas = self._separar(bruto, len(prompts))
+        except Exception as e:
+            logger.warning(f"Lote de {len(prompts)} pedidos ao modelo falhou: {e}")
+
+        faltando = []
+        for indice, prompt in enumerate(prompts, start=1):
+            if indice in respostas:
+                self._resolver(lote[prompt], resposta=respostas[indice])
+            else:
+                faltando.append(prompt)
+
+        if faltando:
+            self.stats["refeitos_individualmente"] += len(faltando)
+            await asyncio.gather(*[
+                self._individual(prompt, lote[prompt]) for prompt in faltando
+            ])
+
+    async def _individual(self, prompt: str, futuros: List[asyncio.Future]):
+        try:
+            self.stats["chamadas_modelo"] += 1
+            self._resolver(futuros, resposta=await self.modelo(prompt))
+        except Exception as e:
+            self._resolver(futuros, erro=e)
+
+    def _resolver(
+        self,
+        futuros: List[asyncio.Future],
+        resposta: Optional[str] = None,
+        erro: Optional[Exception] = None
+    ):
+        for futuro in futuros:
+            if futuro.done():
+                continue
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resposta)
+
+    def _prompt_lote(self, prompts: List[str]) -> str:
+        pedidos = "\n\n".join(
+            f"### Pedido {indice}\n{prompt}"
+            for indice, prompt in enumerate(prompts, start=1)
+        )
+        return f"""Responda cada pedido abaixo de forma independente.
+
+{pedidos}
+
+Devolva apenas um JSON, sem nenhum texto antes ou depois, no formato:
+[{{"id": 1, "resposta": "..."}}, {{"id": 2, "resposta": "..."}}]
+com exatamente uma resposta para cada um dos {len(prompts)} pedidos."""
+
+    def _separar(self, bruto: str, quantidade: int) -> Dict[int, str]:
+        """Respostas por número do pedido (só as válidas)"""
+        inicio, fim = bruto.find("["), bruto.rfind("]")
+        if inicio < 0 or fim < inicio:
+            raise ValueError("Resposta do lote sem lista JSON")
+
+        itens: List[Any] = json.loads(bruto[inicio:fim + 1])
+        respostas: Dict[int, str] = {}
+        for item in itens:
+            if not isinstance(item, dict):
+                continue
+            indice, resposta = item.get("id"), item.get("resposta")
+            if isinstance(indice, int) and 1 <= indice <= quantidade and isinstance(resposta, str):
+                respostas[indice] = resposta
+        return respostas
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return dict(self.stats)
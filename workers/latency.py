@@ -0,0 +1,139 @@
+"""
+Orçamento de latência das chamadas ao modelo
+
+Alertas urgentes não podem esperar um modelo lento: cada chamada tem um
+prazo pela urgência do evento. Estourado o prazo, quem chamou segue com
+o texto determinístico e a geração continua em segundo plano (o
+resultado ainda alimenta o cache). Latências do modelo e taxa de
+fallback ficam nas métricas.
+
+Um ciclo com vários eventos usa um único prazo absoluto (`prazo_final`):
+cada chamada espera só o que resta dele, não um orçamento novo.
+"""
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from collections import deque
+import asyncio
+import time
+
+
+# Prazo (ms) por urgência do evento
+ORCAMENTOS_PADRAO_MS = {"alta": 1500, "media": 5000, "baixa": 15000}
+
+
+def urgencia_maxima(eventos) -> str:
+    """Urgência mais alta entre os eventos ("media" se não houver eventos)"""
+    urgencias = {getattr(e.urgencia, "value", e.urgencia) for e in eventos}
+    return next(
+        (u for u in ("alta", "media", "baixa") if u in urgencias),
+        "media"
+    )
+
+
+class OrcamentoEsgotado(Exception):
+    """A chamada não terminou dentro do prazo da urgência"""
+
+
+class LatencyBudget:
+    """Prazos por urgência e percentis de latência do modelo"""
+
+    def __init__(
+        self,
+        orcamentos_ms: Optional[Dict[str, int]] = None,
+        max_amostras: int = 2000
+    ):
+        self.orcamentos_ms = {**ORCAMENTOS_PADRAO_MS, **(orcamentos_ms or {})}
+        self._amostras: Deque[float] = deque(maxlen=max_amostras)
+        self._em_segundo_plano: set = set()
+        # fallbacks/envios: mensagens que saíram com o texto determinístico
+        # no lugar do modelo, entre as que dependiam dele
+        self.stats = {
+            "chamadas": 0,
+            "esgotados": 0,
+            "erros_modelo": 0,
+            "envios": 0,
+            "fallbacks": 0,
+        }
+
+    def medir(
+        self,
+        modelo: Callable[[str], Awaitable[str]]
+    ) -> Callable[[str], Awaitable[str]]:
+        """Envolve o modelo registrando a latência de cada chamada"""
+        async def medido(prompt: str) -> str:
+            inicio = time.perf_counter()
+            try:
+                return await modelo(prompt)
+            except Exception:
+                self.stats["erros_modelo"] += 1
+                raise
+            finally:
+                self._amostras.append((time.perf_counter() - inicio) * 1000)
+        return medido
+
+    def prazo_final(self, urgencia: str) -> float:
+        """Prazo absoluto (time.monotonic) da urgência contado a partir de agora"""
+        urgencia = getattr(urgencia, "value", urgencia)
+        orcamento = self.orcamentos_ms.get(urgencia, self.orcamentos_ms["media"])
+        return time.monotonic() + orcamento / 1000
+
+    async def dentro_do_prazo(
+        self,
+        trabalho: Awaitable[Any],
+        urgencia: str,
+        ate: Optional[float] = None
+    ) -> Any:
+        """
+        Resultado do trabalho, se terminar no prazo
+
+        Args:
+            urgencia: prazo pelo orçamento da urgência, contado agora
+            ate: prazo absoluto já definido (`prazo_final`), no lugar do
+                orçamento da urgência
+
+        Raises:
+            OrcamentoEsgotado: o trabalho segue em segundo plano
+        """
+        urgencia = getattr(urgencia, "value", urgencia)
+        if ate is None:
+            ate = self.prazo_final(urgencia)
+        prazo = max(ate - time.monotonic(), 0)
+
+        tarefa = asyncio.ensure_future(trabalho)
+        self.stats["chamadas"] += 1
+        # Mesmo com o prazo vencido o trabalho roda um passo: resultado já
+        # em cache não vira fallback
+        concluidas, _ = await asyncio.wait({tarefa}, timeout=prazo)
+        if concluidas:
+            return tarefa.result()
+
+        self.stats["esgotados"] += 1
+        self._em_segundo_plano.add(tarefa)
+        tarefa.add_done_callback(self._concluir_segundo_plano)
+        raise OrcamentoEsgotado(f"Prazo de {prazo * 1000:.0f}ms ({urgencia}) esgotado")
+
+    def registrar_envio(self, fallback: bool):
+        """Conta uma mensagem enviada que dependia do modelo"""
+        self.stats["envios"] += 1
+        if fallback:
+            self.stats["fallbacks"] += 1
+
+    def _concluir_segundo_plano(self, tarefa: asyncio.Future):
+        self._em_segundo_plano.discard(tarefa)
+        if not tarefa.cancelled():
+            tarefa.exception()  # evita "exception was never retrieved"
+
+    def get_metrics(self) -> Dict[str, Any]:
+        amostras = sorted(self._amostras)
+        envios = self.stats["envios"]
+        return {
+            **self.stats,
+            "p50_ms": round(self._percentil(amostras, 0.50), 1),
+            "p99_ms": round(self._percentil(amostras, 0.99), 1),
+            "taxa_fallback": round(self.stats["fallbacks"] / envios, 3) if envios else 0.0,
+            "em_segundo_plano": len(self._em_segundo_plano),
+        }
+
+    def _percentil(self, amostras, fracao: float) -> float:
+        if not amostras:
+            return 0.0
+        return amostras[min(int(fracao * len(amostras)), len(amostras) - 1)]
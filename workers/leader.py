@@ -0,0 +1,100 @@
+"""
+Eleição de líder para jobs singleton (resumos, detecção de padrões)
+
+O líder é quem detém o lease `lastro:leader` no Redis. O lease é curto e
+renovado a cada terço do seu período, então a troca de líder após uma
+falha leva no máximo um período de lease.
+"""
+from typing import Any, Dict, Optional
+import asyncio
+import os
+import socket
+from loguru import logger
+from .leases import RENOVAR_LEASE, LIBERAR_LEASE
+
+
+class LeaderElection:
+    """
+    Eleição de líder por lease
+
+    Sem Redis, o processo é sempre o líder.
+    """
+
+    CHAVE_LIDER = "lastro:leader"
+    PREFIXO_EXECUCAO = "lastro:job:"
+
+    def __init__(
+        self,
+        redis_client=None,
+        worker_id: Optional[str] = None,
+        lease_segundos: float = 10
+    ):
+        self.redis = redis_client
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ms = int(lease_segundos * 1000)
+        self.lider = redis_client is None
+
+        if self.redis:
+            self._renovar = self.redis.register_script(RENOVAR_LEASE)
+            self._liberar = self.redis.register_script(LIBERAR_LEASE)
+
+    async def sincronizar(self) -> bool:
+        """Renova ou tenta adquirir a liderança. Retorna se é líder."""
+        if not self.redis:
+            return True
+
+        if self.lider:
+            renovado = self._renovar(
+                keys=[self.CHAVE_LIDER],
+                args=[self.worker_id, self.lease_ms]
+            )
+            if not renovado:
+                logger.warning(f"Worker {self.worker_id} perdeu a liderança")
+                self.lider = False
+
+        if not self.lider:
+            if self.redis.set(self.CHAVE_LIDER, self.worker_id, nx=True, px=self.lease_ms):
+                logger.info(f"Worker {self.worker_id} assumiu a liderança")
+                self.lider = True
+
+        return self.lider
+
+    async def run(self):
+        """Mantém o lease (3 renovações por período)"""
+        while True:
+            try:
+                await self.sincronizar()
+            except Exception as e:
+                # Sem conseguir renovar, deixa de se considerar líder
+                logger.error(f"Erro na eleição de líder: {e}")
+                self.lider = False
+            await asyncio.sleep(self.lease_ms / 3000)
+
+    def reivindicar_execucao(self, job_id: str, ttl_segundos: int = 6 * 3600) -> bool:
+        """
+        Marca a execução de um job singleton como feita
+
+        Protege contra dois líderes simultâneos (ex.: pausa longa do antigo
+        líder) dispararem o mesmo job no mesmo horário.
+        """
+        if not self.lider:
+            return False
+        if not self.redis:
+            return True
+        return bool(
+            self.redis.set(
+                f"{self.PREFIXO_EXECUCAO}{job_id}",
+                self.worker_id,
+                nx=True,
+                ex=ttl_segundos
+            )
+        )
+
+    async def renunciar(self):
+        """Libera a liderança (saída graciosa, failover imediato)"""
+        if self.redis and self.lider:
+            self._liberar(keys=[self.CHAVE_LIDER], args=[self.worker_id])
+        self.lider = self.redis is None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"worker_id": self.worker_id, "lider": self.lider}
@@ -0,0 +1,27 @@
+"""
+Scripts Lua de lease compartilhados (shards e liderança)
+
+Um lease é uma chave com o ID do dono e TTL em milissegundos. Renovar e
+liberar só têm efeito se o chamador ainda for o dono: um lease que expirou
+e foi adquirido por outro worker não é estendido nem apagado por engano.
+
+    KEYS[1] = chave do lease
+    ARGV[1] = ID do worker
+    ARGV[2] = TTL em ms (só RENOVAR_LEASE)
+"""
+
+# Renova o lease apenas se ainda for o dono
+RENOVAR_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Libera o lease apenas se ainda for o dono
+LIBERAR_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
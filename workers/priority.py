@@ -0,0 +1,78 @@
+"""
+Escalonamento global do trabalho de saída (LLM + WhatsApp)
+
+Os ciclos de vários corretores rodam em paralelo, mas a capacidade de
+envio é limitada. Cada envio pede uma vaga informando sua chave de
+prioridade; quando a capacidade acaba, a vaga liberada vai para o
+trabalho mais valioso entre todos os corretores, não para o primeiro
+que chegou.
+"""
+from typing import Any, Dict, List, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+
+
+class OutboundScheduler:
+    """Semáforo com fila de prioridade (maior chave primeiro, FIFO no empate)"""
+
+    def __init__(self, capacidade: int = 10):
+        self.capacidade = capacidade
+        self._livres = capacidade
+        self._espera: List[Tuple[tuple, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.stats = {"atendidos": 0, "aguardaram": 0}
+
+    @asynccontextmanager
+    async def vaga(self, chave: tuple):
+        """
+        Ocupa uma vaga de envio
+
+        Args:
+            chave: Chave de prioridade (tupla numérica, maior = mais urgente)
+        """
+        await self._adquirir(chave)
+        try:
+            yield
+        finally:
+            self._liberar()
+
+    async def _adquirir(self, chave: tuple):
+        self.stats["atendidos"] += 1
+
+        if self._livres > 0 and not self._espera:
+            self._livres -= 1
+            return
+
+        self.stats["aguardaram"] += 1
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._espera,
+            (tuple(-x for x in chave), next(self._seq), futuro)
+        )
+
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            # Vaga entregue no mesmo instante do cancelamento: repassa
+            if futuro.done() and not futuro.cancelled():
+                self._liberar()
+            raise
+
+    def _liberar(self):
+        # Entrega a vaga ao próximo da fila (ignora os cancelados)
+        while self._espera:
+            _, _, futuro = heapq.heappop(self._espera)
+            if not futuro.done():
+                futuro.set_result(None)
+                return
+        self._livres += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "capacidade": self.capacidade,
+            "em_uso": self.capacidade - self._livres,
+            "aguardando": sum(1 for _, _, f in self._espera if not f.done()),
+            **self.stats,
+        }
@@ -0,0 +1,190 @@
+"""
+Sharding de corretores entre workers (processos/nós)
+
+- Cada corretor pertence a um shard fixo (hash do ID)
+- Os shards são distribuídos entre os workers vivos por hash consistente
+- A posse de um shard é um lease no Redis (SET NX PX), renovado a cada
+  sincronização; só o dono do lease processa os corretores do shard
+- Quando um worker entra, os demais liberam os shards que passaram a ser
+  dele; quando um worker morre, seus leases expiram e são redistribuídos
+"""
+from typing import Dict, Any, List, Optional, Set
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import time
+from loguru import logger
+from .leases import RENOVAR_LEASE, LIBERAR_LEASE
+
+
+def _hash(chave: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(chave.encode(), digest_size=8).digest(),
+        "big"
+    )
+
+
+class HashRing:
+    """Anel de hash consistente com nós virtuais"""
+
+    def __init__(self, membros: List[str], vnodes: int = 64):
+        self._anel = sorted(
+            (_hash(f"{membro}#{i}"), membro)
+            for membro in membros
+            for i in range(vnodes)
+        )
+        self._chaves = [h for h, _ in self._anel]
+
+    def dono(self, chave: str) -> Optional[str]:
+        if not self._anel:
+            return None
+        i = bisect.bisect(self._chaves, _hash(chave)) % len(self._anel)
+        return self._anel[i][1]
+
+
+class ShardCoordinator:
+    """
+    Coordena a posse de shards deste worker
+
+    Sem Redis, o worker é o único e possui todos os shards.
+    """
+
+    CHAVE_WORKERS = "lastro:workers"
+    PREFIXO_LEASE = "lastro:shard:"
+
+    def __init__(
+        self,
+        redis_client=None,
+        worker_id: Optional[str] = None,
+        total_shards: int = 64,
+        lease_segundos: float = 15,
+        vnodes: int = 64
+    ):
+        self.redis = redis_client
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.total_shards = total_shards
+        self.lease_ms = int(lease_segundos * 1000)
+        self.vnodes = vnodes
+
+        self.shards: Set[int] = set() if redis_client else set(range(total_shards))
+        self.membros: List[str] = [self.worker_id]
+
+        if self.redis:
+            self._renovar = self.redis.register_script(RENOVAR_LEASE)
+            self._liberar = self.redis.register_script(LIBERAR_LEASE)
+
+    def shard_de(self, corretor_id: str) -> int:
+        """Shard fixo do corretor"""
+        return _hash(corretor_id) % self.total_shards
+
+    def possui(self, corretor_id: str) -> bool:
+        """Este worker é o dono atual do shard do corretor?"""
+        return self.shard_de(corretor_id) in self.shards
+
+    def filtrar(self, corretores: List[Any]) -> List[Any]:
+        """Mantém apenas os corretores dos shards deste worker"""
+        return [c for c in corretores if self.possui(c.id)]
+
+    async def sincronizar(self) -> Dict[str, Any]:
+        """
+        Heartbeat, leitura dos membros vivos e ajuste dos leases
+
+        Dois round trips ao Redis por sincronização.
+
+        Returns:
+            {"membros": 3, "shards": 21, "adquiridos": 2, "liberados": 1}
+        """
+        if not self.redis:
+            return {"membros": 1, "shards": len(self.shards), "adquiridos": 0, "liberados": 0}
+
+        agora_ms = int(time.time() * 1000)
+
+        # 1. Heartbeat e membros vivos
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(self.CHAVE_WORKERS, {self.worker_id: agora_ms + self.lease_ms})
+        pipe.zremrangebyscore(self.CHAVE_WORKERS, "-inf", agora_ms)
+        pipe.zrange(self.CHAVE_WORKERS, 0, -1)
+        self.membros = sorted(pipe.execute()[2])
+
+        anel = HashRing(self.membros, self.vnodes)
+        desejados = {
+            shard for shard in range(self.total_shards)
+            if anel.dono(f"shard-{shard}") == self.worker_id
+        }
+
+        # 2. Adquire, renova e libera leases
+        manter = sorted(desejados & self.shards)
+        adquirir = sorted(desejados - self.shards)
+        liberar = sorted(self.shards - desejados)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for shard in manter:
+            self._renovar(
+                keys=[self._lease(shard)],
+                args=[self.worker_id, self.lease_ms],
+                client=pipe
+            )
+        for shard in adquirir:
+            pipe.set(self._lease(shard), self.worker_id, nx=True, px=self.lease_ms)
+        for shard in liberar:
+            self._liberar(keys=[self._lease(shard)], args=[self.worker_id], client=pipe)
+        respostas = pipe.execute() if (manter or adquirir or liberar) else []
+
+        renovados = respostas[:len(manter)]
+        adquiridos = respostas[len(manter):len(manter) + len(adquirir)]
+
+        # Lease perdido (ex.: pausa longa) deixa de ser nosso imediatamente
+        novos_shards = {s for s, ok in zip(manter, renovados) if ok}
+        novos_shards |= {s for s, ok in zip(adquirir, adquiridos) if ok}
+
+        ganhos = novos_shards - self.shards
+        perdidos = self.shards - novos_shards
+        self.shards = novos_shards
+
+        if ganhos or perdidos:
+            logger.info(
+                f"Worker {self.worker_id}: {len(self.shards)} shards "
+                f"(+{len(ganhos)} -{len(perdidos)}), {len(self.membros)} workers"
+            )
+
+        return {
+            "membros": len(self.membros),
+            "shards": len(self.shards),
+            "adquiridos": len(ganhos),
+            "liberados": len(perdidos),
+        }
+
+    async def run(self):
+        """Sincroniza periodicamente (3x por período de lease)"""
+        while True:
+            try:
+                await self.sincronizar()
+            except Exception as e:
+                # Sem renovar, os leases expiram e outro worker assume
+                logger.error(f"Erro na sincronização de shards: {e}")
+                self.shards = set()
+            await asyncio.sleep(self.lease_ms / 3000)
+
+    async def sair(self):
+        """Saída graciosa: libera os shards para rebalanceamento imediato"""
+        if not self.redis:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for shard in self.shards:
+            self._liberar(keys=[self._lease(shard)], args=[self.worker_id], client=pipe)
+        pipe.zrem(self.CHAVE_WORKERS, self.worker_id)
+        pipe.execute()
+        self.shards = set()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "membros": len(self.membros),
+            "shards": sorted(self.shards),
+        }
+
+    def _lease(self, shard: int) -> str:
+        return f"{self.PREFIXO_LEASE}{shard}"
@@ -0,0 +1,142 @@
+"""
+Escalonamento espalhado - Distribui os corretores ao longo do intervalo
+
+Em vez de acordar a cada 5 minutos e processar todos os corretores de uma
+vez, cada corretor recebe um deslocamento estável (hash do ID) dentro do
+intervalo e é processado no seu próprio horário, formando um fluxo contínuo.
+
+Se o processamento anterior de um corretor ainda estiver em andamento
+quando o horário dele chegar, os disparos são agrupados em uma única
+execução posterior (não empilham).
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+import asyncio
+import hashlib
+import time
+from loguru import logger
+
+
+def offset_estavel(chave: str, intervalo_segundos: float) -> float:
+    """Deslocamento estável (em segundos) da chave dentro do intervalo"""
+    digest = hashlib.blake2b(chave.encode(), digest_size=8).digest()
+    fracao = int.from_bytes(digest, "big") / 2 ** 64
+    return fracao * intervalo_segundos
+
+
+class SpreadScheduler:
+    """
+    Executa `processar(corretor)` para cada corretor uma vez por intervalo,
+    no deslocamento estável do corretor
+    """
+
+    def __init__(
+        self,
+        listar: Callable[[], Awaitable[List[Any]]],
+        processar: Callable[[Any], Awaitable[Any]],
+        intervalo_segundos: float
+    ):
+        self.listar = listar
+        self.processar = processar
+        self.intervalo = intervalo_segundos
+
+        self._em_andamento: Set[str] = set()
+        self._pendentes: Set[str] = set()
+        self._tarefas: Set[asyncio.Task] = set()
+
+        self.metricas: Dict[str, Any] = {
+            "rodadas": 0,
+            "disparos": 0,
+            "coalescidos": 0,
+            "atraso_max_segundos": 0.0,
+        }
+
+    async def run(self):
+        """Loop principal: uma rodada por intervalo, alinhada ao relógio"""
+        while True:
+            inicio_rodada = time.time() // self.intervalo * self.intervalo
+
+            try:
+                agenda = await self._montar_agenda()
+            except Exception as e:
+                logger.error(f"Erro ao listar corretores para a rodada: {e}")
+                agenda = []
+
+            await self._executar_rodada(inicio_rodada, agenda)
+
+            self.metricas["rodadas"] += 1
+
+            # Aguarda o início da próxima rodada
+            proxima = inicio_rodada + self.intervalo
+            await asyncio.sleep(max(proxima - time.time(), 0))
+
+    async def _montar_agenda(self) -> List[Tuple[float, Any]]:
+        corretores = await self.listar()
+        return sorted(
+            (
+                (offset_estavel(corretor.id, self.intervalo), corretor)
+                for corretor in corretores
+            ),
+            key=lambda item: item[0]
+        )
+
+    async def _executar_rodada(
+        self,
+        inicio_rodada: float,
+        agenda: List[Tuple[float, Any]]
+    ):
+        agora = time.time()
+
+        for offset, corretor in agenda:
+            horario = inicio_rodada + offset
+
+            # Slots que já passaram nesta rodada (ex.: subida no meio do
+            # intervalo) ficam para a próxima
+            if horario < agora - 1:
+                continue
+
+            espera = horario - time.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+
+            self.metricas["atraso_max_segundos"] = max(
+                self.metricas["atraso_max_segundos"],
+                round(time.time() - horario, 3)
+            )
+            self.disparar(corretor)
+
+    def disparar(self, corretor: Any):
+        """Dispara o processamento do corretor, agrupando se já estiver rodando"""
+        self.metricas["disparos"] += 1
+
+        if corretor.id in self._em_andamento:
+            if corretor.id in self._pendentes:
+                self.metricas["coalescidos"] += 1
+            self._pendentes.add(corretor.id)
+            return
+
+        self._em_andamento.add(corretor.id)
+        tarefa = asyncio.create_task(self._executar(corretor))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar(self, corretor: Any):
+        try:
+            while True:
+                try:
+                    await self.processar(corretor)
+                except Exception as e:
+                    logger.error(f"Erro ao processar corretor {corretor.id}: {e}")
+
+                # Disparos que chegaram durante a execução viram uma só
+                if corretor.id not in self._pendentes:
+                    break
+                self._pendentes.discard(corretor.id)
+        finally:
+            self._em_andamento.discard(corretor.id)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metricas,
+            "em_andamento": len(self._em_andamento),
+            "pendentes": len(self._pendentes),
+        }
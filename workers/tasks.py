@@ -0,0 +1,154 @@
+"""
+Fila de tarefas compartilhada entre workers
+
+O líder enfileira uma tarefa por corretor e todos os workers consomem,
+espalhando o trabalho pesado dos jobs singleton.
+
+Entrega pelo menos uma vez: `receber` move a tarefa (BLMOVE) para uma
+lista de tarefas em processamento, de onde ela só sai com `confirmar`.
+Se o worker morrer antes, a tarefa volta para a fila quando o prazo de
+visibilidade expira.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import time
+import uuid
+
+
+# Devolve à fila as tarefas em processamento com prazo vencido. Tarefas
+# ainda sem prazo (worker morreu entre o BLMOVE e o ZADD) recebem um.
+_RECUPERAR = """
+local itens = redis.call('lrange', KEYS[2], 0, -1)
+local devolvidas = 0
+for _, item in ipairs(itens) do
+    local prazo = redis.call('zscore', KEYS[3], item)
+    if not prazo then
+        redis.call('zadd', KEYS[3], ARGV[2], item)
+    elseif tonumber(prazo) <= tonumber(ARGV[1]) then
+        redis.call('lrem', KEYS[2], 1, item)
+        redis.call('zrem', KEYS[3], item)
+        redis.call('rpush', KEYS[1], item)
+        devolvidas = devolvidas + 1
+    end
+end
+return devolvidas
+"""
+
+
+class TaskQueue:
+    """
+    Fila de tarefas (lista no Redis ou asyncio.Queue local)
+    """
+
+    CHAVE = "lastro:tarefas"
+    CHAVE_PROCESSANDO = "lastro:tarefas:processando"
+    CHAVE_PRAZOS = "lastro:tarefas:prazos"
+
+    def __init__(
+        self,
+        redis_client=None,
+        timeout_espera: int = 5,
+        visibilidade_segundos: int = 600
+    ):
+        self.redis = redis_client
+        self.timeout_espera = timeout_espera
+        self.visibilidade = visibilidade_segundos
+        self._local: Optional[asyncio.Queue] = None if redis_client else asyncio.Queue()
+
+        # tarefa_id -> JSON exato movido para a lista de processamento
+        self._em_voo: Dict[str, str] = {}
+        self.stats = {"recebidas": 0, "confirmadas": 0, "devolvidas": 0}
+
+        if self.redis:
+            self._recuperar = self.redis.register_script(_RECUPERAR)
+
+    async def enviar(self, tarefas: List[Dict[str, Any]]) -> int:
+        """Enfileira tarefas em um único round trip"""
+        if not tarefas:
+            return 0
+
+        # ID único: tarefas iguais continuam distinguíveis em processamento
+        tarefas = [
+            {**tarefa, "tarefa_id": uuid.uuid4().hex[:12]} for tarefa in tarefas
+        ]
+
+        if self.redis:
+            self.redis.rpush(self.CHAVE, *[json.dumps(t) for t in tarefas])
+        else:
+            for tarefa in tarefas:
+                self._local.put_nowait(tarefa)
+
+        return len(tarefas)
+
+    async def receber(self) -> Dict[str, Any]:
+        """Aguarda a próxima tarefa (fica em processamento até `confirmar`)"""
+        if not self.redis:
+            tarefa = await self._local.get()
+            self.stats["recebidas"] += 1
+            return tarefa
+
+        while True:
+            self.recuperar_expiradas()
+
+            # BLMOVE bloqueante fora do event loop
+            bruto = await asyncio.to_thread(
+                self.redis.blmove,
+                self.CHAVE,
+                self.CHAVE_PROCESSANDO,
+                self.timeout_espera,
+                "LEFT",
+                "RIGHT"
+            )
+            if not bruto:
+                continue
+
+            self.redis.zadd(
+                self.CHAVE_PRAZOS,
+                {bruto: time.time() + self.visibilidade}
+            )
+            tarefa = json.loads(bruto)
+            self._em_voo[tarefa["tarefa_id"]] = bruto
+            self.stats["recebidas"] += 1
+            return tarefa
+
+    async def confirmar(self, tarefa: Dict[str, Any]):
+        """Tira a tarefa da lista de processamento (concluída ou descartada)"""
+        bruto = self._em_voo.pop(tarefa.get("tarefa_id"), None)
+        self.stats["confirmadas"] += 1
+        if not self.redis or bruto is None:
+            return
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lrem(self.CHAVE_PROCESSANDO, 1, bruto)
+        pipe.zrem(self.CHAVE_PRAZOS, bruto)
+        pipe.execute()
+
+    def recuperar_expiradas(self) -> int:
+        """Devolve à fila as tarefas de workers que morreram no meio"""
+        if not self.redis:
+            return 0
+
+        agora = time.time()
+        devolvidas = self._recuperar(
+            keys=[self.CHAVE, self.CHAVE_PROCESSANDO, self.CHAVE_PRAZOS],
+            args=[agora, agora + self.visibilidade]
+        )
+        self.stats["devolvidas"] += devolvidas
+        return devolvidas
+
+    def pendentes(self) -> int:
+        """Tarefas aguardando"""
+        if self.redis:
+            return self.redis.llen(self.CHAVE)
+        return self._local.qsize()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        em_processamento = (
+            self.redis.llen(self.CHAVE_PROCESSANDO) if self.redis else 0
+        )
+        return {
+            **self.stats,
+            "pendentes": self.pendentes(),
+            "em_processamento": em_processamento,
+        }